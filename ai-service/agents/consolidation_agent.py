@@ -0,0 +1,275 @@
+"""
+Container Consolidation Agent
+Groups pending container bookings by lane and sailing window and
+bin-packs vehicles into shared 40ft containers
+"""
+
+import math
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+from config.pricing import (
+    BASE_RATES,
+    DEFAULT_BASE_RATE,
+    VEHICLE_MULTIPLIERS,
+    CONTAINER_40FT_CAPACITY,
+    CONTAINER_40FT_RATE_FACTOR,
+    SIZE_CLASS_UNITS,
+    VEHICLE_SIZE_CLASSES,
+)
+
+
+class ContainerPacker:
+    """
+    Heuristic bin packer for integer-sized vehicles
+
+    Open containers are bucketed by remaining capacity, so a best-fit
+    placement is a scan over at most `capacity` buckets instead of over
+    every open container. This keeps packing linear in the number of
+    vehicles.
+    """
+
+    def __init__(self, capacity: int = CONTAINER_40FT_CAPACITY):
+        self.capacity = capacity
+        self.containers: List[Optional[List[dict]]] = []
+        self.remaining: List[int] = []
+        self.buckets: List[set] = [set() for _ in range(capacity + 1)]
+
+    def pack(self, items: List[dict], quality: str = "balanced", time_budget_ms: float = 200) -> List[List[dict]]:
+        """
+        Pack items (each with a `units` key) into containers
+
+        Quality levels:
+            fast: next-fit decreasing, single pass with one open container
+            balanced: best-fit decreasing
+            thorough: best-fit decreasing, then dissolve under-filled
+                containers into the slack of others until the time budget runs out
+        """
+        oversized = [item for item in items if item["units"] > self.capacity]
+        if oversized:
+            raise ValueError(f"{len(oversized)} vehicles exceed container capacity")
+
+        ordered = sorted(items, key=lambda item: item["units"], reverse=True)
+
+        if quality == "fast":
+            self._next_fit(ordered)
+        else:
+            for item in ordered:
+                self._best_fit(item)
+            if quality == "thorough":
+                self._improve(time.perf_counter() + time_budget_ms / 1000)
+
+        return [c for c in self.containers if c]
+
+    def _open(self) -> int:
+        """Open a new empty container and return its index"""
+        self.containers.append([])
+        self.remaining.append(self.capacity)
+        idx = len(self.containers) - 1
+        self.buckets[self.capacity].add(idx)
+        return idx
+
+    def _place(self, idx: int, item: dict):
+        """Place an item in a container and move it to its new bucket"""
+        self.buckets[self.remaining[idx]].discard(idx)
+        self.remaining[idx] -= item["units"]
+        self.buckets[self.remaining[idx]].add(idx)
+        self.containers[idx].append(item)
+
+    def _tightest(self, units: int, exclude: int = -1) -> Optional[int]:
+        """Container with the least remaining space that still fits `units`"""
+        for r in range(units, self.capacity + 1):
+            for idx in self.buckets[r]:
+                if idx != exclude:
+                    return idx
+        return None
+
+    def _next_fit(self, items: List[dict]):
+        idx = None
+        for item in items:
+            if idx is None or self.remaining[idx] < item["units"]:
+                idx = self._open()
+            self._place(idx, item)
+
+    def _best_fit(self, item: dict):
+        idx = self._tightest(item["units"])
+        if idx is None:
+            idx = self._open()
+        self._place(idx, item)
+
+    def _improve(self, deadline: float):
+        """Repeatedly try to empty the least-filled container"""
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            live = [i for i, c in enumerate(self.containers) if c]
+            for idx in sorted(live, key=lambda i: -self.remaining[i]):
+                if time.perf_counter() >= deadline:
+                    break
+                if self._dissolve(idx):
+                    improved = True
+                    break
+
+    def _dissolve(self, idx: int) -> bool:
+        """Move every item out of container idx, or roll back if any does not fit"""
+        moves: List[Tuple[int, dict]] = []
+        for item in sorted(self.containers[idx], key=lambda it: it["units"], reverse=True):
+            target = self._tightest(item["units"], exclude=idx)
+            if target is None:
+                for target, moved in reversed(moves):
+                    self.buckets[self.remaining[target]].discard(target)
+                    self.remaining[target] += moved["units"]
+                    self.buckets[self.remaining[target]].add(target)
+                    self.containers[target].remove(moved)
+                return False
+            self._place(target, item)
+            moves.append((target, item))
+
+        self.buckets[self.remaining[idx]].discard(idx)
+        self.containers[idx] = None
+        return True
+
+
+class ConsolidationAgent:
+    """Agent for consolidating multi-vehicle container shipments"""
+
+    def __init__(self):
+        logger.info("ConsolidationAgent initialized")
+
+    async def execute(self, input_data: dict) -> dict:
+        """Execute consolidation workflow"""
+        started = time.perf_counter()
+        bookings = input_data.get("bookings", [])
+        window_days = input_data.get("window_days", 7)
+        quality = input_data.get("quality", "balanced")
+        time_budget_ms = input_data.get("time_budget_ms", 200)
+        # The budget covers the whole request; each group gets what is left of it
+        budget_ends = started + time_budget_ms / 1000
+
+        logger.debug("Consolidating {} bookings ({})", len(bookings), quality)
+
+        groups = []
+        allocations = []
+        lower_bound = 0
+
+        for lane_key, items in self._group_bookings(bookings, window_days).items():
+            origin, origin_port, destination, destination_port, window_start = lane_key
+            packer = ContainerPacker()
+            containers = packer.pack(items, quality, max(0.0, (budget_ends - time.perf_counter()) * 1000))
+            lower_bound += math.ceil(sum(item["units"] for item in items) / CONTAINER_40FT_CAPACITY)
+
+            group_id = f"{origin}:{origin_port}->{destination}:{destination_port}@{window_start}"
+            group_containers = []
+            for number, contents in enumerate(containers, start=1):
+                container = self._price_container(contents)
+                container["container_id"] = f"{group_id}#{number}"
+                group_containers.append(container)
+                for allocation in container.pop("allocations"):
+                    allocations.append({**allocation, "group_id": group_id, "container_id": container["container_id"]})
+
+            groups.append({
+                "group_id": group_id,
+                "origin_country": origin,
+                "origin_port": origin_port,
+                "destination_country": destination,
+                "destination_port": destination_port,
+                "window_start": window_start,
+                "vehicle_count": len(items),
+                "containers": group_containers,
+            })
+
+        consolidated_total = sum(a["allocated_cost"] for a in allocations)
+        individual_total = sum(a["individual_cost"] for a in allocations)
+        container_count = sum(len(g["containers"]) for g in groups)
+
+        return {
+            "success": True,
+            "groups": groups,
+            "allocations": allocations,
+            "summary": {
+                "bookings": len(allocations),
+                "groups": len(groups),
+                "containers": container_count,
+                "lower_bound_containers": lower_bound,
+                "total_cost": round(consolidated_total, 2),
+                "individual_cost": round(individual_total, 2),
+                "savings": round(individual_total - consolidated_total, 2),
+                "quality": quality,
+                "solve_time_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        }
+
+    def _group_bookings(self, bookings: List[dict], window_days: int) -> Dict[tuple, List[dict]]:
+        """Group bookings by lane and departure window"""
+        groups = defaultdict(list)
+        for booking in bookings:
+            departure = booking["departure_date"]
+            if isinstance(departure, str):
+                departure = datetime.fromisoformat(departure).date()
+            window_index = departure.toordinal() // window_days
+            window_start = date.fromordinal(window_index * window_days).isoformat()
+
+            origin = booking["origin_country"].lower()
+            vehicle_type = str(booking["vehicle_type"]).lower()
+            size_class = VEHICLE_SIZE_CLASSES.get(vehicle_type)
+            if size_class is None:
+                logger.warning(f"Unknown vehicle type {vehicle_type!r} for booking {booking['booking_id']}, packing it as a sedan")
+                size_class = "sedan"
+            key = (
+                origin,
+                (booking.get("origin_port") or "").lower(),
+                (booking.get("destination_country") or "Uganda").lower(),
+                (booking.get("destination_port") or "Port Bell").lower(),
+                window_start,
+            )
+            groups[key].append({
+                "booking_id": booking["booking_id"],
+                "vehicle_type": vehicle_type,
+                "size_class": size_class,
+                "units": SIZE_CLASS_UNITS[size_class],
+                "container_rate": BASE_RATES.get(origin, {}).get("container", DEFAULT_BASE_RATE),
+            })
+        return groups
+
+    def _price_container(self, contents: List[dict]) -> dict:
+        """
+        Price a packed container and allocate its cost by floor space
+
+        If sharing would cost more than shipping each vehicle in its own
+        container (e.g. a lone sedan), the occupants keep individual pricing.
+        """
+        used_units = sum(item["units"] for item in contents)
+        container_cost = max(item["container_rate"] for item in contents) * CONTAINER_40FT_RATE_FACTOR
+        individual_costs = [
+            item["container_rate"] * VEHICLE_MULTIPLIERS.get(item["vehicle_type"], 1.0)
+            for item in contents
+        ]
+        consolidated = container_cost < sum(individual_costs)
+
+        allocations = []
+        for item, individual_cost in zip(contents, individual_costs):
+            if consolidated:
+                allocated = container_cost * item["units"] / used_units
+            else:
+                allocated = individual_cost
+            allocations.append({
+                "booking_id": item["booking_id"],
+                "vehicle_type": item["vehicle_type"],
+                "size_class": item["size_class"],
+                "units": item["units"],
+                "allocated_cost": round(allocated, 2),
+                "individual_cost": round(individual_cost, 2),
+                "savings": round(individual_cost - allocated, 2),
+            })
+
+        return {
+            "booking_ids": [item["booking_id"] for item in contents],
+            "used_units": used_units,
+            "utilization": round(used_units / CONTAINER_40FT_CAPACITY, 3),
+            "consolidated": consolidated,
+            "container_cost": round(container_cost if consolidated else sum(individual_costs), 2),
+            "allocations": allocations,
+        }
@@ -3,9 +3,12 @@ Document Processing Agent
 Uses AI to extract data from shipping documents with OCR support
 """
 
-from langchain_mistralai import ChatMistralAI
+from utils.llm import GuardedLLM
+from utils import deadline
+from utils.metrics import ocr_page_latency
+from utils.tracing import span
 from loguru import logger
-from config.settings import settings
+import asyncio
 import json
 import re
 import io
@@ -20,17 +23,13 @@ class DocumentAgent:
     """AI Agent for document processing and OCR"""
     
     def __init__(self):
-        self.llm = ChatMistralAI(
-            model=settings.MISTRAL_MODEL,
-            temperature=0.3,
-            mistral_api_key=settings.MISTRAL_API_KEY
-        )
-        logger.info("DocumentAgent initialized with Mistral AI and OCR support")
+        self.llm = GuardedLLM(temperature=0.3)
+        logger.info(f"DocumentAgent initialized with {self.llm} and OCR support")
     
     async def execute(self, file: UploadFile, document_type: str) -> dict:
         """Execute document processing workflow with OCR"""
         try:
-            logger.info(f"Processing {document_type} document: {file.filename}")
+            logger.info("Processing {} document: {}", document_type, file.filename)
             
             # Step 1: Extract text from document using OCR
             document_text = await self._extract_text_from_file(file)
@@ -42,7 +41,7 @@ class DocumentAgent:
                     "message": "The document appears to be empty or unreadable"
                 }
             
-            logger.info(f"Extracted {len(document_text)} characters from document")
+            logger.debug("Extracted {} characters from document", len(document_text))
             
             # Step 2: Use AI to extract structured data
             system_prompt = self._get_extraction_prompt(document_type)
@@ -52,7 +51,7 @@ class DocumentAgent:
                 {"role": "user", "content": f"Extract information from this document:\n\n{document_text[:4000]}"}  # Limit to 4000 chars
             ]
             
-            response = self.llm.invoke(messages)
+            response = await self.llm.ainvoke(messages)
             extracted_data = self._parse_extraction(response.content, document_type)
             
             # Step 3: Calculate confidence score based on extracted fields
@@ -85,11 +84,11 @@ class DocumentAgent:
             await file.seek(0)
             
             if filename.endswith('.pdf'):
-                logger.info("Processing PDF document")
-                return self._extract_from_pdf(content)
+                logger.debug("Processing PDF document")
+                return await asyncio.to_thread(self._extract_from_pdf, content)
             elif filename.endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')):
-                logger.info("Processing image document")
-                return self._extract_from_image(content)
+                logger.debug("Processing image document")
+                return await asyncio.to_thread(self._extract_from_image, content)
             else:
                 raise ValueError(f"Unsupported file type: {filename}")
                 
@@ -98,20 +97,22 @@ class DocumentAgent:
             raise
     
     def _extract_from_pdf(self, pdf_content: bytes) -> str:
-        """Extract text from PDF using OCR"""
+        """Extract text from PDF using OCR, stopping once the request deadline passes"""
         try:
             # Convert PDF pages to images
-            images = convert_from_bytes(pdf_content, dpi=300)
+            with span("ocr.render_pdf"):
+                images = convert_from_bytes(pdf_content, dpi=300, timeout=deadline.bound())
             
             # Extract text from each page
             text_parts = []
             for i, image in enumerate(images):
-                logger.info(f"Processing PDF page {i + 1}/{len(images)}")
-                page_text = pytesseract.image_to_string(image, lang='eng')
+                logger.debug("Processing PDF page {}/{}", i + 1, len(images))
+                with ocr_page_latency.labels("pdf").time(), span("ocr.page", page=i + 1):
+                    page_text = pytesseract.image_to_string(image, lang='eng', timeout=deadline.bound() or 0)
                 text_parts.append(page_text)
             
             full_text = '\n\n'.join(text_parts)
-            logger.info(f"Extracted {len(full_text)} characters from {len(images)} PDF pages")
+            logger.debug("Extracted {} characters from {} PDF pages", len(full_text), len(images))
             
             return full_text
             
@@ -129,9 +130,10 @@ class DocumentAgent:
                 image = image.convert('RGB')
             
             # Extract text using Tesseract
-            text = pytesseract.image_to_string(image, lang='eng')
+            with ocr_page_latency.labels("image").time(), span("ocr.page", page=1):
+                text = pytesseract.image_to_string(image, lang='eng', timeout=deadline.bound() or 0)
             
-            logger.info(f"Extracted {len(text)} characters from image")
+            logger.debug("Extracted {} characters from image", len(text))
             
             return text
             
@@ -259,7 +261,7 @@ Return ONLY valid JSON."""
             if json_match:
                 json_str = json_match.group()
                 data = json.loads(json_str)
-                logger.info(f"Successfully parsed JSON with {len(data)} fields")
+                logger.debug("Successfully parsed JSON with {} fields", len(data))
                 return data
             else:
                 # Fallback: parse line by line
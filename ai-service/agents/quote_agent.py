@@ -4,14 +4,18 @@ Uses LangGraph to orchestrate quote generation workflow with Mistral AI
 """
 
 from langgraph.graph import StateGraph, END
-from langchain_mistralai import ChatMistralAI
+from utils.llm import GuardedLLM
+from utils.metrics import agent_fallbacks
+from utils.tracing import instrument_node
 from typing import TypedDict, Annotated, List
 import operator
 from datetime import datetime
 from loguru import logger
 
 from config.settings import settings
+from config.pricing import BASE_RATES, DEFAULT_BASE_RATE, VEHICLE_MULTIPLIERS
 from utils.helpers import generate_reference, calculate_confidence_score
+from utils.transit_stats import transit_stats
 from tools.laravel_api import laravel_api
 
 
@@ -52,11 +56,7 @@ class QuoteAgent:
     """AI Agent for generating shipping quotes using Mistral AI"""
     
     def __init__(self):
-        self.llm = ChatMistralAI(
-            model=settings.MISTRAL_MODEL,
-            temperature=settings.MISTRAL_TEMPERATURE,
-            mistral_api_key=settings.MISTRAL_API_KEY
-        )
+        self.llm = GuardedLLM(temperature=settings.MISTRAL_TEMPERATURE)
         self.workflow = self._build_workflow()
     
     def _build_workflow(self) -> StateGraph:
@@ -64,12 +64,16 @@ class QuoteAgent:
         
         workflow = StateGraph(QuoteState)
         
-        # Add nodes
-        workflow.add_node("validate_input", self._validate_input)
-        workflow.add_node("calculate_base_cost", self._calculate_base_cost)
-        workflow.add_node("apply_ai_pricing", self._apply_ai_pricing)
-        workflow.add_node("generate_breakdown", self._generate_breakdown)
-        workflow.add_node("save_quote", self._save_quote)
+        # Add nodes (each traced and timed in agent_node_duration_seconds)
+        nodes = {
+            "validate_input": self._validate_input,
+            "calculate_base_cost": self._calculate_base_cost,
+            "apply_ai_pricing": self._apply_ai_pricing,
+            "generate_breakdown": self._generate_breakdown,
+            "save_quote": self._save_quote,
+        }
+        for name, node in nodes.items():
+            workflow.add_node(name, instrument_node("quote", name, node))
         
         # Define edges
         workflow.set_entry_point("validate_input")
@@ -83,7 +87,7 @@ class QuoteAgent:
     
     def _validate_input(self, state: QuoteState) -> dict:
         """Validate input data"""
-        logger.info("Validating quote input")
+        logger.debug("Validating quote input")
         
         messages = []
         
@@ -111,37 +115,16 @@ class QuoteAgent:
     
     def _calculate_base_cost(self, state: QuoteState) -> dict:
         """Calculate base shipping cost"""
-        logger.info("Calculating base cost")
-        
-        # Base rates by origin country
-        base_rates = {
-            "japan": {"roro": 1500, "container": 2200},
-            "uk": {"roro": 1800, "container": 2800},
-            "uae": {"roro": 1100, "container": 1600},
-            "usa": {"roro": 2000, "container": 3000}
-        }
+        logger.debug("Calculating base cost")
         
         origin = state["origin_country"].lower()
         method = state["shipping_method"].lower()
         
         # Get base rate
-        base_cost = base_rates.get(origin, {}).get(method, 1500)
+        base_cost = BASE_RATES.get(origin, {}).get(method, DEFAULT_BASE_RATE)
         
-        # Vehicle type multiplier (includes all supported types)
-        vehicle_multipliers = {
-            "sedan": 1.0,
-            "suv": 1.2,
-            "truck": 1.3,
-            "van": 1.25,
-            "luxury": 1.5,
-            "motorcycle": 0.7,
-            "hatchback": 0.95,
-            "wagon": 1.05,
-            "coupe": 1.0,
-            "convertible": 1.1,
-        }
-        
-        multiplier = vehicle_multipliers.get(state["vehicle_type"].lower(), 1.0)
+        # Vehicle type multiplier
+        multiplier = VEHICLE_MULTIPLIERS.get(state["vehicle_type"].lower(), 1.0)
         base_cost = base_cost * multiplier
         
         return {
@@ -149,9 +132,9 @@ class QuoteAgent:
             "messages": [f"Base cost calculated: ${base_cost:.2f}"]
         }
     
-    def _apply_ai_pricing(self, state: QuoteState) -> dict:
+    async def _apply_ai_pricing(self, state: QuoteState) -> dict:
         """Use AI to adjust pricing based on market conditions"""
-        logger.info("Applying AI pricing adjustments")
+        logger.debug("Applying AI pricing adjustments")
         
         # Create prompt for LLM
         prompt = f"""
@@ -182,7 +165,7 @@ class QuoteAgent:
         """
         
         try:
-            response = self.llm.invoke(prompt)
+            response = await self.llm.ainvoke(prompt)
             content = response.content
             
             # Parse response
@@ -211,6 +194,7 @@ class QuoteAgent:
             
         except Exception as e:
             logger.error(f"AI pricing error: {str(e)}")
+            agent_fallbacks.labels("quote_pricing").inc()
             # Fallback to base cost
             return {
                 "adjusted_cost": state['base_cost'],
@@ -219,14 +203,14 @@ class QuoteAgent:
                 "messages": ["Using base cost (AI adjustment failed)"]
             }
     
-    def _generate_breakdown(self, state: QuoteState) -> dict:
+    async def _generate_breakdown(self, state: QuoteState) -> dict:
         """Generate cost breakdown with AI-estimated customs duty"""
-        logger.info("Generating cost breakdown")
+        logger.debug("Generating cost breakdown")
 
         shipping_cost = state['adjusted_cost']
 
         # AI-powered customs duty estimation based on Uganda's import duty bands
-        customs_duty = self._estimate_customs_duty(state)
+        customs_duty = await self._estimate_customs_duty(state)
 
         vat = (shipping_cost + customs_duty) * 0.18  # 18% VAT
         levies = 350  # Fixed levies
@@ -241,7 +225,7 @@ class QuoteAgent:
             "total": total_cost
         }
         
-        # Estimate delivery days
+        # Estimate delivery days: median of observed transit times, else typical days
         delivery_days = {
             "japan": 45,
             "uk": 35,
@@ -249,7 +233,15 @@ class QuoteAgent:
             "usa": 40
         }
         
-        estimated_days = delivery_days.get(state['origin_country'].lower(), 40)
+        observed = transit_stats.summary(
+            state['origin_country'],
+            state.get('destination_country') or "uganda",
+            state['shipping_method']
+        )
+        if observed:
+            estimated_days = int(round(observed["p50"]))
+        else:
+            estimated_days = delivery_days.get(state['origin_country'].lower(), 40)
         
         return {
             "total_cost": total_cost,
@@ -258,7 +250,7 @@ class QuoteAgent:
             "messages": [f"Total cost: ${total_cost:.2f}"]
         }
 
-    def _estimate_customs_duty(self, state: QuoteState) -> float:
+    async def _estimate_customs_duty(self, state: QuoteState) -> float:
         """Estimate Uganda customs duty using AI reasoning over import bands"""
         prompt = f"""
         You are a Uganda Revenue Authority (URA) customs duty expert.
@@ -284,12 +276,13 @@ class QuoteAgent:
         Example: 1200
         """
         try:
-            response = self.llm.invoke(prompt)
+            response = await self.llm.ainvoke(prompt)
             duty = float(response.content.strip().replace('$', '').replace(',', '').split()[0])
             # Sanity check: clamp between $300 and $5000
             return max(300.0, min(5000.0, duty))
         except Exception as e:
             logger.warning(f"AI customs duty estimation failed, using default: {str(e)}")
+            agent_fallbacks.labels("quote_duty").inc()
             # Fallback: engine-size based bands
             engine = state.get('engine_size') or 0
             if engine < 1500:
@@ -303,7 +296,7 @@ class QuoteAgent:
     
     def _save_quote(self, state: QuoteState) -> dict:
         """Save quote to database"""
-        logger.info("Saving quote")
+        logger.debug("Saving quote")
         
         # Generate reference
         quote_ref = generate_reference("QTE")
@@ -326,7 +319,7 @@ class QuoteAgent:
         
         # Note: Actual saving would happen here via Laravel API
         # For now, we'll just log it
-        logger.info(f"Quote generated: {quote_ref}")
+        logger.info("Quote generated: {}", quote_ref)
         
         return {
             "quote_reference": quote_ref,
@@ -337,7 +330,7 @@ class QuoteAgent:
     async def execute(self, input_data: dict) -> dict:
         """Execute quote generation workflow"""
         try:
-            logger.info("Starting quote generation")
+            logger.debug("Starting quote generation")
             
             # Initialize state
             initial_state = {
@@ -347,7 +340,7 @@ class QuoteAgent:
             }
             
             # Run workflow
-            result = self.workflow.invoke(initial_state)
+            result = await self.workflow.ainvoke(initial_state)
             
             # Return response
             return {
@@ -3,21 +3,19 @@ Route Optimization Agent
 Suggests optimal shipping routes using AI
 """
 
-from langchain_mistralai import ChatMistralAI
+from utils.llm import GuardedLLM
+from utils.metrics import agent_fallbacks
 from loguru import logger
-from config.settings import settings
+from utils.geo import TRANSIT_PORTS
+from utils.spatial_index import position_index, lane_ports, congestion_level, describe_congestion
 
 
 class RouteAgent:
     """AI Agent for route optimization"""
     
     def __init__(self):
-        self.llm = ChatMistralAI(
-            model=settings.MISTRAL_MODEL,
-            temperature=0.7,
-            mistral_api_key=settings.MISTRAL_API_KEY
-        )
-        logger.info("RouteAgent initialized with Mistral AI")
+        self.llm = GuardedLLM(temperature=0.7)
+        logger.info(f"RouteAgent initialized with {self.llm}")
     
     async def execute(self, input_data: dict) -> dict:
         """Execute route optimization workflow"""
@@ -28,7 +26,9 @@ class RouteAgent:
             priority = input_data.get('priority', 'standard')
             vehicle_type = input_data.get('vehicle_type', 'sedan')
             
-            logger.info(f"Optimizing route for shipment {shipment_id}")
+            logger.debug("Optimizing route for shipment {}", shipment_id)
+            
+            congestion = position_index.port_densities(lane_ports(origin, destination))
             
             prompt = f"""Suggest the optimal shipping route for this shipment:
 
@@ -38,10 +38,13 @@ Shipment Details:
 - Priority: {priority}
 - Vehicle Type: {vehicle_type}
 
+Live port congestion on this lane:
+{describe_congestion(congestion)}
+
 Consider:
 1. Shipping time (faster vs economical)
 2. Cost efficiency
-3. Port congestion
+3. Port congestion (use the live counts above)
 4. Seasonal factors
 5. Route reliability
 
@@ -54,8 +57,9 @@ Provide:
 
 Format as JSON with keys: recommended_route, transit_time_days, cost_range, alternative_routes, reasoning, confidence_score"""
 
-            response = self.llm.invoke(prompt)
+            response = await self.llm.ainvoke(prompt)
             optimization = self._parse_optimization(response.content, origin, destination)
+            optimization["port_congestion"] = congestion
             
             return {
                 "success": True,
@@ -94,34 +98,51 @@ Format as JSON with keys: recommended_route, transit_time_days, cost_range, alte
         }
     
     def _get_fallback_route(self, input_data: dict) -> dict:
-        """Fallback route when AI is unavailable"""
+        """Fallback route when AI is unavailable, ranked by live transit port congestion"""
+        agent_fallbacks.labels("route").inc()
         origin = input_data.get('origin', 'Japan')
         
         routes = {
             "Japan": {
-                "route": "Yokohama/Tokyo → Mombasa → Port Bell",
+                "origin_port": "Yokohama/Tokyo",
                 "days": 40,
                 "cost": "$2,500 - $3,500"
             },
             "UK": {
-                "route": "Southampton → Mombasa → Port Bell",
+                "origin_port": "Southampton",
                 "days": 35,
                 "cost": "$3,000 - $4,000"
             },
             "UAE": {
-                "route": "Dubai → Mombasa → Port Bell",
+                "origin_port": "Dubai",
                 "days": 30,
                 "cost": "$2,000 - $3,000"
             }
         }
         
+        # Extra days when discharging at each transit port instead of Mombasa
+        transit_offsets = {"Mombasa": 0, "Dar es Salaam": 3}
+        
         route_data = routes.get(origin, routes["Japan"])
+        congestion = position_index.port_densities(TRANSIT_PORTS)
+        
+        options = []
+        for port in TRANSIT_PORTS:
+            level, extra_days = congestion_level(congestion[port])
+            options.append({
+                "route": f"{route_data['origin_port']} → {port} → Port Bell",
+                "transit_time_days": route_data["days"] + transit_offsets.get(port, 0) + extra_days,
+                "congestion": level
+            })
+        options.sort(key=lambda option: option["transit_time_days"])
+        best = options[0]
         
         return {
-            "recommended_route": route_data["route"],
-            "transit_time_days": route_data["days"],
+            "recommended_route": best["route"],
+            "transit_time_days": best["transit_time_days"],
             "cost_range": route_data["cost"],
-            "alternative_routes": [],
-            "reasoning": "Standard route for this origin",
-            "confidence_score": 0.7
+            "alternative_routes": options[1:],
+            "reasoning": f"Standard route for this origin; {best['congestion']} congestion at the transit port",
+            "confidence_score": 0.7,
+            "port_congestion": congestion
         }
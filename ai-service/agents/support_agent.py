@@ -3,90 +3,244 @@ Customer Support Agent
 Handles customer inquiries about shipping, tracking, and general support
 """
 
-from langchain_mistralai import ChatMistralAI
+import asyncio
+import uuid
+from typing import AsyncIterator
+from utils.llm import GuardedLLM
+from utils.metrics import agent_fallbacks
+from utils.tracing import traced
 from loguru import logger
 from config.settings import settings
+from utils.transit_stats import transit_stats
+from utils.conversation_store import conversation_store, estimate_tokens, fit_to_budget
+from agents.support_knowledge import build_knowledge_index
+from agents.support_context import support_context
+
+# Origins we ship from, as used in lane statistics
+ORIGINS = ["japan", "uk", "uae"]
+
+ESCALATION_KEYWORDS = [
+    'complaint', 'problem', 'issue', 'urgent', 'emergency',
+    'speak to', 'talk to', 'human', 'manager', 'refund'
+]
+
+SYSTEM_PROMPT = """You are a helpful customer support agent for ShipWithGlowie, a car shipping company that ships vehicles from Japan, UK, and UAE to Uganda.
+
+Answer using the information below. Be friendly, professional, and helpful. If the information does not cover the question, suggest they contact support or request a quote."""
 
 
 class SupportAgent:
     """AI Agent for customer support"""
     
     def __init__(self):
-        self.llm = ChatMistralAI(
-            model=settings.MISTRAL_MODEL,
-            temperature=0.7,
-            mistral_api_key=settings.MISTRAL_API_KEY
-        )
-        logger.info("SupportAgent initialized with Mistral AI")
+        self.llm = GuardedLLM(temperature=0.7)
+        self.knowledge = build_knowledge_index()
+        self._background = set()
+        logger.info(f"SupportAgent initialized with {self.llm}")
     
     async def execute(self, input_data: dict) -> dict:
         """Execute support query workflow"""
+        conversation_id = input_data.get('conversation_id') or uuid.uuid4().hex
         try:
-            query = input_data.get('query', '')
-            context = input_data.get('context', 'general')
-            customer_id = input_data.get('customer_id', 0)
-            
-            logger.info(f"Processing support query: {query[:50]}...")
+            plan = await self._prepare(input_data, conversation_id)
+            if plan["answer"] is not None:
+                return await self._finish(plan, plan["answer"])
             
-            # Create system prompt with company knowledge
-            system_prompt = """You are a helpful customer support agent for ShipWithGlowie, a car shipping company that ships vehicles from Japan, UK, and UAE to Uganda.
-
-Company Information:
-- We ship cars, SUVs, trucks, motorcycles, and luxury vehicles
-- Shipping methods: RoRo (Roll-on/Roll-off) and Container shipping
-- Origins: Japan, UK, UAE
-- Destination: Uganda (Port Bell, Kampala)
-- Shipping time: 25-50 days depending on origin
-- We handle customs clearance, documentation, and inland transport
-
-Pricing (approximate):
-- Japan RoRo: $1,500-2,000 base
-- UK RoRo: $1,800-2,300 base
-- UAE RoRo: $1,100-1,600 base
-- Container shipping: +$500
-- Additional fees: Customs duty (~$800), VAT (18%), Levies (~$350)
-
-Services:
-- Free quote generation
-- Real-time shipment tracking
-- Full insurance coverage
-- Customs clearance assistance
-- Inland transport to any location in Uganda
-- Document processing support
-
-Be friendly, professional, and helpful. Provide specific information when possible. If you don't know something, suggest they contact support or request a quote."""
-
-            # Generate response
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query}
-            ]
+            response = await self.llm.ainvoke(plan["messages"])
+            return await self._finish(plan, response.content)
             
-            response = self.llm.invoke(messages)
-            response_text = response.content
-            
-            # Determine if human assistance is needed
-            requires_human = any(keyword in query.lower() for keyword in [
-                'complaint', 'problem', 'issue', 'urgent', 'emergency', 
-                'speak to', 'talk to', 'human', 'manager', 'refund'
-            ])
+        except Exception as e:
+            logger.error(f"Support agent error: {str(e)}")
+            return self._fallback_result(input_data, conversation_id)
+    
+    async def stream(self, input_data: dict) -> AsyncIterator[dict]:
+        """
+        Execute support query workflow, streaming the answer
+        
+        Yields {"type": "token", "content": ...} events while the LLM writes,
+        then one {"type": "done", ...} event carrying the same fields as
+        execute(). FAQ and fallback answers arrive as a single "done" event.
+        Cancelling the consumer aborts the LLM call and nothing is stored.
+        """
+        conversation_id = input_data.get('conversation_id') or uuid.uuid4().hex
+        try:
+            plan = await self._prepare(input_data, conversation_id)
+            if plan["answer"] is not None:
+                yield {"type": "done", **await self._finish(plan, plan["answer"])}
+                return
             
-            return {
-                "success": True,
-                "response": response_text,
-                "confidence_score": 0.85,
-                "requires_human": requires_human,
-                "suggestions": self._get_suggestions(query)
-            }
+            parts = []
+            async for chunk in self.llm.astream(plan["messages"]):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield {"type": "token", "content": chunk.content}
+            yield {"type": "done", **await self._finish(plan, "".join(parts))}
             
         except Exception as e:
-            logger.error(f"Support agent error: {str(e)}")
-            return {
-                "success": False,
-                "response": self._get_fallback_response(input_data.get('query', '')),
-                "confidence_score": 0.5,
-                "requires_human": False
+            logger.error(f"Support agent stream error: {str(e)}")
+            yield {"type": "done", **self._fallback_result(input_data, conversation_id)}
+    
+    @traced("support.prepare")
+    async def _prepare(self, input_data: dict, conversation_id: str) -> dict:
+        """
+        Load history and decide how to answer
+        
+        Returns a plan with either a ready FAQ "answer" or the LLM "messages".
+        """
+        query = input_data.get('query', '')
+        customer_id = input_data.get('customer_id', 0)
+        shipment_id = input_data.get('shipment_id')
+        
+        logger.debug("Processing support query: {}...", query[:50])
+        
+        # Start the customer/shipment prefetch alongside the history load;
+        # it is only awaited if the question goes to the LLM
+        prefetch = asyncio.create_task(support_context.assemble(customer_id, shipment_id)) if customer_id else None
+        
+        try:
+            # Server-side history, kept per customer so a conversation id is
+            # only ever resumed by the customer it belongs to; stateless
+            # callers may still send their own
+            session = f"{customer_id or 0}:{conversation_id}"
+            summary, history = await conversation_store.load(session)
+            if not summary and not history:
+                history = [
+                    turn for turn in input_data.get('conversation_history') or []
+                    if turn.get('role') in ('user', 'assistant') and turn.get('content')
+                ]
+        
+            plan = {
+                "conversation_id": conversation_id,
+                "session": session,
+                "query": query,
+                "history": history,
+                # Determine if human assistance is needed
+                "requires_human": any(keyword in query.lower() for keyword in ESCALATION_KEYWORDS),
+                "answer": None,
+                "messages": None,
+                "related_shipments": [],
             }
+        
+            # Answer FAQ-class questions straight from the knowledge index
+            hits = self._retrieve(query)
+            if hits and not plan["requires_human"]:
+                doc, _, coverage = hits[0]
+                if doc["type"] == "faq" and coverage >= settings.SUPPORT_FAQ_CONFIDENCE:
+                    logger.debug("Answered from FAQ '{}' (coverage {:.2f})", doc['id'], coverage)
+                    if prefetch:
+                        prefetch.cancel()
+                    plan.update(answer=self._render(doc["answer"]), confidence_score=round(coverage, 2), answered_by="faq")
+                    return plan
+        
+            # Otherwise ask the LLM, grounded on the retrieved passages only
+            passages = "\n".join(f"- {self._render(doc['answer'])}" for doc, _, _ in hits)
+            system_prompt = f"""{SYSTEM_PROMPT}
+
+    Relevant information:
+    {passages or "- No specific information found"}"""
+            customer_context = await prefetch if prefetch else None
+            if customer_context:
+                system_prompt += f"\n\nCustomer context:\n{customer_context}"
+                if shipment_id:
+                    plan["related_shipments"] = [shipment_id]
+            if summary:
+                system_prompt += f"\n\nSummary of the earlier conversation:\n{summary}"
+        
+            plan.update(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    *fit_to_budget(history, settings.SUPPORT_HISTORY_TOKEN_BUDGET),
+                    {"role": "user", "content": query}
+                ],
+                confidence_score=0.85,
+                answered_by="llm"
+            )
+            return plan
+        except BaseException:
+            # Not awaited on this path: stop it rather than leave it running unobserved
+            if prefetch:
+                prefetch.cancel()
+            raise
+    
+    async def _finish(self, plan: dict, response_text: str) -> dict:
+        """Store the turn and build the response payload"""
+        await self._remember(plan["session"], plan["history"], plan["query"], response_text)
+        return {
+            "success": True,
+            "response": response_text,
+            "confidence_score": plan["confidence_score"],
+            "requires_human": plan["requires_human"],
+            "answered_by": plan["answered_by"],
+            "conversation_id": plan["conversation_id"],
+            "related_shipments": plan["related_shipments"],
+            "suggestions": self._get_suggestions(plan["query"])
+        }
+    
+    def _fallback_result(self, input_data: dict, conversation_id: str) -> dict:
+        agent_fallbacks.labels("support").inc()
+        return {
+            "success": False,
+            "response": self._get_fallback_response(input_data.get('query', '')),
+            "confidence_score": 0.5,
+            "requires_human": False,
+            "answered_by": "fallback",
+            "conversation_id": conversation_id
+        }
+    
+    async def _remember(self, session: str, history: list, query: str, response_text: str):
+        """Store the turn pair and compact in the background once over budget"""
+        turns = [
+            {"role": "user", "content": query},
+            {"role": "assistant", "content": response_text}
+        ]
+        if not await conversation_store.append(session, turns):
+            return
+        
+        stored_tokens = sum(estimate_tokens(turn["content"]) for turn in history + turns)
+        if stored_tokens > settings.SUPPORT_HISTORY_TOKEN_BUDGET:
+            task = asyncio.create_task(conversation_store.compact(
+                session, self._summarize, settings.SUPPORT_HISTORY_TOKEN_BUDGET
+            ))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+    
+    async def _summarize(self, summary: str, turns: list) -> str:
+        """Fold older turns into the rolling conversation summary"""
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        prompt = f"""Update the summary of this customer support conversation.
+Keep facts the agent will need later (vehicle, origin, shipment or booking references, open questions).
+Reply with the summary only, in under {settings.SUPPORT_SUMMARY_TOKENS * 3 // 4} words.
+
+Current summary:
+{summary or "(none)"}
+
+New turns:
+{transcript}"""
+        try:
+            response = await self.llm.ainvoke(prompt)
+            return response.content.strip()
+        except Exception as e:
+            logger.warning(f"Conversation summary failed, keeping customer questions: {str(e)}")
+            questions = " | ".join(turn["content"] for turn in turns if turn["role"] == "user")
+            combined = f"{summary} | {questions}" if summary else questions
+            return combined[-settings.SUPPORT_SUMMARY_TOKENS * 4:]
+    
+    def _retrieve(self, query: str) -> list:
+        """Top passages for a query, one per FAQ entry"""
+        hits = []
+        seen = set()
+        for doc, score, coverage in self.knowledge.search(query, k=settings.SUPPORT_CONTEXT_PASSAGES * 4):
+            if doc["id"] not in seen:
+                seen.add(doc["id"])
+                hits.append((doc, score, coverage))
+            if len(hits) == settings.SUPPORT_CONTEXT_PASSAGES:
+                break
+        return hits
+    
+    def _render(self, text: str) -> str:
+        """Fill dynamic values into a knowledge base answer"""
+        shipping_time = transit_stats.describe(ORIGINS) or "25-50 days depending on origin"
+        return text.replace("{shipping_time}", shipping_time)
     
     def _get_suggestions(self, query: str) -> list:
         """Get suggested follow-up questions"""
@@ -124,6 +278,9 @@ Be friendly, professional, and helpful. Provide specific information when possib
         if 'cost' in query_lower or 'price' in query_lower:
             return "Shipping costs vary based on vehicle type and origin. Typical range is $2,500-$4,500. Get an instant quote on our website!"
         elif 'time' in query_lower or 'long' in query_lower:
+            observed = transit_stats.describe(ORIGINS)
+            if observed:
+                return f"Based on recent shipments, delivery times are: {observed}. This includes customs clearance."
             return "Shipping takes 25-50 days: Japan (40-45 days), UK (30-35 days), UAE (25-30 days). This includes customs clearance."
         elif 'track' in query_lower:
             return "You can track your shipment in real-time using your tracking number on our Track Shipment page."
@@ -0,0 +1,164 @@
+"""
+Support Context Assembly
+Fetches customer, shipment and tracking data concurrently for grounded answers
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+
+from config.settings import settings
+from tools.laravel_api import laravel_api
+from utils.metrics import cache_requests
+from utils.tracing import traced
+from utils.logger import throttled
+
+
+def _unwrap(payload: Optional[dict]) -> Optional[dict]:
+    """Strip Laravel's {"success": ..., "data": {...}} envelope"""
+    if isinstance(payload, dict) and isinstance(payload.get("data"), dict):
+        return payload["data"]
+    return payload
+
+
+def _owner(shipment: dict) -> Optional[int]:
+    """Customer id a shipment belongs to, if the payload says"""
+    owner = shipment.get("customer_id") or (shipment.get("booking") or {}).get("customer_id")
+    return int(owner) if owner else None
+
+
+def _clip(value: Any, limit: int = 80) -> str:
+    text = str(value)
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class SupportContext:
+    """
+    Concurrent, cached context prefetch for support queries
+
+    Customer, shipment and tracking lookups start together and the caller
+    waits at most the latency budget. Lookups still running at the deadline
+    are left to finish in the background and land in the cache, so the next
+    message in the conversation gets them for free. Cache entries are
+    scoped to the requesting customer, and the cache is an LRU bounded by
+    SUPPORT_CONTEXT_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self, api=laravel_api):
+        self.api = api
+        self._cache: "OrderedDict[Tuple, Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+
+    @traced("support.context")
+    async def assemble(self, customer_id: int, shipment_id: Optional[int] = None) -> Optional[str]:
+        """
+        Build a compact context summary within the latency budget
+
+        Returns:
+            Prompt-ready summary, or None if nothing arrived in time
+        """
+        sources = {"customer": (self.api.get_customer, customer_id)}
+        if shipment_id:
+            sources["shipment"] = (self.api.get_shipment, shipment_id)
+            sources["tracking"] = (self.api.get_shipment_tracking, shipment_id)
+
+        results: Dict[str, Optional[dict]] = {}
+        waiting = {}
+        for name, (fetch, key) in sources.items():
+            cache_key = (customer_id, name, key)
+            cached = self._cached(cache_key)
+            if cached is not None:
+                cache_requests.labels("support_context", "hit").inc()
+                results[name] = cached[1]
+            else:
+                cache_requests.labels("support_context", "miss").inc()
+                waiting[name] = self._fetch(cache_key, fetch, key)
+
+        if waiting:
+            done, pending = await asyncio.wait(waiting.values(), timeout=settings.SUPPORT_CONTEXT_BUDGET_MS / 1000)
+            for name, task in waiting.items():
+                if task in done and not task.cancelled() and task.exception() is None:
+                    results[name] = task.result()
+            if pending:
+                throttled("support.context_budget").warning("Support context budget exceeded, proceeding without {} lookups", len(pending))
+
+        return self._summarize(customer_id, results)
+
+    def _cached(self, cache_key: Tuple) -> Optional[Tuple[float, Optional[dict]]]:
+        """Unexpired cache entry (expired ones are dropped on the way)"""
+        cached = self._cache.get(cache_key)
+        if cached is None:
+            return None
+        if cached[0] <= time.monotonic():
+            del self._cache[cache_key]
+            return None
+        self._cache.move_to_end(cache_key)
+        return cached
+
+    def _remember(self, cache_key: Tuple, result: Optional[dict]):
+        self._cache[cache_key] = (time.monotonic() + settings.SUPPORT_CONTEXT_CACHE_TTL, result)
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > settings.SUPPORT_CONTEXT_CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+
+    def _fetch(self, cache_key: Tuple, fetch, key) -> asyncio.Task:
+        """Start (or join) a lookup whose result is cached on completion"""
+        task = self._inflight.get(cache_key)
+        if task is None:
+            async def run():
+                try:
+                    result = _unwrap(await fetch(key))
+                    self._remember(cache_key, result)
+                    return result
+                finally:
+                    self._inflight.pop(cache_key, None)
+
+            task = self._inflight[cache_key] = asyncio.create_task(run())
+        return task
+
+    def _summarize(self, customer_id: int, results: Dict[str, Optional[dict]]) -> Optional[str]:
+        lines = []
+
+        customer = results.get("customer")
+        if customer:
+            name = customer.get("full_name") or " ".join(
+                filter(None, [customer.get("first_name"), customer.get("last_name")])
+            )
+            if name:
+                lines.append(f"- Customer: {_clip(name)}")
+
+        shipment = results.get("shipment")
+        if isinstance(shipment, dict) and isinstance(shipment.get("shipment"), dict):
+            # TrackingController::show nests the record beside its tracking data
+            shipment = shipment["shipment"]
+        if shipment:
+            # Only shown to its known owner: no owner in the payload means no context
+            if _owner(shipment) != int(customer_id):
+                logger.warning(f"Shipment {shipment.get('id')} is not known to belong to customer {customer_id}")
+                return "\n".join(lines) or None
+            details = [
+                f"status {shipment.get('status', 'unknown')}",
+                f"location {_clip(shipment.get('current_location') or 'unknown')}",
+            ]
+            if shipment.get("port_of_loading") or shipment.get("port_of_discharge"):
+                details.append(f"route {shipment.get('port_of_loading', '?')} → {shipment.get('port_of_discharge', '?')}")
+            if shipment.get("estimated_arrival"):
+                details.append(f"ETA {shipment['estimated_arrival']}")
+            reference = shipment.get("tracking_number") or shipment.get("id")
+            lines.append(f"- Shipment {reference}: " + ", ".join(details))
+
+            tracking = results.get("tracking") or {}
+            history = tracking.get("tracking_history") or []
+            if history:
+                latest = history[-1] if isinstance(history, list) else history
+                if isinstance(latest, dict):
+                    latest = latest.get("description") or latest.get("status") or latest
+                lines.append(f"- Latest tracking update: {_clip(latest, 160)}")
+
+        return "\n".join(lines) or None
+
+
+# Singleton instance
+support_context = SupportContext()
@@ -0,0 +1,145 @@
+"""
+Support Knowledge Base
+Curated FAQ and company information used by the Support Agent
+"""
+
+from utils.retrieval import BM25Index
+
+# Each FAQ is indexed once per question variant. Answers may use the
+# {shipping_time} placeholder, filled from observed transit times.
+FAQS = [
+    {
+        "id": "shipping_time",
+        "questions": [
+            "How long does shipping take?",
+            "How many days does delivery take?",
+            "What is the transit time?",
+            "When will my car arrive?",
+        ],
+        "answer": "Shipping typically takes {shipping_time}. This includes customs clearance.",
+    },
+    {
+        "id": "shipping_cost",
+        "questions": [
+            "How much does shipping cost?",
+            "What is the price to ship a car?",
+            "What are your shipping rates?",
+            "How much does it cost to ship my car?",
+        ],
+        "answer": "Shipping costs vary by vehicle type, origin and shipping method. RoRo base rates are about "
+                  "$1,500-2,000 from Japan, $1,800-2,300 from the UK and $1,100-1,600 from the UAE; container "
+                  "shipping adds about $500. With duty, VAT and levies, typical totals are $2,500-$4,500. "
+                  "Get an instant quote on our website!",
+    },
+    {
+        "id": "documents",
+        "questions": [
+            "What documents do I need?",
+            "Which paperwork is required to import a car?",
+        ],
+        "answer": "You'll need: Vehicle registration, Bill of sale, Valid ID, Import permit. "
+                  "We'll guide you through the process!",
+    },
+    {
+        "id": "tracking",
+        "questions": [
+            "How can I track my shipment?",
+            "Where do I find my tracking number?",
+        ],
+        "answer": "You can track your shipment in real-time using your tracking number on our Track Shipment page. "
+                  "Your tracking number is in your booking confirmation.",
+    },
+    {
+        "id": "shipping_methods",
+        "questions": [
+            "What shipping methods do you offer?",
+            "What is RoRo shipping?",
+            "What is the difference between RoRo and container shipping?",
+        ],
+        "answer": "We offer RoRo (Roll-on/Roll-off), where the vehicle is driven onto the vessel, and container "
+                  "shipping, where it travels in a sealed container for extra protection. Container shipping "
+                  "costs about $500 more.",
+    },
+    {
+        "id": "origins",
+        "questions": [
+            "Which countries do you ship from?",
+            "Do you ship cars from Japan, UK or UAE?",
+        ],
+        "answer": "We ship vehicles from Japan, the UK and the UAE to Uganda (Port Bell, Kampala).",
+    },
+    {
+        "id": "vehicle_types",
+        "questions": [
+            "What vehicles can you ship?",
+            "Do you ship motorcycles, trucks or SUVs?",
+        ],
+        "answer": "We ship cars, SUVs, trucks, motorcycles, and luxury vehicles.",
+    },
+    {
+        "id": "customs",
+        "questions": [
+            "Do you handle customs clearance?",
+            "How much is import duty and tax?",
+        ],
+        "answer": "Yes, we handle customs clearance. Expect customs duty (around $800, depending on engine size "
+                  "and vehicle age), 18% VAT and about $350 in levies. Every quote includes an estimate.",
+    },
+    {
+        "id": "insurance",
+        "questions": [
+            "Is my car insured during shipping?",
+            "Do you offer insurance?",
+        ],
+        "answer": "Yes, every shipment includes full insurance coverage from pickup to delivery.",
+    },
+    {
+        "id": "inland_transport",
+        "questions": [
+            "Do you deliver inland to my town?",
+            "Can you transport the car to my location in Uganda?",
+        ],
+        "answer": "Yes, we provide inland transport from Port Bell to any location in Uganda.",
+    },
+    {
+        "id": "quote",
+        "questions": [
+            "How do I get a quote?",
+            "Can I get a free quote?",
+        ],
+        "answer": "You can get a free instant quote on our website: enter your vehicle details, origin and "
+                  "shipping method and we'll show a full cost breakdown.",
+    },
+    {
+        "id": "contact",
+        "questions": [
+            "How can I contact support?",
+            "What is your phone number or email?",
+        ],
+        "answer": "You can reach us at support@shipwithglowie.com or +256 700 000 000.",
+    },
+]
+
+# Background passages passed to the LLM as context
+PASSAGES = [
+    "ShipWithGlowie is a car shipping company that ships vehicles from Japan, UK, and UAE to Uganda "
+    "(Port Bell, Kampala).",
+    "Shipping methods: RoRo (Roll-on/Roll-off) and Container shipping. Container shipping costs about $500 more.",
+    "Shipping time: {shipping_time}.",
+    "Pricing (approximate): Japan RoRo $1,500-2,000 base, UK RoRo $1,800-2,300 base, UAE RoRo $1,100-1,600 "
+    "base. Additional fees: Customs duty (~$800), VAT (18%), Levies (~$350).",
+    "Services: free quote generation, real-time shipment tracking, full insurance coverage, customs clearance "
+    "assistance, inland transport to any location in Uganda, document processing support.",
+    "We ship cars, SUVs, trucks, motorcycles, and luxury vehicles.",
+]
+
+
+def build_knowledge_index() -> BM25Index:
+    """Build the support retrieval index"""
+    index = BM25Index()
+    for faq in FAQS:
+        for question in faq["questions"]:
+            index.add(question, type="faq", id=faq["id"], answer=faq["answer"])
+    for number, passage in enumerate(PASSAGES):
+        index.add(passage, type="passage", id=f"passage_{number}", answer=passage)
+    return index
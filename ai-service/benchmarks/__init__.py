@@ -0,0 +1 @@
+"""Benchmarks package - performance comparisons for hot code paths"""
@@ -0,0 +1,55 @@
+"""
+Benchmark: scalar vs vectorized Haversine distances
+Run with: python -m benchmarks.geo_distance [num_positions]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from utils.geo import PORTS, nearest_k, pairwise_distances
+from utils.helpers import calculate_distance
+
+
+def random_positions(n: int, seed: int = 42) -> np.ndarray:
+    """Generate n random (lat, lon) positions"""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(-60, 60, n), rng.uniform(-180, 180, n)])
+
+
+def scalar_nearest(positions: np.ndarray, ports: list) -> list:
+    """Nearest port per position using the scalar helper"""
+    result = []
+    for lat, lon in positions:
+        distances = [calculate_distance(lat, lon, plat, plon) for plat, plon in ports]
+        result.append(min(range(len(ports)), key=distances.__getitem__))
+    return result
+
+
+def timed(fn, *args):
+    """Run fn and return (result, seconds)"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    positions = random_positions(n)
+    ports = list(PORTS.values())
+
+    scalar, scalar_time = timed(scalar_nearest, positions, ports)
+    (indices, _), vector_time = timed(nearest_k, positions, ports, 1)
+    assert scalar == indices[:, 0].tolist(), "vectorized result differs from scalar"
+
+    print(f"Nearest port for {n} positions x {len(ports)} ports")
+    print(f"  scalar:     {scalar_time * 1000:9.2f} ms")
+    print(f"  vectorized: {vector_time * 1000:9.2f} ms  ({scalar_time / vector_time:.0f}x)")
+
+    _, matrix_time = timed(pairwise_distances, positions[:2000])
+    print(f"Pairwise matrix 2000 x 2000: {matrix_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
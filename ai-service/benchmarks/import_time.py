@@ -0,0 +1,96 @@
+"""
+Benchmark: import cost of the service at startup
+Run with: python -m benchmarks.import_time [module] [top_n]
+
+Imports the module in a fresh interpreter under `python -X importtime` and
+lists the most expensive top-level packages, so a heavy dependency creeping
+back into main.py's import chain shows up before it reaches a deploy.
+"""
+
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+# Modules main.py must not import eagerly (each is loaded on first use or by the startup preload)
+HEAVY_MODULES = (
+    "langgraph", "langchain_core", "langchain_mistralai", "pandas", "pyarrow",
+    "pytesseract", "pdf2image", "PIL", "sqlalchemy",
+)
+
+
+class ImportEntry(NamedTuple):
+    name: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def _run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    env.setdefault("MISTRAL_API_KEY", "import-time-report")
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        capture_output=True, text=True, env=env, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+
+
+def import_profile(module: str = "main") -> List[ImportEntry]:
+    """Parse `-X importtime` output for importing module in a fresh interpreter"""
+    result = _run(f"import {module}", "-X", "importtime")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append(ImportEntry(name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def import_seconds(module: str = "main") -> float:
+    """Wall time to import module in a fresh interpreter"""
+    result = _run(
+        "import time\n"
+        "started = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - started)"
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def loaded_modules(module: str = "main") -> List[str]:
+    """Top-level packages in sys.modules after importing module"""
+    result = _run(f"import sys, {module}\nprint(' '.join(sorted({{name.split('.')[0] for name in sys.modules}})))")
+    return result.stdout.split()
+
+
+def by_package(entries: List[ImportEntry]) -> Dict[str, int]:
+    """Self time (us) per top-level package"""
+    totals: Dict[str, int] = defaultdict(int)
+    for entry in entries:
+        totals[entry.name.split(".")[0]] += entry.self_us
+    return totals
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "main"
+    top_n = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+
+    entries = import_profile(module)
+    total = max((entry.cumulative_us for entry in entries if entry.name == module), default=0)
+    print(f"import {module}: {total / 1e6:.3f}s (importtime), {import_seconds(module):.3f}s (wall)\n")
+
+    print(f"{'package':<28}{'self (ms)':>12}{'share':>9}")
+    for package, self_us in sorted(by_package(entries).items(), key=lambda kv: -kv[1])[:top_n]:
+        print(f"{package:<28}{self_us / 1e3:>12.1f}{self_us / max(total, 1):>9.1%}")
+
+    heavy = [name for name in HEAVY_MODULES if name in {entry.name.split(".")[0] for entry in entries}]
+    if heavy:
+        print(f"\nHeavy modules imported eagerly: {', '.join(heavy)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Pricing tables
+Shared rate cards used by quote generation and container consolidation
+"""
+
+# Base rates (USD per vehicle) by origin country and shipping method
+BASE_RATES = {
+    "japan": {"roro": 1500, "container": 2200},
+    "uk": {"roro": 1800, "container": 2800},
+    "uae": {"roro": 1100, "container": 1600},
+    "usa": {"roro": 2000, "container": 3000}
+}
+
+DEFAULT_BASE_RATE = 1500
+
+# Vehicle type multiplier (includes all supported types)
+VEHICLE_MULTIPLIERS = {
+    "sedan": 1.0,
+    "suv": 1.2,
+    "truck": 1.3,
+    "van": 1.25,
+    "luxury": 1.5,
+    "motorcycle": 0.7,
+    "hatchback": 0.95,
+    "wagon": 1.05,
+    "coupe": 1.0,
+    "convertible": 1.1,
+}
+
+# Container consolidation: a 40ft container holds 12 floor slots
+CONTAINER_40FT_CAPACITY = 12
+
+# A shared 40ft container costs this multiple of the per-vehicle container rate
+CONTAINER_40FT_RATE_FACTOR = 2.5
+
+# Floor slots taken by each size class
+SIZE_CLASS_UNITS = {
+    "motorcycle": 1,
+    "sedan": 3,
+    "suv": 4,
+    "truck": 6,
+}
+
+# Size class for each supported vehicle type
+VEHICLE_SIZE_CLASSES = {
+    "sedan": "sedan",
+    "suv": "suv",
+    "truck": "truck",
+    "van": "suv",
+    "luxury": "sedan",
+    "motorcycle": "motorcycle",
+    "hatchback": "sedan",
+    "wagon": "sedan",
+    "coupe": "sedan",
+    "convertible": "sedan",
+}
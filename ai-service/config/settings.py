@@ -3,8 +3,9 @@ Application Settings
 Loads configuration from environment variables
 """
 
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class Settings(BaseSettings):
@@ -17,11 +18,51 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8001
     
-    # Mistral AI
-    MISTRAL_API_KEY: str
+    # Production server (gunicorn.conf.py)
+    WEB_WORKERS: int = 0
+    WEB_PRELOAD: bool = True
+    WEB_MAX_REQUESTS: int = 0
+    SHUTDOWN_DRAIN_SECONDS: float = 5.0
+    SHUTDOWN_GRACE_SECONDS: float = 120.0
+    METRICS_MULTIPROC_DIR: str = "/tmp/ai-service-metrics"
+    
+    # Mistral AI (key required by the mistral and record backends)
+    MISTRAL_API_KEY: Optional[str] = None
     MISTRAL_MODEL: str = "mistral-large-latest"
     MISTRAL_TEMPERATURE: float = 0.7
     
+    # LLM Backend (mistral, fake, record or replay)
+    LLM_BACKEND: str = "mistral"
+    LLM_FAKE_LATENCY: float = 0.0
+    LLM_FAKE_LATENCY_SIGMA: float = 0.5
+    LLM_FAKE_ERROR_RATE: float = 0.0
+    LLM_FAKE_SEED: int = 0
+    LLM_RECORDINGS_PATH: str = "./data/llm_recordings.jsonl"
+    LLM_REPLAY_FALLBACK: bool = False
+    
+    # LLM Circuit Breaker
+    LLM_TIMEOUT: float = 30.0
+    LLM_BREAKER_WINDOW: int = 50
+    LLM_BREAKER_WINDOW_SECONDS: float = 60.0
+    LLM_BREAKER_MIN_CALLS: int = 5
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_SLOW_SECONDS: float = 20.0
+    LLM_BREAKER_COOLDOWN: float = 30.0
+    LLM_BREAKER_PROBES: int = 1
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_ENDPOINTS: List[str] = ["quote-preview", "support"]
+    LLM_HEDGE_DELAY: float = 3.0
+    LLM_HEDGE_MIN_DELAY: float = 0.5
+    
+    # Request Deadlines (seconds; kept under Laravel's 60s client timeout)
+    REQUEST_DEADLINE_HEADER: str = "X-Request-Timeout"
+    REQUEST_DEADLINE_DEFAULT: float = 55.0
+    REQUEST_DEADLINE_MAX: float = 120.0
+    REQUEST_DEADLINES: Dict[str, float] = {
+        "quote-preview": 10.0, "parse-description": 10.0, "suggest-vehicle": 10.0,
+        "validate-vehicle": 10.0, "support": 20.0
+    }
+    
     # LangSmith (Optional)
     LANGCHAIN_TRACING_V2: bool = False
     LANGCHAIN_ENDPOINT: Optional[str] = None
@@ -34,16 +75,69 @@ class Settings(BaseSettings):
     DB_NAME: str = "shipwithglowie"
     DB_USER: str = "root"
     DB_PASSWORD: str = ""
+    DB_DRIVER: str = "mysql+aiomysql"
+    DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 3600
+    DB_ECHO: bool = False
+    
+    # Analytics (read-only, ideally a replica)
+    ANALYTICS_DATABASE_URL: Optional[str] = None
+    ANALYTICS_BATCH_SIZE: int = 5000
+    ANALYTICS_WATERMARK_TTL: int = 90 * 86400
+    SNAPSHOT_DIR: str = "data/snapshots"
+    SNAPSHOT_SYNC_INTERVAL: int = 3600
+    SNAPSHOT_MAX_PARTS: int = 16
+    TRANSIT_STATS_SYNC_INTERVAL: float = 30.0
+    POSITIONS_SYNC_INTERVAL: float = 5.0
     
     # Redis
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: Optional[str] = None
     REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_CONNECT_TIMEOUT: float = 2.0
+    REDIS_KEY_PREFIX: str = "sg"
+    REDIS_CODEC: str = "msgpack"
+    REDIS_COMPRESS_MIN_BYTES: int = 1024
+    
+    # Support Agent
+    SUPPORT_FAQ_CONFIDENCE: float = 0.75
+    SUPPORT_CONTEXT_PASSAGES: int = 3
+    SUPPORT_SESSION_TTL: int = 86400
+    SUPPORT_HISTORY_TOKEN_BUDGET: int = 1000
+    SUPPORT_SUMMARY_TOKENS: int = 200
+    SUPPORT_CONTEXT_BUDGET_MS: int = 800
+    SUPPORT_CONTEXT_CACHE_TTL: int = 60
+    SUPPORT_CONTEXT_CACHE_MAX_ENTRIES: int = 2048
+    SUPPORT_WS_MAX_INFLIGHT: int = 4
+    SUPPORT_WS_SEND_TIMEOUT: float = 10.0
+    SUPPORT_WS_MAX_MESSAGE_BYTES: int = 8192
+    SUPPORT_WS_MESSAGES_PER_MINUTE: int = 20
+    
+    # Caller Authentication (secret shared with Laravel; signs customer tokens)
+    SERVICE_SECRET: str = ""
+    CUSTOMER_TOKEN_TTL: int = 3600
     
     # Laravel Backend
     LARAVEL_API_URL: str = "http://localhost:8000/api"
     LARAVEL_API_KEY: Optional[str] = None
+    LARAVEL_CONNECT_TIMEOUT: float = 3.0
+    LARAVEL_READ_TIMEOUT: float = 15.0
+    LARAVEL_MAX_CONNECTIONS: int = 50
+    LARAVEL_MAX_KEEPALIVE: int = 20
+    LARAVEL_KEEPALIVE_EXPIRY: float = 30.0
+    LARAVEL_HTTP2: bool = False
+    LARAVEL_GET_RETRIES: int = 2
+    LARAVEL_RETRY_BACKOFF: float = 0.2
+    LARAVEL_PAGE_SIZE: int = 500
+    LARAVEL_CACHE_TTL: int = 30
+    LARAVEL_CACHE_REDIS_TTL: int = 3600
+    LARAVEL_CACHE_MAX_ENTRIES: int = 2048
     
     # External APIs
     GOOGLE_MAPS_API_KEY: Optional[str] = None
@@ -64,14 +158,61 @@ class Settings(BaseSettings):
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "logs/ai-service.log"
+    LOG_JSON: bool = False
+    LOG_ENQUEUE: bool = True
+    LOG_LEVELS: Dict[str, str] = {}
+    LOG_THROTTLE_SECONDS: float = 10.0
+    LOG_FILE_COMPRESSION: Optional[str] = "zip"
+    
+    # Metrics
+    METRICS_ENABLED: bool = True
+    METRICS_LOOP_LAG_INTERVAL: float = 0.5
+    
+    # Tracing
+    TRACING_ENABLED: bool = True
+    TRACING_SAMPLE_RATE: float = 0.1
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE: str = "logs/traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_EXPORT_INTERVAL: float = 5.0
+    TRACING_MAX_QUEUE: int = 10000
+    TRACING_SERVICE_NAME: str = "shipwithglowie-ai-service"
+    TRACING_DEBUG_HEADER: str = "X-Debug-Timing"
     
-    # Rate Limiting
+    # Rate Limiting & Admission Control
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_BURST: Optional[int] = None
+    RATE_LIMIT_CLIENT_HEADER: str = "X-Client-Id"
+    RATE_LIMIT_TRUSTED_PROXIES: List[str] = []
+    SERVICE_KEY_HEADER: str = "X-Service-Key"
+    AGENT_CONCURRENCY: Dict[str, int] = {"document": 2, "quote": 8, "route": 4, "support": 16, "delay": 4}
+    AGENT_CONCURRENCY_DEFAULT: int = 8
+    AGENT_QUEUE_SIZE: int = 16
+    AGENT_QUEUE_TIMEOUT: float = 5.0
+    
+    # Warm-up (runs after the server is up; /ready reports when it is done)
+    WARMUP_AGENTS: List[str] = ["quote", "support", "route", "delay", "document", "consolidation", "notification"]
+    WARMUP_CONNECT: bool = True
+    WARMUP_TIMEOUT: float = 60.0
     
     class Config:
         env_file = ".env"
         case_sensitive = True
 
+    @model_validator(mode="after")
+    def _require_mistral_key(self):
+        if self.LLM_BACKEND in ("mistral", "record") and not self.MISTRAL_API_KEY:
+            raise ValueError(f"MISTRAL_API_KEY is required with LLM_BACKEND={self.LLM_BACKEND}")
+        return self
+
+    @model_validator(mode="after")
+    def _require_service_secret(self):
+        # Without it the backend sends no client ids, and every customer it
+        # forwards shares the backend's one per-address bucket
+        if self.RATE_LIMIT_PER_MINUTE > 0 and not self.SERVICE_SECRET:
+            raise ValueError("SERVICE_SECRET is required while RATE_LIMIT_PER_MINUTE > 0 (or set it to 0)")
+        return self
+
 
 # Create settings instance
 settings = Settings()
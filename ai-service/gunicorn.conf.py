@@ -0,0 +1,60 @@
+"""
+Gunicorn configuration for production
+Run with: gunicorn main:app   (this file is picked up from the working directory)
+
+One uvicorn worker per core by default. With WEB_PRELOAD the master
+imports the app and every agent module before forking, so the workers
+share those modules (and their read-only tables) copy-on-write. Agent
+instances, connection pools and caches are still per worker; anything that
+must be global goes through Redis (rate limits, transit-time digests, live
+shipment positions). The snapshot sync is host-local and picked by a flock
+in SNAPSHOT_DIR.
+"""
+
+import gc
+import importlib
+import multiprocessing
+import os
+import shutil
+
+from config.settings import settings
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WEB_WORKERS or multiprocessing.cpu_count()
+worker_class = "utils.server.ServiceWorker"
+preload_app = settings.WEB_PRELOAD
+max_requests = settings.WEB_MAX_REQUESTS
+max_requests_jitter = max(settings.WEB_MAX_REQUESTS // 10, 0)
+keepalive = 5
+# A worker whose event loop does not check in for this long is restarted
+timeout = 60
+# SIGTERM to SIGKILL: the drain, the in-flight requests and the lifespan shutdown
+graceful_timeout = int(settings.SHUTDOWN_DRAIN_SECONDS + settings.SHUTDOWN_GRACE_SECONDS) + 10
+
+# Prometheus samples from every worker are written here and summed on scrape.
+# Must be set before prometheus_client is imported, i.e. before the preload.
+if settings.METRICS_ENABLED:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = settings.METRICS_MULTIPROC_DIR
+    shutil.rmtree(settings.METRICS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+
+
+def on_starting(server):
+    """Import the agent modules once in the master, then freeze the heap before forking"""
+    if not settings.WEB_PRELOAD:
+        return
+    for name in settings.WARMUP_AGENTS:
+        try:
+            importlib.import_module(f"agents.{name}_agent")
+        except Exception as e:
+            server.log.warning(f"Preloading agents.{name}_agent failed: {e}")
+    # Objects that exist now are never collected, so the garbage collector
+    # does not touch (and copy) the shared pages in every worker
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared metrics"""
+    if settings.METRICS_ENABLED:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
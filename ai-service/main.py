@@ -3,22 +3,29 @@ ShipWithGlowie AI Service - Main Application
 FastAPI server with LangGraph agent orchestration
 """
 
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+import asyncio
 import uvicorn
 from loguru import logger
 
 from config.settings import settings
-from agents.quote_agent import QuoteAgent
-from agents.route_agent import RouteAgent
-from agents.document_agent import DocumentAgent
-from agents.support_agent import SupportAgent
-from agents.delay_agent import DelayAgent
-from agents.notification_agent import NotificationAgent
-from utils.database import init_db, close_db
-from utils.redis_client import init_redis, close_redis
+from utils.logger import setup_logger
+from utils.database import close_db, pool_status
+from utils.redis_client import close_redis
+from tools.laravel_api import laravel_api
+from utils.transit_stats import transit_stats
+from utils.startup import close_analytics, sync_snapshots, warmup
+from utils.support_ws import SupportConnection
+from utils.admission import AdmissionMiddleware
+from utils.deadline import DeadlineMiddleware
+from utils.metrics import MetricsMiddleware, monitor_event_loop, render as render_metrics
+from utils.tracing import TracingMiddleware, span_exporter
+from utils.llm import GuardedLLM, breaker_status
+from utils.spatial_index import position_index, congestion_level, PORT_CONGESTION_RADIUS_KM
 from models.schemas import (
     QuoteRequest,
     QuoteResponse,
@@ -29,9 +36,32 @@ from models.schemas import (
     DocumentResponse,
     DelayPredictionRequest,
     DelayPredictionResponse,
-    HealthResponse
+    ConsolidationRequest,
+    ConsolidationResponse,
+    PositionBatch,
+    PositionBatchResponse,
+    CongestionResponse,
+    TransitTimeBatch,
+    TransitStatsResponse,
+    HealthResponse,
+    ReadinessResponse
 )
 
+# Agents (and langgraph, langchain, pandas and the OCR stack behind them) are
+# imported by their get_*_agent() during warm-up or on first use, so that
+# importing this module stays well under a second
+if TYPE_CHECKING:
+    from agents.quote_agent import QuoteAgent
+    from agents.route_agent import RouteAgent
+    from agents.document_agent import DocumentAgent
+    from agents.support_agent import SupportAgent
+    from agents.delay_agent import DelayAgent
+    from agents.notification_agent import NotificationAgent
+    from agents.consolidation_agent import ConsolidationAgent
+
+
+setup_logger()
+
 
 # Lifespan context manager for startup/shutdown
 @asynccontextmanager
@@ -39,17 +69,42 @@ async def lifespan(app: FastAPI):
     """Handle startup and shutdown events"""
     # Startup
     logger.info("Starting AI Service...")
-    await init_db()
-    await init_redis()
+    # Nothing here waits on MySQL, Redis or agent construction: the server
+    # answers /health immediately and /ready once the warm-up has finished
+    warm_up = asyncio.create_task(warmup.run(AGENT_FACTORIES))
+    snapshot_sync = asyncio.create_task(sync_snapshots()) if settings.SNAPSHOT_SYNC_INTERVAL > 0 else None
+    stats_sync = asyncio.create_task(transit_stats.run_periodic()) if settings.TRANSIT_STATS_SYNC_INTERVAL > 0 else None
+    positions_sync = asyncio.create_task(position_index.run_periodic()) if settings.POSITIONS_SYNC_INTERVAL > 0 else None
+    loop_monitor = asyncio.create_task(monitor_event_loop()) if settings.METRICS_ENABLED else None
+    span_export = asyncio.create_task(span_exporter.run_periodic()) if settings.TRACING_EXPORTER != "none" else None
     logger.info("AI Service started successfully")
     
     yield
     
     # Shutdown
     logger.info("Shutting down AI Service...")
+    warmup.stop()
+    if not warm_up.done():
+        warm_up.cancel()
+    await asyncio.gather(warm_up, return_exceptions=True)
+    if snapshot_sync:
+        snapshot_sync.cancel()
+    if stats_sync:
+        stats_sync.cancel()
+        await asyncio.wait([stats_sync])
+    if positions_sync:
+        positions_sync.cancel()
+    if loop_monitor:
+        loop_monitor.cancel()
+    if span_export:
+        span_export.cancel()
+        await asyncio.wait([span_export])
+    await close_analytics()
+    await laravel_api.close()
     await close_db()
     await close_redis()
     logger.info("AI Service shut down successfully")
+    await logger.complete()
 
 
 # Initialize FastAPI app
@@ -60,6 +115,20 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-client rate limits and per-agent concurrency limits for /agents/*
+# (added first so CORS headers are also set on its 429/503 responses)
+app.add_middleware(AdmissionMiddleware)
+
+# Per-request deadlines for /agents/* (outside admission, so queueing time counts)
+app.add_middleware(DeadlineMiddleware)
+
+# Request rate and latency per route, including rejected and timed-out requests
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Root span per request; Server-Timing breakdown for requests with the debug header
+app.add_middleware(TracingMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -86,73 +155,124 @@ _document_agent = None
 _support_agent = None
 _delay_agent = None
 _notification_agent = None
+_consolidation_agent = None
 
 
-def get_quote_agent() -> QuoteAgent:
+def get_quote_agent() -> "QuoteAgent":
     """Get or create quote agent instance"""
     global _quote_agent
     if _quote_agent is None:
+        from agents.quote_agent import QuoteAgent
         _quote_agent = QuoteAgent()
     return _quote_agent
 
 
-def get_route_agent() -> RouteAgent:
+def get_route_agent() -> "RouteAgent":
     """Get or create route agent instance"""
     global _route_agent
     if _route_agent is None:
+        from agents.route_agent import RouteAgent
         _route_agent = RouteAgent()
     return _route_agent
 
 
-def get_document_agent() -> DocumentAgent:
+def get_document_agent() -> "DocumentAgent":
     """Get or create document agent instance"""
     global _document_agent
     if _document_agent is None:
+        from agents.document_agent import DocumentAgent
         _document_agent = DocumentAgent()
     return _document_agent
 
 
-def get_support_agent() -> SupportAgent:
+def get_support_agent() -> "SupportAgent":
     """Get or create support agent instance"""
     global _support_agent
     if _support_agent is None:
+        from agents.support_agent import SupportAgent
         _support_agent = SupportAgent()
     return _support_agent
 
 
-def get_delay_agent() -> DelayAgent:
+def get_delay_agent() -> "DelayAgent":
     """Get or create delay prediction agent instance"""
     global _delay_agent
     if _delay_agent is None:
+        from agents.delay_agent import DelayAgent
         _delay_agent = DelayAgent()
     return _delay_agent
 
 
-def get_notification_agent() -> NotificationAgent:
+def get_notification_agent() -> "NotificationAgent":
     """Get or create notification agent instance"""
     global _notification_agent
     if _notification_agent is None:
+        from agents.notification_agent import NotificationAgent
         _notification_agent = NotificationAgent()
     return _notification_agent
 
 
+def get_consolidation_agent() -> "ConsolidationAgent":
+    """Get or create container consolidation agent instance"""
+    global _consolidation_agent
+    if _consolidation_agent is None:
+        from agents.consolidation_agent import ConsolidationAgent
+        _consolidation_agent = ConsolidationAgent()
+    return _consolidation_agent
+
+
+# Agents the warm-up can build, by WARMUP_AGENTS name
+AGENT_FACTORIES = {
+    "quote": get_quote_agent,
+    "route": get_route_agent,
+    "document": get_document_agent,
+    "support": get_support_agent,
+    "delay": get_delay_agent,
+    "notification": get_notification_agent,
+    "consolidation": get_consolidation_agent,
+}
+
+
 # Health check endpoint
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint"""
+    """Liveness: the process is up and serving (see /ready for readiness)"""
     return {
         "status": "healthy",
         "service": settings.APP_NAME,
         "version": "1.0.0",
-        "environment": settings.APP_ENV
+        "environment": settings.APP_ENV,
+        "database_pool": pool_status(),
+        "llm_circuits": breaker_status()
     }
 
 
+@app.get("/ready", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse}})
+async def readiness_check():
+    """
+    Readiness: 200 once the warm-up has built the agents and opened
+    connections, 503 before that (and while shutting down)
+    """
+    status = warmup.status()
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # Quote Generation Agent
 @app.post("/agents/quote", response_model=QuoteResponse)
 async def generate_quote(
     request: QuoteRequest,
-    agent: QuoteAgent = Depends(get_quote_agent)
+    agent: "QuoteAgent" = Depends(get_quote_agent)
 ):
     """
     Generate shipping quote using AI
@@ -164,7 +284,7 @@ async def generate_quote(
     - Generates professional quote documents
     """
     try:
-        logger.info(f"Generating quote for {request.make} {request.model}")
+        logger.info("Generating quote for {} {}", request.make, request.model)
         result = await agent.execute(request.dict())
         return result
     except Exception as e:
@@ -176,7 +296,7 @@ async def generate_quote(
 @app.post("/agents/route", response_model=RouteResponse)
 async def optimize_route(
     request: RouteRequest,
-    agent: RouteAgent = Depends(get_route_agent)
+    agent: "RouteAgent" = Depends(get_route_agent)
 ):
     """
     Optimize shipping route using AI
@@ -188,7 +308,7 @@ async def optimize_route(
     - Suggests optimal route with reasoning
     """
     try:
-        logger.info(f"Optimizing route for shipment {request.shipment_id}")
+        logger.info("Optimizing route for shipment {}", request.shipment_id)
         result = await agent.execute(request.dict())
         return result
     except Exception as e:
@@ -201,7 +321,7 @@ async def optimize_route(
 async def process_document(
     file: UploadFile = File(...),
     document_type: str = Form("bill_of_lading"),
-    agent: DocumentAgent = Depends(get_document_agent)
+    agent: "DocumentAgent" = Depends(get_document_agent)
 ):
     """
     Process and extract document data using AI OCR
@@ -213,7 +333,7 @@ async def process_document(
     - Flags inconsistencies for human review
     """
     try:
-        logger.info(f"Processing document: {file.filename}, type: {document_type}")
+        logger.info("Processing document: {}, type: {}", file.filename, document_type)
         result = await agent.execute(file, document_type)
         return result
     except Exception as e:
@@ -225,7 +345,7 @@ async def process_document(
 @app.post("/agents/support", response_model=SupportResponse)
 async def support_query(
     request: SupportRequest,
-    agent: SupportAgent = Depends(get_support_agent)
+    agent: "SupportAgent" = Depends(get_support_agent)
 ):
     """
     Handle customer support query using AI
@@ -237,7 +357,7 @@ async def support_query(
     - Escalates complex issues to humans
     """
     try:
-        logger.info(f"Processing support query for customer {request.customer_id}")
+        logger.info("Processing support query for customer {}", request.customer_id)
         result = await agent.execute(request.dict())
         return result
     except Exception as e:
@@ -245,11 +365,27 @@ async def support_query(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.websocket("/ws/support")
+async def support_socket(
+    websocket: WebSocket,
+    agent: "SupportAgent" = Depends(get_support_agent)
+):
+    """
+    Streaming support chat
+    
+    Connect with ?token=<customer token> (utils.auth). One connection
+    carries any number of that customer's conversations, keyed by
+    conversation_id. Answers stream as token events and can be aborted
+    with a cancel message.
+    """
+    await SupportConnection(websocket, agent).serve()
+
+
 # Delay Prediction Agent
 @app.post("/agents/delay-prediction", response_model=DelayPredictionResponse)
 async def predict_delays(
     request: DelayPredictionRequest,
-    agent: DelayAgent = Depends(get_delay_agent)
+    agent: "DelayAgent" = Depends(get_delay_agent)
 ):
     """
     Predict potential shipment delays using AI
@@ -261,7 +397,7 @@ async def predict_delays(
     - Suggests mitigation strategies
     """
     try:
-        logger.info(f"Predicting delays for shipment {request.shipment_id}")
+        logger.info("Predicting delays for shipment {}", request.shipment_id)
         result = await agent.execute(request.dict())
         return result
     except Exception as e:
@@ -274,7 +410,7 @@ async def predict_delays(
 async def send_notification(
     event_type: str,
     data: dict,
-    agent: NotificationAgent = Depends(get_notification_agent)
+    agent: "NotificationAgent" = Depends(get_notification_agent)
 ):
     """
     Send intelligent notifications
@@ -286,7 +422,7 @@ async def send_notification(
     - Handles delivery failures with retries
     """
     try:
-        logger.info(f"Sending notification for event: {event_type}")
+        logger.info("Sending notification for event: {}", event_type)
         result = await agent.execute(event_type, data)
         return result
     except Exception as e:
@@ -294,6 +430,118 @@ async def send_notification(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Container Consolidation Agent
+@app.post("/agents/consolidate", response_model=ConsolidationResponse)
+async def consolidate_containers(
+    request: ConsolidationRequest,
+    agent: "ConsolidationAgent" = Depends(get_consolidation_agent)
+):
+    """
+    Consolidate pending container bookings into shared 40ft containers
+    
+    This agent:
+    - Groups bookings by lane and departure window
+    - Bin-packs vehicles by size class (motorcycle/sedan/SUV/truck)
+    - Allocates container cost to each vehicle by floor space
+    - Trades solution quality for solve time via the quality setting
+    """
+    try:
+        logger.info("Consolidating {} container bookings", len(request.bookings))
+        result = await agent.execute(request.dict())
+        return result
+    except Exception as e:
+        logger.error(f"Consolidation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Live Tracking Positions
+@app.post("/tracking/positions", response_model=PositionBatchResponse)
+async def update_positions(request: PositionBatch):
+    """
+    Ingest shipment position updates from the backend tracking feed
+    
+    Keeps the latest position per shipment in the spatial index used for
+    port congestion, shared with the other workers through Redis.
+    Delivered shipments are dropped.
+    """
+    updated = []
+    delivered = []
+    removed = 0
+    for position in request.positions:
+        if position.status == "delivered":
+            delivered.append(position.shipment_id)
+            removed += position_index.remove(position.shipment_id)
+        elif position_index.update(position.shipment_id, position.latitude, position.longitude, position.recorded_at):
+            updated.append(position.shipment_id)
+    await position_index.save(updated, delivered)
+    accepted = len(updated)
+    
+    return {
+        "success": True,
+        "accepted": accepted,
+        "removed": removed,
+        "tracked_shipments": len(position_index)
+    }
+
+
+@app.get("/tracking/congestion", response_model=CongestionResponse)
+async def port_congestion(radius_km: float = PORT_CONGESTION_RADIUS_KM):
+    """Tracked shipment density around each known port"""
+    if not 0 < radius_km <= 1000:
+        raise HTTPException(status_code=422, detail="radius_km must be between 0 and 1000")
+    
+    ports = {}
+    for port, count in position_index.port_densities(radius_km=radius_km).items():
+        level, extra_days = congestion_level(count)
+        ports[port] = {"count": count, "level": level, "extra_days": extra_days}
+    
+    return {
+        "success": True,
+        "radius_km": radius_km,
+        "tracked_shipments": len(position_index),
+        "ports": ports
+    }
+
+# Transit-Time Statistics
+@app.post("/stats/transit-times", response_model=TransitStatsResponse)
+async def record_transit_times(request: TransitTimeBatch):
+    """
+    Record transit times of completed shipments
+    
+    Each shipment needs either transit_days or both departure_date and
+    arrival_date. Per-lane sketches are persisted to Redis.
+    """
+    # Validate the whole batch before recording anything
+    records = []
+    for shipment in request.shipments:
+        days = shipment.transit_days
+        if days is None:
+            if not (shipment.departure_date and shipment.arrival_date):
+                raise HTTPException(
+                    status_code=422,
+                    detail="transit_days or departure_date and arrival_date are required"
+                )
+            days = (shipment.arrival_date - shipment.departure_date).days
+            if days < 0:
+                raise HTTPException(status_code=422, detail="arrival_date is before departure_date")
+        records.append((shipment, days))
+    
+    for shipment, days in records:
+        transit_stats.record(
+            shipment.origin_country,
+            shipment.destination_country,
+            shipment.shipping_method.value,
+            days
+        )
+    
+    await transit_stats.save()
+    return {"success": True, "recorded": len(records), "lanes": transit_stats.lanes()}
+
+
+@app.get("/stats/transit-times", response_model=TransitStatsResponse)
+async def get_transit_times():
+    """Transit-time percentiles (p50/p90) for every lane with data"""
+    return {"success": True, "lanes": transit_stats.lanes()}
+
 
 # Vehicle Description Parser (Natural Language → Form Fields)
 @app.post("/agents/parse-description")
@@ -302,18 +550,11 @@ async def parse_vehicle_description(payload: dict):
     Parse a natural language vehicle description into structured form fields.
     e.g. "2018 BMW X5 from Japan" → {year, make, model, vehicleType, originCountry}
     """
-    from langchain_mistralai import ChatMistralAI
-    from config.settings import settings
-
     description = payload.get("description", "").strip()
     if not description:
         raise HTTPException(status_code=422, detail="description is required")
 
-    llm = ChatMistralAI(
-        model=settings.MISTRAL_MODEL,
-        temperature=0,
-        mistral_api_key=settings.MISTRAL_API_KEY
-    )
+    llm = GuardedLLM(temperature=0)
 
     prompt = f"""
     Extract vehicle and shipping details from this text: "{description}"
@@ -330,7 +571,7 @@ async def parse_vehicle_description(payload: dict):
     """
 
     try:
-        response = llm.invoke(prompt)
+        response = await llm.ainvoke(prompt)
         import json, re
         # Extract JSON even if wrapped in markdown fences
         content = response.content.strip()
@@ -349,19 +590,12 @@ async def suggest_vehicle_details(payload: dict):
     Given a make and model, suggest vehicle type, typical engine size, and origin country.
     e.g. {make: "Toyota", model: "Land Cruiser"} → {vehicleType: "suv", engineSize: "4500", originCountry: "japan"}
     """
-    from langchain_mistralai import ChatMistralAI
-    from config.settings import settings
-
     make = payload.get("make", "").strip()
     model = payload.get("model", "").strip()
     if not make:
         raise HTTPException(status_code=422, detail="make is required")
 
-    llm = ChatMistralAI(
-        model=settings.MISTRAL_MODEL,
-        temperature=0,
-        mistral_api_key=settings.MISTRAL_API_KEY
-    )
+    llm = GuardedLLM(temperature=0)
 
     prompt = f"""
     For the vehicle: {make} {model}
@@ -376,7 +610,7 @@ async def suggest_vehicle_details(payload: dict):
     """
 
     try:
-        response = llm.invoke(prompt)
+        response = await llm.ainvoke(prompt)
         import json, re
         content = response.content.strip()
         match = re.search(r'\{.*\}', content, re.DOTALL)
@@ -391,7 +625,7 @@ async def suggest_vehicle_details(payload: dict):
 @app.post("/agents/quote-preview")
 async def quote_preview(
     request: dict,
-    agent: QuoteAgent = Depends(get_quote_agent)
+    agent: "QuoteAgent" = Depends(get_quote_agent)
 ):
     """
     Generate a quick cost estimate without saving to DB.
@@ -419,7 +653,7 @@ async def quote_preview(
         except ValueError:
             request["shipping_method"] = "roro"
 
-        logger.info(f"Generating quote preview for {request.get('make')} {request.get('model')}")
+        logger.debug("Generating quote preview for {} {}", request.get('make'), request.get('model'))
         result = await agent.execute(request)
         # Strip the reference so it's clearly a preview
         result.pop("quote_reference", None)
@@ -437,14 +671,7 @@ async def validate_vehicle_fields(payload: dict):
     Check for inconsistencies in vehicle fields and return soft warnings.
     e.g. high mileage on a new vehicle, unlikely engine size for a make/model.
     """
-    from langchain_mistralai import ChatMistralAI
-    from config.settings import settings
-
-    llm = ChatMistralAI(
-        model=settings.MISTRAL_MODEL,
-        temperature=0,
-        mistral_api_key=settings.MISTRAL_API_KEY
-    )
+    llm = GuardedLLM(temperature=0)
 
     prompt = f"""
     Check these vehicle details for obvious inconsistencies or errors:
@@ -463,7 +690,7 @@ async def validate_vehicle_fields(payload: dict):
     """
 
     try:
-        response = llm.invoke(prompt)
+        response = await llm.ainvoke(prompt)
         import json, re
         content = response.content.strip()
         match = re.search(r'\{.*\}', content, re.DOTALL)
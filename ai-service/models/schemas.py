@@ -4,9 +4,11 @@ Pydantic schemas for request/response validation
 
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
+from config.pricing import VEHICLE_SIZE_CLASSES
+
 
 # Enums
 class VehicleType(str, Enum):
@@ -23,6 +25,12 @@ class ShippingMethod(str, Enum):
     CONTAINER = "container"
 
 
+class ConsolidationQuality(str, Enum):
+    FAST = "fast"
+    BALANCED = "balanced"
+    THOROUGH = "thorough"
+
+
 class DocumentType(str, Enum):
     BILL_OF_LADING = "bill_of_lading"
     VEHICLE_REGISTRATION = "vehicle_registration"
@@ -97,6 +105,7 @@ class SupportRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=1000)
     customer_id: int
     shipment_id: Optional[int] = None
+    conversation_id: Optional[str] = Field(None, max_length=64)
     conversation_history: List[Dict[str, str]] = []
 
 
@@ -107,6 +116,8 @@ class SupportResponse(BaseModel):
     requires_human: bool = False
     suggested_actions: List[str] = []
     related_shipments: List[int] = []
+    answered_by: Optional[str] = None  # faq, llm, fallback
+    conversation_id: Optional[str] = None
     response_time_ms: Optional[int] = None
 
 
@@ -129,15 +140,104 @@ class DelayPredictionResponse(BaseModel):
     analyzed_at: datetime = Field(default_factory=datetime.now)
 
 
+# Consolidation Agent Schemas
+class ConsolidationBooking(BaseModel):
+    booking_id: int
+    vehicle_type: str
+    origin_country: str = Field(..., min_length=2, max_length=100)
+    origin_port: Optional[str] = None
+    destination_country: str = "Uganda"
+    destination_port: Optional[str] = "Port Bell"
+    departure_date: date
+    
+    @validator('vehicle_type')
+    def validate_vehicle_type(cls, v):
+        # Any VehicleType, plus the body styles config.pricing sizes (hatchback, wagon, ...)
+        vehicle_type = v.strip().lower()
+        if vehicle_type not in VEHICLE_SIZE_CLASSES:
+            raise ValueError(f'Unknown vehicle type {v!r} (expected one of {", ".join(VEHICLE_SIZE_CLASSES)})')
+        return vehicle_type
+
+
+class ConsolidationRequest(BaseModel):
+    bookings: List[ConsolidationBooking] = Field(..., min_length=1)
+    window_days: int = Field(7, ge=1, le=90)
+    quality: ConsolidationQuality = ConsolidationQuality.BALANCED
+    time_budget_ms: int = Field(200, ge=1, le=10000)
+
+
+class ConsolidationResponse(BaseModel):
+    success: bool = True
+    groups: List[Dict[str, Any]] = []
+    allocations: List[Dict[str, Any]] = []
+    summary: Dict[str, Any] = {}
+
+
+# Tracking Schemas
+class PositionUpdate(BaseModel):
+    shipment_id: int
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    status: Optional[str] = None
+    recorded_at: Optional[datetime] = None
+
+
+class PositionBatch(BaseModel):
+    positions: List[PositionUpdate] = Field(..., min_length=1)
+
+
+class PositionBatchResponse(BaseModel):
+    success: bool = True
+    accepted: int
+    removed: int
+    tracked_shipments: int
+
+
+class CongestionResponse(BaseModel):
+    success: bool = True
+    radius_km: float
+    tracked_shipments: int
+    ports: Dict[str, Dict[str, Any]]
+
+
+# Transit Statistics Schemas
+class TransitTimeRecord(BaseModel):
+    shipment_id: Optional[int] = None
+    origin_country: str = Field(..., min_length=2, max_length=100)
+    destination_country: str = "Uganda"
+    shipping_method: ShippingMethod
+    transit_days: Optional[float] = Field(None, ge=0, le=365)
+    departure_date: Optional[date] = None
+    arrival_date: Optional[date] = None
+
+
+class TransitTimeBatch(BaseModel):
+    shipments: List[TransitTimeRecord] = Field(..., min_length=1)
+
+
+class TransitStatsResponse(BaseModel):
+    success: bool = True
+    recorded: int = 0
+    lanes: Dict[str, Optional[Dict[str, Any]]] = {}
+
+
 # Health Check Schema
 class HealthResponse(BaseModel):
     status: str
     service: str
     version: str
     environment: str
+    database_pool: Optional[Dict[str, int]] = None
+    llm_circuits: Optional[Dict[str, str]] = None
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
+class ReadinessResponse(BaseModel):
+    status: str
+    steps: Dict[str, str]
+    warmup_seconds: Optional[float] = None
+
+
 # Agent State Schemas (for LangGraph)
 class AgentState(BaseModel):
     """Base state for all agents"""
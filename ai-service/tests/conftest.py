@@ -0,0 +1,23 @@
+"""
+Shared test fixtures
+"""
+
+import os
+
+# Before anything imports config.settings: agents under test never reach Mistral
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("SERVICE_SECRET", "test-secret")
+
+import fakeredis.aioredis
+import pytest_asyncio
+
+import utils.redis_client
+
+
+@pytest_asyncio.fixture
+async def fake_redis(monkeypatch):
+    """In-memory Redis installed as the service's Redis client"""
+    client = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(utils.redis_client, "redis_client", client)
+    yield client
+    await client.aclose()
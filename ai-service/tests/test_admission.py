@@ -0,0 +1,115 @@
+"""
+Tests for admission control
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config.settings import Settings, settings
+from utils.admission import AdmissionMiddleware, AgentGate, RateLimiter
+
+
+@pytest.mark.asyncio
+async def test_local_token_bucket():
+    """A client gets its burst, then must wait; other clients are unaffected"""
+    limiter = RateLimiter(per_minute=60, burst=2)
+
+    assert (await limiter.acquire("a"))[0]
+    assert (await limiter.acquire("a"))[0]
+    allowed, retry_after = await limiter.acquire("a")
+    assert not allowed
+    assert 0 < retry_after <= 1
+    assert (await limiter.acquire("b"))[0]
+
+
+@pytest.mark.asyncio
+async def test_redis_token_bucket_is_shared(fake_redis):
+    """Workers sharing Redis share one bucket per client"""
+    worker_a = RateLimiter(per_minute=60, burst=2)
+    worker_b = RateLimiter(per_minute=60, burst=2)
+
+    assert (await worker_a.acquire("c"))[0]
+    assert (await worker_b.acquire("c"))[0]
+    assert not (await worker_a.acquire("c"))[0]
+
+
+@pytest.mark.asyncio
+async def test_gate_queues_then_sheds():
+    """Beyond the limit requests queue; beyond the queue they are rejected"""
+    gate = AgentGate("document", limit=1, queue_size=1)
+    assert await gate.enter(timeout=1)
+
+    queued = asyncio.create_task(gate.enter(timeout=1))
+    await asyncio.sleep(0)
+    assert gate.waiting == 1
+    assert await gate.enter(timeout=1) is False
+
+    gate.leave()
+    assert await queued
+    assert await gate.enter(timeout=0.01) is False
+
+
+def test_middleware_responses(monkeypatch):
+    """Rate-limited requests get 429 with Retry-After; other paths are untouched"""
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 60)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 1)
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware)
+
+    @app.post("/agents/quote")
+    async def quote():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    monkeypatch.setattr(settings, "SERVICE_SECRET", "backend-secret")
+    client = TestClient(app)
+    backend = {settings.SERVICE_KEY_HEADER: "backend-secret"}
+    headers = {**backend, settings.RATE_LIMIT_CLIENT_HEADER: "customer-7"}
+    assert client.post("/agents/quote", headers=headers).status_code == 200
+
+    limited = client.post("/agents/quote", headers=headers)
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+
+    assert client.post("/agents/quote", headers={**backend, settings.RATE_LIMIT_CLIENT_HEADER: "customer-8"}).status_code == 200
+    assert all(client.get("/health").status_code == 200 for _ in range(3))
+
+
+def test_client_header_is_only_trusted_from_the_backend(monkeypatch):
+    """A browser cannot pick its own bucket; backend jobs without a client are not limited"""
+    monkeypatch.setattr(settings, "SERVICE_SECRET", "backend-secret")
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", ["10.0.0.2"])
+    middleware = AdmissionMiddleware(None)
+
+    def scope(peer, **headers):
+        return {"client": (peer, 5000), "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+
+    claimed = {settings.RATE_LIMIT_CLIENT_HEADER: "fresh-id-123"}
+    assert middleware.client_id(scope("203.0.113.9", **claimed)) == "203.0.113.9"
+    assert middleware.client_id(scope("203.0.113.9", **claimed, **{settings.SERVICE_KEY_HEADER: "guess"})) == "203.0.113.9"
+    assert middleware.client_id(scope("10.0.0.5", **claimed, **{settings.SERVICE_KEY_HEADER: "backend-secret"})) == "client:fresh-id-123"
+    assert middleware.client_id(scope("10.0.0.5", **{settings.SERVICE_KEY_HEADER: "backend-secret"})) is None
+    assert middleware.client_id(scope("10.0.0.2", **{"X-Forwarded-For": "1.1.1.1, 198.51.100.4"})) == "198.51.100.4"
+
+
+def test_rate_limiting_requires_the_service_secret():
+    """Without the secret every forwarded customer would share the backend's bucket"""
+    with pytest.raises(ValueError, match="SERVICE_SECRET"):
+        Settings(_env_file=None, SERVICE_SECRET="", RATE_LIMIT_PER_MINUTE=60)
+    assert Settings(_env_file=None, SERVICE_SECRET="", RATE_LIMIT_PER_MINUTE=0).SERVICE_SECRET == ""
+
+
+def test_unknown_paths_share_one_gate():
+    """Made-up agent names do not create gates or metric series"""
+    middleware = AdmissionMiddleware(FastAPI())
+    client = TestClient(middleware)
+    for n in range(20):
+        assert client.post(f"/agents/bogus{n}").status_code == 404
+    assert client.post("/agents/quote-preview").status_code == 404
+    assert set(middleware.gates) == {"other", "quote"}
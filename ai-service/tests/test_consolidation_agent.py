@@ -0,0 +1,98 @@
+"""
+Tests for Container Consolidation Agent
+"""
+
+import time
+
+import pytest
+from pydantic import ValidationError
+from agents.consolidation_agent import ConsolidationAgent, ContainerPacker
+from models.schemas import ConsolidationBooking
+
+
+def make_bookings(vehicle_types, origin="japan", departure="2026-03-02"):
+    return [
+        {
+            "booking_id": i,
+            "vehicle_type": vehicle_type,
+            "origin_country": origin,
+            "departure_date": departure,
+        }
+        for i, vehicle_type in enumerate(vehicle_types, start=1)
+    ]
+
+
+@pytest.fixture
+def consolidation_agent():
+    """Create consolidation agent instance"""
+    return ConsolidationAgent()
+
+
+@pytest.mark.parametrize("quality", ["fast", "balanced", "thorough"])
+def test_packer_respects_capacity(quality):
+    """Every vehicle is packed exactly once and no container overflows"""
+    items = [{"booking_id": i, "units": units} for i, units in enumerate([6, 4, 4, 3, 3, 3, 1, 1, 6, 4] * 20)]
+    containers = ContainerPacker(capacity=12).pack(items, quality)
+
+    assert sorted(item["booking_id"] for c in containers for item in c) == list(range(len(items)))
+    assert all(sum(item["units"] for item in c) <= 12 for c in containers)
+
+
+@pytest.mark.asyncio
+async def test_sedans_share_container(consolidation_agent):
+    """Four sedans on the same lane and window share one container"""
+    result = await consolidation_agent.execute({"bookings": make_bookings(["sedan"] * 4)})
+
+    assert result["summary"]["containers"] == 1
+    assert result["summary"]["savings"] > 0
+    assert all(a["allocated_cost"] < a["individual_cost"] for a in result["allocations"])
+
+
+@pytest.mark.asyncio
+async def test_groups_by_lane_and_window(consolidation_agent):
+    """Different origins and sailing windows are never mixed"""
+    bookings = (
+        make_bookings(["sedan", "suv"], origin="japan", departure="2026-03-02")
+        + make_bookings(["sedan"], origin="uk", departure="2026-03-02")
+        + make_bookings(["sedan"], origin="japan", departure="2026-04-20")
+    )
+    result = await consolidation_agent.execute({"bookings": bookings, "window_days": 7})
+
+    assert result["summary"]["groups"] == 3
+    lone = [c for g in result["groups"] for c in g["containers"] if len(c["booking_ids"]) == 1]
+    assert all(not c["consolidated"] for c in lone)
+
+
+@pytest.mark.asyncio
+async def test_time_budget_covers_all_groups(consolidation_agent, monkeypatch):
+    """Thorough packing of many groups shares one budget instead of one each"""
+    def slow_improve(self, deadline):
+        while time.perf_counter() < deadline:
+            time.sleep(0.001)
+
+    monkeypatch.setattr(ContainerPacker, "_improve", slow_improve)
+    bookings = [booking for week in range(8) for booking in make_bookings(["sedan"] * 3, departure=f"2026-03-{week * 3 + 1:02d}")]
+    result = await consolidation_agent.execute({"bookings": bookings, "window_days": 1, "quality": "thorough", "time_budget_ms": 50})
+
+    assert result["summary"]["groups"] == 8
+    assert result["summary"]["solve_time_ms"] < 150
+
+
+def test_unknown_vehicle_types_are_rejected():
+    """A misspelled vehicle type fails validation instead of being packed as a sedan"""
+    booking = make_bookings(["SUV"])[0]
+    assert ConsolidationBooking(**booking).vehicle_type == "suv"
+    assert ConsolidationBooking(**{**booking, "vehicle_type": "hatchback"}).vehicle_type == "hatchback"
+    with pytest.raises(ValidationError):
+        ConsolidationBooking(**{**booking, "vehicle_type": "sudan"})
+
+
+@pytest.mark.asyncio
+async def test_large_batch(consolidation_agent):
+    """Thousands of bookings pack close to the lower bound"""
+    bookings = make_bookings(["sedan", "suv", "truck", "motorcycle", "van"] * 1000)
+    result = await consolidation_agent.execute({"bookings": bookings, "quality": "balanced"})
+
+    summary = result["summary"]
+    assert summary["bookings"] == 5000
+    assert summary["containers"] <= summary["lower_bound_containers"] * 1.1
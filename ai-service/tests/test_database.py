@@ -0,0 +1,25 @@
+"""
+Tests for the async database layer
+"""
+
+import pytest
+from sqlalchemy import text
+
+import utils.database as database
+
+
+@pytest.mark.asyncio
+async def test_async_session_and_pool_status():
+    """Sessions run queries without blocking and the pool reports usage"""
+    await database.init_db("sqlite+aiosqlite:///:memory:")
+    try:
+        assert database.engine.echo is False
+
+        sessions = database.get_db()
+        db = await sessions.__anext__()
+        assert (await db.execute(text("SELECT 1"))).scalar() == 1
+        await sessions.aclose()
+
+        assert isinstance(database.pool_status(), dict)
+    finally:
+        await database.close_db()
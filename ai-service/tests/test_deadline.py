@@ -0,0 +1,132 @@
+"""
+Tests for request deadlines and hedged LLM calls
+"""
+
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from config.settings import settings
+from utils.deadline import DeadlineMiddleware, DeadlineExceeded, deadline
+from utils.llm import GuardedLLM
+from tools.laravel_api import LaravelAPI
+
+
+class SlowChatModel:
+    """First call stalls, later calls answer quickly"""
+
+    def __init__(self, first_delay=1.0):
+        self.first_delay = first_delay
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.first_delay if self.calls == 1 else 0.01)
+        return type("Response", (), {"content": f"reply {self.calls}"})()
+
+
+def guarded(chat_model):
+    return GuardedLLM(model=f"test-{uuid.uuid4().hex}", chat_model=chat_model)
+
+
+@pytest.fixture
+def slow_app():
+    app = FastAPI()
+    app.state.cancelled = asyncio.Event()
+
+    @app.post("/agents/slow")
+    async def slow(payload: dict):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            app.state.cancelled.set()
+            raise
+        return {"success": True}
+
+    @app.post("/agents/fast")
+    async def fast(payload: dict):
+        return {"success": True}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_deadline_header_cuts_request_short(slow_app):
+    transport = httpx.ASGITransport(app=DeadlineMiddleware(slow_app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        started = time.monotonic()
+        response = await client.post("/agents/slow", json={}, headers={"X-Request-Timeout": "0.1"})
+        assert response.status_code == 504
+        assert time.monotonic() - started < 1
+        assert slow_app.state.cancelled.is_set()
+
+        response = await client.post("/agents/fast", json={}, headers={"X-Request-Timeout": "0.1"})
+        assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_work(slow_app):
+    messages = [{"type": "http.request", "body": b"{}", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/agents/slow", "headers": [(b"content-type", b"application/json")],
+        "query_string": b"", "root_path": "", "scheme": "http", "server": ("test", 80), "http_version": "1.1",
+    }
+    await asyncio.wait_for(DeadlineMiddleware(slow_app)(scope, receive, send), timeout=1)
+    assert slow_app.state.cancelled.is_set()
+    assert sent == []
+
+
+@pytest.mark.asyncio
+async def test_llm_call_respects_deadline_without_tripping_breaker():
+    llm = guarded(SlowChatModel(first_delay=1.0))
+    with deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            await llm.ainvoke("hi")
+    assert not llm.breaker._calls
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_takes_faster_reply(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY", 0.05)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY", 0.05)
+    chat = SlowChatModel(first_delay=1.0)
+    llm = guarded(chat)
+    started = time.monotonic()
+    with deadline(5, hedge=True):
+        response = await llm.ainvoke("hi")
+    assert response.content == "reply 2"
+    assert chat.calls == 2
+    assert time.monotonic() - started < 0.5
+
+
+@pytest.mark.asyncio
+async def test_laravel_calls_carry_remaining_time():
+    seen = []
+
+    def handler(request):
+        seen.append((request.headers.get("X-Request-Timeout"), request.extensions["timeout"]["read"]))
+        return httpx.Response(200, json={"data": {"id": 1}})
+
+    client = LaravelAPI()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with deadline(2):
+        await client.create_quote({"reference": "QTE-1"})
+    await client.create_quote({"reference": "QTE-2"})
+
+    assert 0 < float(seen[0][0]) <= 2 and seen[0][1] <= 2
+    assert seen[1][0] is None
@@ -0,0 +1,44 @@
+"""
+Tests for vectorized geodesic utilities
+"""
+
+import numpy as np
+import pytest
+
+from utils.geo import PORTS, distances_from, nearest_k, nearest_ports, pairwise_distances
+from utils.helpers import calculate_distance
+
+
+def test_pairwise_matches_scalar():
+    """Matrix entries match the scalar Haversine helper"""
+    coords = list(PORTS.values())
+    matrix = pairwise_distances(coords)
+
+    assert matrix.shape == (len(coords), len(coords))
+    for i, (lat1, lon1) in enumerate(coords):
+        for j, (lat2, lon2) in enumerate(coords):
+            assert matrix[i, j] == pytest.approx(calculate_distance(lat1, lon1, lat2, lon2), abs=1e-6)
+
+
+def test_distances_from_one_to_many():
+    """One-to-many distances match the matrix row"""
+    coords = list(PORTS.values())
+    row = distances_from(PORTS["Mombasa"], coords)
+    assert np.allclose(row, pairwise_distances([PORTS["Mombasa"]], coords)[0])
+
+
+def test_nearest_k_ordering():
+    """Nearest candidates are returned closest first, across chunk boundaries"""
+    points = [PORTS["Port Bell"], PORTS["Yokohama"], PORTS["Southampton"]]
+    indices, distances = nearest_k(points, list(PORTS.values()), k=3, chunk_size=2)
+
+    names = list(PORTS)
+    assert [names[i] for i in indices[:, 0]] == ["Port Bell", "Yokohama", "Southampton"]
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+
+def test_nearest_ports_and_validation():
+    """Named nearest-port lookup and k bounds"""
+    assert nearest_ports([(-4.05, 39.67)])[0][0][0] == "Mombasa"
+    with pytest.raises(ValueError):
+        nearest_k([(0, 0)], [(1, 1)], k=2)
@@ -0,0 +1,175 @@
+"""
+Tests for the Laravel API client
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from config.settings import settings
+from tools.laravel_api import LaravelAPI
+from utils.redis_client import cache_key
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Client whose requests are answered by a scripted transport"""
+    monkeypatch.setattr(settings, "LARAVEL_RETRY_BACKOFF", 0)
+    client = LaravelAPI()
+    client.requests = []
+    client.script = []
+
+    def handler(request):
+        client.requests.append(request)
+        outcome = client.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), headers=client.headers)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_get_retries_transient_failures(api):
+    """Idempotent GETs retry gateway errors and connection failures"""
+    api.script = [
+        httpx.Response(503),
+        httpx.ConnectError("refused"),
+        httpx.Response(200, json={"data": {"id": 5}}),
+    ]
+
+    assert await api.get_shipment(5) == {"data": {"id": 5}}
+    assert len(api.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_retries_are_bounded(api):
+    """After LARAVEL_GET_RETRIES the failure is reported"""
+    api.script = [httpx.Response(502)] * (settings.LARAVEL_GET_RETRIES + 1)
+
+    assert await api.get_customer(1) is None
+    assert len(api.requests) == settings.LARAVEL_GET_RETRIES + 1
+
+
+@pytest.mark.asyncio
+async def test_writes_are_not_retried(api):
+    """Non-idempotent requests go out exactly once"""
+    api.script = [httpx.Response(503)]
+
+    assert await api.update_shipment(5, {"status": "delivered"}) is False
+    assert len(api.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_is_reused_and_closed(api):
+    """Every call shares one client until close()"""
+    api.script = [httpx.Response(200, json={}), httpx.Response(200, json={})]
+    client = api.client
+
+    await api.get_route(1)
+    await api.get_route(2)
+    assert api.client is client
+
+    await api.close()
+    assert client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_history_walks_pages_with_prefetch(api):
+    """All pages are streamed and the next page is requested ahead of time"""
+    def page(number, last_page=3):
+        # As ApiResponseService::paginated sends it
+        return httpx.Response(200, json={
+            "success": True,
+            "data": [{"id": number * 10 + i} for i in range(2)],
+            "meta": {"pagination": {
+                "current_page": number,
+                "per_page": 2,
+                "total": 2 * last_page,
+                "last_page": last_page,
+                "has_more_pages": number < last_page,
+            }},
+        })
+
+    api.script = [page(1), page(2), page(3)]
+    history = api.iter_historical_shipments({"status": "delivered"}, page_size=2)
+
+    assert (await history.__anext__())["id"] == 10
+    await asyncio.sleep(0)
+    assert len(api.requests) == 2
+
+    ids = [10] + [record["id"] async for record in history]
+    assert ids == [10, 11, 20, 21, 30, 31]
+    assert [r.url.params["page"] for r in api.requests] == ["1", "2", "3"]
+    assert api.requests[0].url.params["per_page"] == "2"
+    assert api.requests[0].url.params["status"] == "delivered"
+    assert (api.requests[0].url.params["sort_by"], api.requests[0].url.params["sort_order"]) == ("id", "asc")
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_cached_and_revalidated(api, monkeypatch):
+    """Fresh entries skip the backend; stale ones revalidate with If-None-Match"""
+    api.script = [httpx.Response(200, json={"data": {"id": 3}}, headers={"ETag": '"v1"'})]
+    assert await api.get_customer(3) == {"data": {"id": 3}}
+    assert await api.get_customer(3) == {"data": {"id": 3}}
+    assert len(api.requests) == 1
+
+    monkeypatch.setattr(settings, "LARAVEL_CACHE_TTL", 0)
+    api.script = [httpx.Response(304)]
+    assert await api.get_customer(3) == {"data": {"id": 3}}
+    assert api.requests[-1].headers["if-none-match"] == '"v1"'
+
+    api.script = [httpx.ConnectError("down")] * (settings.LARAVEL_GET_RETRIES + 1)
+    assert await api.get_customer(3) == {"data": {"id": 3}}
+
+
+@pytest.mark.asyncio
+async def test_cache_shared_through_redis_and_invalidated(api, fake_redis):
+    """Another worker reads the Redis copy; shipment writes invalidate it"""
+    api.script = [httpx.Response(200, json={"data": {"status": "booked"}})]
+    await api.get_shipment(9)
+
+    other_worker = LaravelAPI()
+    assert await other_worker.get_shipment(9) == {"data": {"status": "booked"}}
+
+    api.script = [httpx.Response(200, json={}), httpx.Response(200, json={"data": {"status": "in_transit"}})]
+    assert await api.update_shipment(9, {"status": "in_transit"}) is True
+    assert await fake_redis.get(cache_key("laravel", "shipment", 9)) is None
+    assert await api.get_shipment(9) == {"data": {"status": "in_transit"}}
+
+
+@pytest.mark.asyncio
+async def test_get_overlapping_invalidation_is_not_cached(api, fake_redis, monkeypatch):
+    """A response already in flight when its record is invalidated is returned but not cached"""
+    fetch = api._get
+
+    async def racing_get(path, **kwargs):
+        response = await fetch(path, **kwargs)
+        await api.invalidate("shipment", 4)
+        return response
+
+    monkeypatch.setattr(api, "_get", racing_get)
+    api.script = [httpx.Response(200, json={"data": {"status": "booked"}})]
+    assert await api.get_shipment(4) == {"data": {"status": "booked"}}
+
+    key = cache_key("laravel", "shipment", 4)
+    assert key not in api._cache
+    assert await fake_redis.get(key) is None
+    # Nothing is kept per key once no GET for it is in flight
+    await api.invalidate("shipment", 5)
+    assert not api._inflight and not api._generations
+
+
+@pytest.mark.asyncio
+async def test_bulk_shipments_read_redis_once(api, fake_redis):
+    """Cached shipments come from one MGET; only misses hit the backend"""
+    api.script = [httpx.Response(200, json={"data": {"id": 1}})]
+    await api.get_shipment(1)
+    api._cache.clear()
+
+    api.script = [httpx.Response(200, json={"data": {"id": 2}})]
+    shipments = await api.get_shipments([1, 2])
+    assert shipments == {1: {"data": {"id": 1}}, 2: {"data": {"id": 2}}}
+    assert len(api.requests) == 2
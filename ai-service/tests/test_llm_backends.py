@@ -0,0 +1,115 @@
+"""
+Tests for the offline LLM backends
+"""
+
+import json
+
+import pytest
+from config.settings import Settings, settings
+from utils.llm import GuardedLLM
+from utils.llm_backends import (
+    FakeChatModel, FakeLLMError, RecordingChatModel, Recordings, ReplayChatModel, ReplayMissError,
+    create_chat_model, prompt_key,
+)
+
+ROUTE_PROMPT = """Suggest the optimal shipping route for this shipment:
+- Origin: Japan
+- Destination: Uganda
+
+Format as JSON with keys: recommended_route, transit_time_days, cost_range, alternative_routes, reasoning, confidence_score"""
+
+DUTY_PROMPT = "Estimate the duty. Respond with ONLY a single number (the estimated customs duty in USD, no symbol, no text)."
+
+
+class CountingChatModel:
+    """Stands in for Mistral and counts calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        return type("Response", (), {"content": f"live answer {self.calls}", "usage_metadata": None})()
+
+    async def astream(self, messages, **kwargs):
+        self.calls += 1
+        for word in ("live ", "stream"):
+            yield type("Chunk", (), {"content": word})()
+
+
+@pytest.mark.asyncio
+async def test_fake_is_deterministic_and_follows_the_prompt():
+    fake = FakeChatModel("mistral-large-latest", latency=0, error_rate=0)
+
+    first = await fake.ainvoke(ROUTE_PROMPT)
+    second = await FakeChatModel("mistral-large-latest", latency=0, error_rate=0, seed=99).ainvoke(ROUTE_PROMPT)
+    assert first.content == second.content
+    assert first.usage_metadata["output_tokens"] > 0
+
+    route = json.loads(first.content)
+    assert set(route) == {"recommended_route", "transit_time_days", "cost_range", "alternative_routes", "reasoning", "confidence_score"}
+    assert isinstance(route["transit_time_days"], int) and isinstance(route["alternative_routes"], list)
+    assert float((await fake.ainvoke(DUTY_PROMPT)).content) > 0
+
+    chunks = [chunk.content async for chunk in fake.astream([{"role": "user", "content": ROUTE_PROMPT}])]
+    assert "".join(chunks) == first.content
+
+
+@pytest.mark.asyncio
+async def test_fake_injects_errors_from_a_seeded_stream():
+    async def failures(seed):
+        fake = FakeChatModel(latency=0, error_rate=0.3, seed=seed)
+        outcomes = []
+        for _ in range(50):
+            try:
+                await fake.ainvoke(DUTY_PROMPT)
+                outcomes.append(True)
+            except FakeLLMError:
+                outcomes.append(False)
+        return outcomes
+
+    outcomes = await failures(7)
+    assert outcomes == await failures(7)
+    assert 5 <= outcomes.count(False) <= 25
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_offline(tmp_path):
+    recordings = Recordings(str(tmp_path / "recordings.jsonl"))
+    live = CountingChatModel()
+    recorder = GuardedLLM(model="test-record", chat_model=RecordingChatModel(live, "test-record", recordings))
+
+    assert (await recorder.ainvoke(ROUTE_PROMPT)).content == "live answer 1"
+    streamed = [chunk.content async for chunk in recorder.astream([("user", "Hello")])]
+    assert streamed == ["live ", "stream"]
+
+    # A fresh process reading the same file, with nothing live behind it
+    replay = GuardedLLM(model="test-record", chat_model=ReplayChatModel("test-record", Recordings(recordings.path)))
+    assert (await replay.ainvoke(ROUTE_PROMPT)).content == "live answer 1"
+    assert "".join([chunk.content async for chunk in replay.astream([{"role": "user", "content": "Hello"}])]) == "live stream"
+    assert live.calls == 2
+
+    with pytest.raises(ReplayMissError):
+        await replay.ainvoke("Never recorded")
+    fallback = ReplayChatModel("test-record", Recordings(recordings.path), fallback=True)
+    assert (await fallback.ainvoke(DUTY_PROMPT)).content.isdigit()
+
+
+def test_prompt_key_ignores_message_format():
+    assert prompt_key("m", "Hi") == prompt_key("m", [{"role": "user", "content": "Hi"}]) == prompt_key("m", [("user", "Hi")])
+    assert prompt_key("m", "Hi") != prompt_key("other", "Hi")
+
+
+def test_backend_comes_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
+    assert isinstance(GuardedLLM().chat_model, FakeChatModel)
+    with pytest.raises(ValueError):
+        create_chat_model("m", 0.0, backend="openai")
+
+
+def test_mistral_key_only_required_by_mistral_backends(monkeypatch):
+    monkeypatch.delenv("MISTRAL_API_KEY", raising=False)
+    assert Settings(_env_file=None, LLM_BACKEND="replay").MISTRAL_API_KEY is None
+    for backend in ("mistral", "record"):
+        with pytest.raises(ValueError, match="MISTRAL_API_KEY"):
+            Settings(_env_file=None, LLM_BACKEND=backend)
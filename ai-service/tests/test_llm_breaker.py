@@ -0,0 +1,133 @@
+"""
+Tests for the LLM circuit breaker
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from config.settings import settings
+from utils.deadline import DeadlineExceeded, deadline
+from utils.llm import GuardedLLM, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from agents.route_agent import RouteAgent
+
+
+class FlakyChatModel:
+    """Chat model that fails, stalls or answers on demand"""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.delay = 0.0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("503 Service Unavailable")
+        return type("Response", (), {"content": "ok"})()
+
+
+@pytest.fixture(autouse=True)
+def breaker_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_TIMEOUT", 0.2)
+    monkeypatch.setattr(settings, "LLM_BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(settings, "LLM_BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "LLM_BREAKER_SLOW_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "LLM_BREAKER_COOLDOWN", 0.1)
+    monkeypatch.setattr(settings, "LLM_BREAKER_PROBES", 1)
+
+
+def guarded(chat_model):
+    # A model name of its own keeps each test's breaker separate
+    return GuardedLLM(model=f"test-{uuid.uuid4().hex}", chat_model=chat_model)
+
+
+async def fail_times(llm, count):
+    for _ in range(count):
+        with pytest.raises(Exception):
+            await llm.ainvoke("hi")
+
+
+@pytest.mark.asyncio
+async def test_opens_on_error_rate_and_refuses_fast():
+    chat = FlakyChatModel()
+    llm = guarded(chat)
+    chat.fail = True
+    await fail_times(llm, 4)
+    assert llm.breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await llm.ainvoke("hi")
+    assert chat.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_opens_on_p95_latency_and_timeouts():
+    chat = FlakyChatModel()
+    llm = guarded(chat)
+    chat.delay = 0.06
+    for _ in range(4):
+        await llm.ainvoke("hi")
+    assert llm.breaker.state == OPEN
+
+    # A call past LLM_TIMEOUT is cut off and counts as a failure
+    chat2 = FlakyChatModel()
+    llm2 = guarded(chat2)
+    chat2.delay = 1.0
+    with pytest.raises(asyncio.TimeoutError):
+        await llm2.ainvoke("hi")
+
+
+@pytest.mark.asyncio
+async def test_deadline_timeouts_count_once_the_model_is_slow():
+    chat = FlakyChatModel()
+    llm = guarded(chat)
+    chat.delay = 1.0
+
+    # Cut short before LLM_BREAKER_SLOW_SECONDS: the deadline's fault, not recorded
+    for _ in range(4):
+        with deadline(0.02), pytest.raises(DeadlineExceeded):
+            await llm.ainvoke("hi")
+    assert llm.breaker.state == CLOSED and not llm.breaker._calls
+
+    # Stalled past it: every caller's deadline fires first, but the model is slow
+    for _ in range(4):
+        with deadline(0.1), pytest.raises(DeadlineExceeded):
+            await llm.ainvoke("hi")
+    assert llm.breaker.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_or_reopens():
+    chat = FlakyChatModel()
+    llm = guarded(chat)
+    chat.fail = True
+    await fail_times(llm, 4)
+    await asyncio.sleep(0.12)
+
+    # One probe at a time; a failed probe reopens the circuit
+    assert llm.breaker.allow() == (True, True)
+    assert llm.breaker.state == HALF_OPEN
+    assert llm.breaker.allow() == (False, False)
+    llm.breaker.record(False, 0.01, probe=True)
+    assert llm.breaker.state == OPEN
+
+    await asyncio.sleep(0.12)
+    chat.fail = False
+    assert (await llm.ainvoke("hi")).content == "ok"
+    assert llm.breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_agent_falls_back_while_open():
+    chat = FlakyChatModel()
+    agent = RouteAgent()
+    agent.llm = guarded(chat)
+    chat.fail = True
+    await fail_times(agent.llm, 4)
+
+    result = await agent.execute({"origin": "Japan", "destination": "Uganda"})
+    assert "circuit" in result["error"]
+    assert "recommended_route" in result["optimization"]
+    assert chat.calls == 4
@@ -0,0 +1,37 @@
+"""
+Tests for logging configuration
+"""
+
+from loguru import logger
+
+from utils.logger import _module_filter, throttled
+
+
+def record(name, level):
+    return {"name": name, "level": logger.level(level)}
+
+
+def test_most_specific_module_level_wins():
+    accept = _module_filter({"agents": "WARNING", "agents.document_agent": "DEBUG"}, "INFO")
+
+    assert accept(record("agents.document_agent", "DEBUG"))
+    assert not accept(record("agents.quote_agent", "INFO"))
+    assert accept(record("agents.quote_agent", "WARNING"))
+    assert accept(record("main", "INFO"))
+    assert not accept(record("main", "DEBUG"))
+
+
+def test_throttled_drops_repeats_and_reports_count():
+    messages = []
+    sink = logger.add(lambda message: messages.append(message.record), level="WARNING")
+    try:
+        for _ in range(3):
+            throttled("test.burst", interval=60).warning("Queue full")
+        assert len(messages) == 1
+
+        throttled("test.burst", interval=0).warning("Queue full")
+        assert len(messages) == 2
+        assert messages[1]["extra"]["suppressed"] == 2
+        assert messages[1]["message"] == "Queue full (2 similar suppressed)"
+    finally:
+        logger.remove(sink)
@@ -0,0 +1,61 @@
+"""
+Tests for Prometheus instrumentation
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from main import app, get_quote_agent
+from agents.quote_agent import QuoteAgent
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class UnavailableLLM:
+    async def ainvoke(self, messages, **kwargs):
+        raise RuntimeError("503 Service Unavailable")
+
+
+QUOTE_INPUT = {
+    "vehicle_type": "sedan", "year": 2020, "make": "Toyota", "model": "Camry", "engine_size": 2500,
+    "origin_country": "Japan", "origin_port": "Tokyo", "destination_country": "Uganda",
+    "destination_port": "Port Bell", "shipping_method": "roro",
+}
+
+
+@pytest.mark.asyncio
+async def test_quote_nodes_and_fallbacks_are_recorded():
+    agent = QuoteAgent()
+    agent.llm = UnavailableLLM()
+    before = sample("agent_node_duration_seconds_count", graph="quote", node="apply_ai_pricing")
+    fallbacks = sample("agent_fallbacks_total", agent="quote_pricing")
+
+    result = await agent.execute(dict(QUOTE_INPUT))
+
+    assert result["success"] is True
+    assert sample("agent_node_duration_seconds_count", graph="quote", node="apply_ai_pricing") == before + 1
+    assert sample("agent_node_duration_seconds_count", graph="quote", node="save_quote") >= 1
+    assert sample("agent_fallbacks_total", agent="quote_pricing") == fallbacks + 1
+
+
+def test_metrics_endpoint_reports_requests_by_route():
+    class StubQuoteAgent:
+        async def execute(self, request):
+            return {"success": True, "total_cost": 1.0, "quote_reference": "QTE-1"}
+
+    app.dependency_overrides[get_quote_agent] = StubQuoteAgent
+    try:
+        client = TestClient(app)
+        labels = {"endpoint": "/agents/quote-preview", "method": "POST", "status": "200"}
+        before = sample("http_requests_total", **labels)
+        assert client.post("/agents/quote-preview", json={"make": "Toyota"}).status_code == 200
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert "http_request_duration_seconds_bucket" in response.text
+        assert sample("http_requests_total", **labels) == before + 1
+    finally:
+        app.dependency_overrides.clear()
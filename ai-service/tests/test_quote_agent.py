@@ -4,11 +4,13 @@ Tests for Quote Agent
 
 import pytest
 from agents.quote_agent import QuoteAgent
+from config.settings import settings
 
 
 @pytest.fixture
-def quote_agent():
-    """Create quote agent instance"""
+def quote_agent(monkeypatch):
+    """Create quote agent instance on the offline fake LLM"""
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
     return QuoteAgent()
 
 
@@ -39,6 +41,7 @@ async def test_quote_generation(quote_agent):
     assert result["adjusted_cost"] > 0
     assert "breakdown" in result
     assert result["confidence_score"] > 0
+    assert result["ai_reasoning"] != "Standard pricing applied"
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,80 @@
+"""
+Tests for the Redis cache helpers
+"""
+
+import json
+
+import pytest
+
+from config.settings import settings
+from utils.redis_client import (
+    cache_expire, cache_get, cache_key, cache_mget, cache_mset, claim, decode_value, encode_value, redis_lock
+)
+
+
+@pytest.mark.parametrize("codec", ["msgpack", "json"])
+def test_codec_round_trip_and_compression(codec, monkeypatch):
+    """Values survive every codec; large ones are compressed"""
+    monkeypatch.setattr(settings, "REDIS_CODEC", codec)
+    value = {"text": "Bill of lading " * 200, "pages": [1, 2], "score": 0.9}
+
+    encoded = encode_value(value)
+    assert encoded[:1] == b"Z"
+    assert len(encoded) < len(json.dumps(value))
+    assert decode_value(encoded) == value
+    assert decode_value(encode_value({"small": True}))["small"] is True
+
+
+def test_legacy_json_values_still_decode():
+    """Values written before codec markers existed are plain JSON"""
+    assert decode_value(b'{"status": "booked"}') == {"status": "booked"}
+
+
+def test_namespaced_keys(monkeypatch):
+    """Keys are prefixed per deployment and joined by namespace"""
+    monkeypatch.setattr(settings, "REDIS_KEY_PREFIX", "sg")
+    assert cache_key("laravel", "shipment", 12) == "sg:laravel:shipment:12"
+
+
+@pytest.mark.asyncio
+async def test_stores_use_namespaced_keys(fake_redis, monkeypatch):
+    """Transit stats and conversations live under the deployment's prefix too"""
+    from utils.conversation_store import ConversationStore
+    from utils.transit_stats import TransitTimeStats
+
+    monkeypatch.setattr(settings, "REDIS_KEY_PREFIX", "sg")
+    stats = TransitTimeStats()
+    stats.record("Japan", "Uganda", "roro", 42)
+    await stats.save()
+    await ConversationStore().append("1:chat", [{"role": "user", "content": "hi"}])
+
+    assert sorted(key.decode() for key in await fake_redis.keys("*")) == [
+        "sg:support:conversation:1:chat:turns", "sg:transit_stats:v1"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batch_operations(fake_redis):
+    """mset/mget/expire each cost one round trip for many keys"""
+    keys = [cache_key("test", i) for i in range(3)]
+    await cache_mset({keys[0]: {"id": 0}, keys[2]: [1, 2]}, expire=60)
+
+    assert await cache_mget(keys) == [{"id": 0}, None, [1, 2]]
+    assert await cache_get(keys[2]) == [1, 2]
+
+    await cache_expire(keys, 600)
+    assert 60 < await fake_redis.ttl(keys[0]) <= 600
+
+
+@pytest.mark.asyncio
+async def test_claim_and_lock_coordinate_workers(fake_redis):
+    """A claim is won once per TTL; a lock is exclusive and released on exit"""
+    assert await claim("snapshot_sync:host-1", 60)
+    assert not await claim("snapshot_sync:host-1", 60)
+    assert await claim("snapshot_sync:host-2", 60)
+
+    async with redis_lock("stats", wait=0) as first:
+        async with redis_lock("stats", wait=0) as second:
+            assert first and not second
+    async with redis_lock("stats", wait=0) as again:
+        assert again
@@ -0,0 +1,147 @@
+"""
+Tests for the columnar snapshot store
+"""
+
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from config.settings import settings
+from utils.snapshot_store import SnapshotStore
+
+
+class TableReader:
+    """Serves an in-memory shipments table like AnalyticsReader.iter_batches"""
+
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+
+    async def iter_batches(self, table, since=None, watermark_column="updated_at", since_key=None, key_column="id"):
+        self.calls.append(since)
+        position = lambda r: (r[watermark_column], r[key_column])
+        rows = sorted((r for r in self.rows if since is None or position(r) > (since, since_key)), key=position)
+        for start in range(0, len(rows), 2):
+            yield pd.DataFrame(rows[start:start + 2])
+
+
+def shipment(id, port, created, updated, status="in_transit"):
+    return {"id": id, "port_of_loading": port, "port_of_discharge": "Mombasa", "status": status,
+            "created_at": datetime.fromisoformat(created), "updated_at": datetime.fromisoformat(updated)}
+
+
+@pytest.fixture
+def store(tmp_path):
+    reader = TableReader()
+    reader.rows = [
+        shipment(1, "Yokohama", "2026-01-05", "2026-01-05"),
+        shipment(2, "Southampton", "2026-01-20", "2026-01-20"),
+        shipment(3, "Kobe", "2026-02-03", "2026-02-03"),
+    ]
+    return SnapshotStore(str(tmp_path), reader=reader)
+
+
+@pytest.mark.asyncio
+async def test_sync_partitions_and_query(store):
+    """Rows land in month partitions and can be filtered by lane, date and columns"""
+    assert await store.sync("shipments") == 3
+    assert store.months("shipments") == ["2026-01", "2026-02"]
+
+    japan = store.query("shipments", columns=["id"], origin=["yokohama", "KOBE"])
+    assert sorted(japan["id"]) == [1, 3]
+
+    january = store.query("shipments", columns=["id", "status"], start=date(2026, 1, 1), end=date(2026, 1, 31))
+    assert list(january.columns) == ["id", "status"]
+    assert sorted(january["id"]) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_keeps_latest_version(store):
+    """Later syncs only pull changes and updated rows replace older versions"""
+    await store.sync("shipments")
+    store.reader.rows[0] = shipment(1, "Yokohama", "2026-01-05", "2026-03-01", status="delayed")
+
+    assert await store.sync("shipments") == 1
+    assert store.reader.calls[-1] == datetime(2026, 2, 3)
+
+    rows = store.query("shipments", columns=["id", "status"])
+    assert len(rows) == 3
+    assert rows.set_index("id").loc[1, "status"] == "delayed"
+    assert await store.sync("shipments") == 0
+
+
+@pytest.mark.asyncio
+async def test_partitions_are_compacted(store, monkeypatch):
+    """Parts beyond SNAPSHOT_MAX_PARTS fold into one deduplicated file"""
+    monkeypatch.setattr(settings, "SNAPSHOT_MAX_PARTS", 3)
+    await store.sync("shipments")
+    for day in range(2, 6):
+        store.reader.rows[0] = shipment(1, "Yokohama", "2026-01-05", f"2026-03-0{day}")
+        await store.sync("shipments")
+
+    assert len(store._parts("shipments", "2026-01")) < 3
+    assert sorted(store.query("shipments")["id"]) == [1, 2, 3]
+
+
+def test_quotes_have_no_lane(store):
+    """Quotes lost their origin/destination columns in the backend, so lane filters are refused"""
+    with pytest.raises(ValueError):
+        store.query("quotes", origin="japan")
+    assert store.query("quotes").empty
+
+
+@pytest.mark.asyncio
+async def test_query_returns_only_current_versions(store):
+    """A changed row is filtered on its newest version, even if it moved to another month"""
+    await store.sync("shipments")
+    store.reader.rows[0] = shipment(1, "Mombasa", "2026-01-05", "2026-03-01", status="rerouted")
+    store.reader.rows[1] = shipment(2, "Southampton", "2026-02-25", "2026-03-02")
+    await store.sync("shipments")
+
+    assert store.query("shipments", origin="yokohama").empty
+    assert store.query("shipments", columns=["id", "status"], origin="mombasa").to_dict("records") == [
+        {"id": 1, "status": "rerouted"}
+    ]
+    january = store.query("shipments", columns=["id"], start=date(2026, 1, 1), end=date(2026, 1, 31))
+    assert list(january["id"]) == [1]
+
+
+def test_one_worker_per_directory_syncs(store, tmp_path):
+    """The flock on the directory's lock file picks the syncer, and frees up when it exits"""
+    other = SnapshotStore(str(tmp_path), reader=store.reader)
+    assert store._hold_sync_lock() and store._hold_sync_lock()
+    assert not other._hold_sync_lock()
+
+    store._sync_lock.close()
+    assert other._hold_sync_lock()
+
+
+@pytest.mark.asyncio
+async def test_delay_agent_caches_lane_history_between_syncs(store, monkeypatch):
+    """The lane history query runs off the event loop, once per snapshot version"""
+    import threading
+    import agents.delay_agent
+    from agents.delay_agent import DelayAgent
+
+    monkeypatch.setattr(agents.delay_agent, "snapshot_store", store)
+    query = store.query
+    threads = []
+
+    def counting_query(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return query(*args, **kwargs)
+
+    monkeypatch.setattr(store, "query", counting_query)
+    store.reader.rows = [shipment(1, "Yokohama", datetime.now().date().isoformat(), datetime.now().isoformat())]
+    await store.sync("shipments")
+
+    agent = DelayAgent()
+    first = await agent._lane_history("Japan")
+    assert first["shipments"] == 1 and await agent._lane_history("Japan") == first
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+    store.reader.rows.append(shipment(2, "Kobe", datetime.now().date().isoformat(), datetime.now().isoformat(), "delayed"))
+    await store.sync("shipments")
+    assert (await agent._lane_history("Japan"))["delayed_share"] == 0.5
+    assert len(threads) == 2
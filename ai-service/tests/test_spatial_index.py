@@ -0,0 +1,85 @@
+"""
+Tests for the live shipment position index
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from utils.geo import PORTS
+from utils.spatial_index import ShipmentPositionIndex, congestion_level, lane_ports
+
+
+def test_radius_query_matches_brute_force():
+    """Grid query returns exactly the shipments a full scan would"""
+    rng = np.random.default_rng(7)
+    index = ShipmentPositionIndex()
+    lat0, lon0 = PORTS["Mombasa"]
+    coords = np.column_stack([rng.normal(lat0, 1.5, 2000), rng.normal(lon0, 1.5, 2000)])
+    for sid, (lat, lon) in enumerate(coords):
+        index.update(sid, lat, lon)
+
+    from utils.geo import distances_from
+    expected = set(np.flatnonzero(distances_from((lat0, lon0), coords) <= 120).tolist())
+    assert {sid for sid, _ in index.within_radius(lat0, lon0, 120)} == expected
+
+
+def test_updates_move_and_ignore_stale_positions():
+    """Newer positions move a shipment, older ones are ignored"""
+    index = ShipmentPositionIndex()
+    now = datetime(2026, 3, 1, 12, 0)
+    index.update(1, *PORTS["Yokohama"], recorded_at=now)
+
+    assert index.update(1, *PORTS["Mombasa"], recorded_at=now - timedelta(hours=1)) is False
+    assert index.port_density("Yokohama") == 1
+
+    index.update(1, *PORTS["Mombasa"], recorded_at=now + timedelta(hours=1))
+    assert index.port_density("Yokohama") == 0
+    assert index.port_density("Mombasa") == 1
+
+    # An untimed update keeps the timestamp, so the stale one still loses
+    index.update(1, *PORTS["Dar es Salaam"])
+    assert index.get(1)[2] == now + timedelta(hours=1)
+    assert index.update(1, *PORTS["Yokohama"], recorded_at=now) is False
+
+    assert index.remove(1) is True
+    assert len(index) == 0
+
+
+def test_dateline_wraparound():
+    """Searches near the antimeridian see both sides"""
+    index = ShipmentPositionIndex()
+    index.update(1, 0.0, 179.9)
+    index.update(2, 0.0, -179.9)
+    assert {sid for sid, _ in index.within_radius(0.0, 180.0, 50)} == {1, 2}
+
+
+def test_congestion_helpers():
+    """Congestion levels and lane ports"""
+    assert congestion_level(0) == ("low", 0)
+    assert congestion_level(30)[0] == "high"
+    assert lane_ports("UK") == ["Southampton", "Liverpool", "Mombasa", "Dar es Salaam", "Port Bell"]
+
+
+@pytest.mark.asyncio
+async def test_workers_share_positions_through_redis(fake_redis):
+    """Each worker saves what it receives and reloads what the others saved"""
+    first, second = ShipmentPositionIndex(), ShipmentPositionIndex()
+    now = datetime(2026, 3, 1, 12, 0)
+    first.update(1, *PORTS["Mombasa"], recorded_at=now)
+    first.update(2, *PORTS["Yokohama"])
+    await first.save([1, 2])
+
+    await second.load()
+    assert second.port_density("Mombasa") == 1 and second.port_density("Yokohama") == 1
+    assert second.get(1)[2] == now
+
+    # A stale update reaching another worker does not overwrite the newer one
+    second.remove(1)
+    second.update(1, *PORTS["Yokohama"], recorded_at=now - timedelta(hours=1))
+    await second.save([1], removed=[2])
+    await first.load()
+    assert first.get(1) == (*PORTS["Mombasa"], now)
+    assert first.get(2) is None and len(first) == 1
+
@@ -0,0 +1,86 @@
+"""
+Tests for startup cost
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.import_time import HEAVY_MODULES, import_seconds, loaded_modules
+from config.settings import settings
+from utils.startup import Warmup
+import utils.startup
+import main
+
+# Seconds `import main` may add on top of importing FastAPI itself; wall-clock,
+# so slow or shared CI machines can raise it (0 skips the check)
+IMPORT_BUDGET = float(os.environ.get("IMPORT_BUDGET", "0.6"))
+
+
+def test_main_does_not_import_heavy_modules():
+    eager = set(HEAVY_MODULES) & set(loaded_modules("main"))
+    assert not eager, f"imported at startup: {sorted(eager)}"
+
+
+@pytest.mark.skipif(IMPORT_BUDGET <= 0, reason="IMPORT_BUDGET=0")
+def test_main_import_within_budget():
+    framework = min(import_seconds("fastapi") for _ in range(2))
+    service = min(import_seconds("main") for _ in range(2))
+    assert service - framework < IMPORT_BUDGET, f"import main took {service:.2f}s ({framework:.2f}s for FastAPI)"
+
+
+def test_health_answers_while_warming_up(monkeypatch):
+    state = Warmup()
+    finished = {"done": False}
+
+    async def slow_run(factories):
+        await asyncio.sleep(30)
+        finished["done"] = True
+
+    monkeypatch.setattr(state, "run", slow_run)
+    monkeypatch.setattr(main, "warmup", state)
+    monkeypatch.setattr(settings, "SNAPSHOT_SYNC_INTERVAL", 0)
+
+    started = time.perf_counter()
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+        # Well under the 30s warm-up: the server did not wait for it
+        assert time.perf_counter() - started < 10
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+    assert finished["done"] is False
+    assert state.status()["status"] == "stopping"
+
+
+@pytest.mark.asyncio
+async def test_warmup_builds_agents_before_ready(monkeypatch):
+    built = []
+
+    async def no_backends():
+        pass
+
+    class Agent:
+        def __init__(self):
+            built.append(self)
+
+    def broken():
+        raise ImportError("No module named 'pytesseract'")
+
+    monkeypatch.setattr(utils.startup, "start_backends", no_backends)
+    monkeypatch.setattr(settings, "WARMUP_CONNECT", False)
+    monkeypatch.setattr(settings, "WARMUP_AGENTS", ["quote", "support"])
+
+    state = Warmup()
+    await state.run({"quote": Agent, "support": Agent})
+    assert len(built) == 2
+    assert state.ready and state.status()["steps"] == {"backends": "ok", "agent.quote": "ok", "agent.support": "ok"}
+
+    state = Warmup()
+    await state.run({"quote": Agent, "support": broken})
+    assert not state.ready
+    assert state.status()["status"] == "failed"
+    assert state.steps["agent.support"].startswith("failed: No module named")
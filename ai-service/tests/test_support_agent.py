@@ -0,0 +1,264 @@
+"""
+Tests for Support Agent retrieval
+"""
+
+import asyncio
+
+import pytest
+from agents.support_agent import SupportAgent
+from agents.support_context import SupportContext
+
+
+class RecordingLLM:
+    """Stands in for the chat model and records prompts"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def ainvoke(self, messages):
+        self.calls.append(messages)
+        return type("Response", (), {"content": "LLM answer"})()
+
+    async def astream(self, messages):
+        self.calls.append(messages)
+        for word in ("LLM ", "answer"):
+            yield type("Chunk", (), {"content": word})()
+
+
+class StubLaravelAPI:
+    """Canned backend responses with an optional delay for tracking lookups"""
+
+    def __init__(self, tracking_delay=0.0):
+        self.tracking_delay = tracking_delay
+        self.calls = []
+
+    async def get_customer(self, customer_id):
+        self.calls.append(("customer", customer_id))
+        return {"success": True, "data": {"id": customer_id, "first_name": "Amina", "last_name": "Okello"}}
+
+    async def get_shipment(self, shipment_id):
+        self.calls.append(("shipment", shipment_id))
+        return {"success": True, "data": {
+            "id": shipment_id, "customer_id": 1, "tracking_number": "SWG-1001",
+            "status": "in_transit", "current_location": "Mombasa",
+        }}
+
+    async def get_shipment_tracking(self, shipment_id):
+        self.calls.append(("tracking", shipment_id))
+        await asyncio.sleep(self.tracking_delay)
+        return {"success": True, "data": {"tracking_history": [{"description": "Discharged at Mombasa"}]}}
+
+
+@pytest.fixture
+def support_agent(monkeypatch):
+    """Create support agent instance with a recording LLM and stubbed backend"""
+    import agents.support_agent
+
+    monkeypatch.setattr(agents.support_agent, "support_context", SupportContext(api=StubLaravelAPI()))
+    agent = SupportAgent()
+    agent.llm = RecordingLLM()
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_faq_answered_without_llm(support_agent):
+    """High-confidence FAQ matches skip the LLM"""
+    result = await support_agent.execute({"query": "How long does shipping take?", "customer_id": 1})
+
+    assert result["answered_by"] == "faq"
+    assert "customs clearance" in result["response"]
+    assert support_agent.llm.calls == []
+
+
+@pytest.mark.asyncio
+async def test_llm_gets_retrieved_passages_only(support_agent):
+    """Other questions go to the LLM with top-k passages instead of the full prompt"""
+    result = await support_agent.execute({"query": "How much to ship a Toyota Hilux from Japan?", "customer_id": 1})
+
+    assert result["answered_by"] == "llm"
+    system_prompt = support_agent.llm.calls[0][0]["content"]
+    assert "Relevant information:" in system_prompt
+    passages = system_prompt.split("Relevant information:")[1].split("\n\n")[0]
+    assert passages.count("\n- ") <= 3
+
+
+@pytest.mark.asyncio
+async def test_escalations_never_use_faq(support_agent):
+    """Queries needing a human are not short-circuited"""
+    result = await support_agent.execute({"query": "I have a problem tracking my shipment", "customer_id": 1})
+
+    assert result["answered_by"] == "llm"
+    assert result["requires_human"] is True
+
+
+@pytest.mark.asyncio
+async def test_conversation_is_stored_and_compacted(support_agent, fake_redis, monkeypatch):
+    """Turns are kept server-side and older ones fold into a bounded summary"""
+    from config.settings import settings
+    from utils.conversation_store import conversation_store, estimate_tokens
+
+    monkeypatch.setattr(settings, "SUPPORT_HISTORY_TOKEN_BUDGET", 60)
+
+    async def summarize(summary, turns):
+        return f"{len(turns)} earlier turns"
+
+    support_agent._summarize = summarize
+    first = await support_agent.execute({"query": "I am shipping a 2018 Toyota Hilux from Japan", "customer_id": 1})
+    conversation_id = first["conversation_id"]
+
+    for turn in range(12):
+        await support_agent.execute({
+            "query": f"Follow-up question number {turn} about my Hilux booking",
+            "customer_id": 1,
+            "conversation_id": conversation_id
+        })
+        await asyncio.gather(*support_agent._background)
+
+    summary, turns = await conversation_store.load(f"1:{conversation_id}")
+    assert summary.endswith("earlier turns")
+    assert sum(estimate_tokens(t["content"]) for t in turns) <= 60 + 2 * estimate_tokens("LLM answer" * 10)
+
+    # The prompt carries the summary and recent turns, never the whole chat
+    last_messages = support_agent.llm.calls[-1]
+    assert "Summary of the earlier conversation" in last_messages[0]["content"]
+    assert len(last_messages) < 12
+
+    # Another customer reusing the id starts an empty conversation
+    await support_agent.execute({"query": "What is in this chat?", "customer_id": 2, "conversation_id": conversation_id})
+    assert "Summary of the earlier conversation" not in support_agent.llm.calls[-1][0]["content"]
+    assert len(support_agent.llm.calls[-1]) == 2
+
+
+@pytest.mark.asyncio
+async def test_overlapping_compactions_run_once(fake_redis):
+    """A compaction started while another waits on its summary is skipped"""
+    from utils.conversation_store import conversation_store
+
+    turns = [{"role": "user", "content": f"turn {n} " + "x" * 80} for n in range(10)]
+    await conversation_store.append("1:overlap", turns)
+    calls = []
+
+    async def slow_summarize(summary, folded):
+        calls.append(len(folded))
+        await asyncio.sleep(0.1)
+        return f"{len(folded)} turns"
+
+    results = await asyncio.gather(*(conversation_store.compact("1:overlap", slow_summarize, 100) for _ in range(3)))
+    assert sorted(results) == [False, False, True]
+    assert len(calls) == 1
+
+    summary, kept = await conversation_store.load("1:overlap")
+    assert summary == f"{calls[0]} turns"
+    assert kept == turns[calls[0]:]
+
+@pytest.mark.asyncio
+async def test_customer_context_in_prompt(support_agent):
+    """Customer and shipment details are prefetched into the LLM prompt"""
+    result = await support_agent.execute({
+        "query": "Has my Hilux cleared the port yet?", "customer_id": 1, "shipment_id": 7
+    })
+
+    system_prompt = support_agent.llm.calls[0][0]["content"]
+    assert "Customer: Amina Okello" in system_prompt
+    assert "Shipment SWG-1001: status in_transit, location Mombasa" in system_prompt
+    assert "Discharged at Mombasa" in system_prompt
+    assert result["related_shipments"] == [7]
+
+
+@pytest.mark.asyncio
+async def test_context_budget_and_cache(monkeypatch):
+    """Slow lookups are skipped at the budget, then served from cache next turn"""
+    from config.settings import settings
+
+    monkeypatch.setattr(settings, "SUPPORT_CONTEXT_BUDGET_MS", 50)
+    api = StubLaravelAPI(tracking_delay=0.2)
+    context = SupportContext(api=api)
+
+    first = await context.assemble(1, 7)
+    assert "SWG-1001" in first
+    assert "Latest tracking update" not in first
+
+    await asyncio.sleep(0.3)
+    second = await context.assemble(1, 7)
+    assert "Discharged at Mombasa" in second
+    assert len(api.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_context_cache_is_bounded(monkeypatch):
+    """Expired entries are dropped on read and the oldest go past the size limit"""
+    from config.settings import settings
+
+    monkeypatch.setattr(settings, "SUPPORT_CONTEXT_CACHE_MAX_ENTRIES", 2)
+    context = SupportContext(api=StubLaravelAPI())
+    for customer_id in (1, 2, 3):
+        await context.assemble(customer_id)
+    assert [key[0] for key in context._cache] == [2, 3]
+
+    monkeypatch.setattr(settings, "SUPPORT_CONTEXT_CACHE_TTL", -1)
+    await context.assemble(4)
+    assert (4, "customer", 4) in context._cache
+    assert context._cached((4, "customer", 4)) is None and (4, "customer", 4) not in context._cache
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_cancelled_when_preparation_fails(support_agent, monkeypatch):
+    """A failed history load does not leave the context prefetch running"""
+    import agents.support_agent
+
+    started = asyncio.Event()
+
+    async def slow_assemble(customer_id, shipment_id=None):
+        started.set()
+        await asyncio.sleep(10)
+
+    async def broken_load(session):
+        await started.wait()
+        raise ConnectionError("Redis down")
+
+    monkeypatch.setattr(agents.support_agent.support_context, "assemble", slow_assemble)
+    monkeypatch.setattr(agents.support_agent.conversation_store, "load", broken_load)
+    with pytest.raises(ConnectionError):
+        await support_agent._prepare({"query": "Where is my car?", "customer_id": 1}, "c1")
+
+    await asyncio.sleep(0)
+    prefetches = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    assert prefetches == []
+
+
+@pytest.mark.asyncio
+async def test_context_ignores_other_customers_shipment():
+    """A shipment belonging to someone else is never shown"""
+    context = SupportContext(api=StubLaravelAPI())
+
+    summary = await context.assemble(2, 7)
+    assert "SWG-1001" not in summary
+
+
+@pytest.mark.asyncio
+async def test_context_requires_a_known_shipment_owner():
+    """Shipments are read through booking.customer_id; without an owner they are withheld"""
+    api = StubLaravelAPI()
+    record = {"id": 7, "tracking_number": "SWG-1001", "status": "in_transit", "booking": {"customer_id": 1}}
+
+    async def get_shipment(shipment_id):
+        return {"success": True, "data": {"shipment": record, "tracking_history": []}}
+
+    api.get_shipment = get_shipment
+    assert "SWG-1001" in await SupportContext(api=api).assemble(1, 7)
+
+    del record["booking"]
+    assert "SWG-1001" not in await SupportContext(api=api).assemble(1, 7)
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_tokens_then_result(support_agent):
+    """Streaming emits token events and finishes with the full response"""
+    events = [event async for event in support_agent.stream({
+        "query": "How much to ship a Toyota Hilux from Japan?", "customer_id": 1, "conversation_id": "s1"
+    })]
+
+    assert [e["content"] for e in events if e["type"] == "token"] == ["LLM ", "answer"]
+    assert events[-1]["type"] == "done"
+    assert events[-1]["response"] == "LLM answer"
+    assert events[-1]["conversation_id"] == "s1"
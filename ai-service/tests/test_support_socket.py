@@ -0,0 +1,125 @@
+"""
+Tests for the multiplexed support WebSocket
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from config.settings import settings
+from main import app, get_support_agent
+from utils.auth import sign_token
+
+
+class StreamingAgent:
+    """Streams the query back word by word; "slow" queries never finish"""
+
+    async def stream(self, input_data):
+        words = input_data["query"].split()
+        for word in words:
+            if input_data["query"].startswith("slow"):
+                await asyncio.sleep(10)
+            yield {"type": "token", "content": word + " "}
+        yield {"type": "done", "response": " ".join(words), "answered_by": "llm",
+               "conversation_id": input_data["conversation_id"], "customer_id": input_data["customer_id"]}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "SERVICE_SECRET", "test-secret")
+    app.dependency_overrides[get_support_agent] = StreamingAgent
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def connect(client, customer_id=1):
+    return client.websocket_connect(f"/ws/support?token={sign_token(customer_id)}")
+
+
+def collect(websocket, conversation_id):
+    """Receive events until the conversation's done/cancelled event"""
+    events = []
+    while True:
+        event = websocket.receive_json()
+        if event.get("conversation_id") == conversation_id:
+            events.append(event)
+            if event["type"] in ("done", "cancelled"):
+                return events
+
+
+def test_multiplexed_streams(client):
+    """Two conversations stream over one connection"""
+    with connect(client) as websocket:
+        websocket.send_json({"type": "message", "conversation_id": "a", "query": "hello there", "customer_id": 1})
+        websocket.send_json({"type": "message", "conversation_id": "b", "query": "second chat", "customer_id": 1})
+
+        events = {"a": [], "b": []}
+        while not all(e and e[-1]["type"] == "done" for e in events.values()):
+            event = websocket.receive_json()
+            events[event["conversation_id"]].append(event)
+
+        assert [e["content"] for e in events["a"][:-1]] == ["hello ", "there "]
+        assert events["b"][-1]["response"] == "second chat"
+
+
+def test_cancel_aborts_stream(client):
+    """A cancel stops the answer; other conversations keep working"""
+    with connect(client) as websocket:
+        websocket.send_json({"type": "message", "conversation_id": "slow", "query": "slow answer", "customer_id": 1})
+        websocket.send_json({"type": "cancel", "conversation_id": "slow"})
+        assert collect(websocket, "slow") == [{"type": "cancelled", "conversation_id": "slow"}]
+
+        websocket.send_json({"type": "message", "conversation_id": "next", "query": "still here", "customer_id": 1})
+        assert collect(websocket, "next")[-1]["response"] == "still here"
+
+
+def test_limits_and_bad_messages(client, monkeypatch):
+    """Per-connection in-flight cap and malformed input produce error events"""
+    from config.settings import settings
+
+    monkeypatch.setattr(settings, "SUPPORT_WS_MAX_INFLIGHT", 1)
+    with connect(client) as websocket:
+        websocket.send_text("not json")
+        assert websocket.receive_json()["detail"] == "Invalid JSON message"
+
+        websocket.send_json({"type": "message", "conversation_id": "slow", "query": "slow one", "customer_id": 1})
+        websocket.send_json({"type": "message", "conversation_id": "other", "query": "hi", "customer_id": 1})
+        error = websocket.receive_json()
+        assert error["type"] == "error" and error["conversation_id"] == "other"
+
+        websocket.send_json({"type": "ping"})
+        assert websocket.receive_json() == {"type": "pong"}
+
+
+def test_handshake_requires_customer_token(client, monkeypatch):
+    """The customer comes from the signed token, never from the message"""
+    forged = sign_token(1).rsplit(".", 1)[0] + ".0" * 32
+    for url in ("/ws/support", f"/ws/support?token={forged}", f"/ws/support?token={sign_token(1, ttl=-10)}"):
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect(url):
+                pass
+
+    with connect(client, customer_id=7) as websocket:
+        websocket.send_json({"type": "message", "conversation_id": "a", "query": "hi", "customer_id": 1})
+        assert collect(websocket, "a")[-1]["customer_id"] == 7
+
+    monkeypatch.setattr(settings, "SERVICE_SECRET", "")
+    with pytest.raises(WebSocketDisconnect):
+        with connect(client):
+            pass
+
+
+def test_messages_are_rate_limited_per_customer(client, monkeypatch):
+    from utils.support_ws import message_limiter
+
+    monkeypatch.setattr(message_limiter, "per_minute", 2)
+    monkeypatch.setattr(message_limiter, "_buckets", type(message_limiter._buckets)())
+    with connect(client, customer_id=9) as websocket:
+        for conversation_id in ("a", "b"):
+            websocket.send_json({"type": "message", "conversation_id": conversation_id, "query": "hi"})
+            assert collect(websocket, conversation_id)[-1]["type"] == "done"
+        websocket.send_json({"type": "message", "conversation_id": "c", "query": "hi"})
+        error = websocket.receive_json()
+        assert error["detail"] == "Rate limit exceeded" and error["retry_after"] > 0
@@ -0,0 +1,80 @@
+"""
+Tests for request tracing
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config.settings import settings
+from main import app, get_quote_agent
+from agents.quote_agent import QuoteAgent
+from utils.tracing import SpanExporter, server_timing, span, start_trace
+import utils.tracing
+
+
+class UnavailableLLM:
+    async def ainvoke(self, messages, **kwargs):
+        raise RuntimeError("503 Service Unavailable")
+
+
+@pytest.mark.asyncio
+async def test_graph_nodes_become_child_spans():
+    agent = QuoteAgent()
+    agent.llm = UnavailableLLM()
+    with start_trace("POST /agents/quote") as root:
+        await agent.execute({
+            "vehicle_type": "sedan", "year": 2020, "make": "Toyota", "model": "Camry", "engine_size": 2500,
+            "origin_country": "Japan", "destination_country": "Uganda", "shipping_method": "roro",
+        })
+
+    names = [item.name for item in root.trace.spans]
+    for node in ("validate_input", "calculate_base_cost", "apply_ai_pricing", "generate_breakdown", "save_quote"):
+        assert f"quote.{node}" in names
+    assert all(item.parent_id == root.span_id for item in root.trace.spans if item.name.startswith("quote."))
+    assert "quote.apply_ai_pricing;dur=" in server_timing(root)
+
+
+def test_server_timing_only_with_debug_header(monkeypatch):
+    class StubQuoteAgent:
+        async def execute(self, request):
+            with span("quote.stub"):
+                return {"success": True, "total_cost": 1.0}
+
+    app.dependency_overrides[get_quote_agent] = StubQuoteAgent
+    try:
+        client = TestClient(app)
+        response = client.post("/agents/quote-preview", json={}, headers={"X-Debug-Timing": "1"})
+        assert response.headers["server-timing"].startswith("total;dur=")
+        assert "quote.stub;dur=" in response.headers["server-timing"]
+        assert "server-timing" not in client.post("/agents/quote-preview", json={}).headers
+
+        # Outside DEBUG only the backend, holding the service key, gets the breakdown
+        monkeypatch.setattr(settings, "DEBUG", False)
+        assert "server-timing" not in client.post("/agents/quote-preview", json={}, headers={"X-Debug-Timing": "1"}).headers
+        backend = {"X-Debug-Timing": "1", settings.SERVICE_KEY_HEADER: settings.SERVICE_SECRET}
+        assert "server-timing" in client.post("/agents/quote-preview", json={}, headers=backend).headers
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_file_export_continues_caller_trace(monkeypatch, tmp_path):
+    exporter = SpanExporter()
+    monkeypatch.setattr(utils.tracing, "span_exporter", exporter)
+    monkeypatch.setattr(settings, "TRACING_EXPORTER", "file")
+    monkeypatch.setattr(settings, "TRACING_FILE", str(tmp_path / "traces.jsonl"))
+
+    traceparent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    with start_trace("GET /health", traceparent) as root:
+        with span("child", answer=42):
+            pass
+    await exporter.flush()
+
+    payload = json.loads((tmp_path / "traces.jsonl").read_text().splitlines()[0])
+    spans = {item["name"]: item for item in payload["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+    assert spans["GET /health"]["traceId"] == "a" * 32
+    assert spans["GET /health"]["parentSpanId"] == "b" * 16
+    assert spans["child"]["parentSpanId"] == root.span_id
+    assert spans["child"]["attributes"] == [{"key": "answer", "value": {"intValue": "42"}}]
@@ -0,0 +1,70 @@
+"""
+Tests for streaming transit-time statistics
+"""
+
+import numpy as np
+import pytest
+
+from utils.transit_stats import TDigest, TransitTimeStats
+
+
+def test_tdigest_quantiles_and_bounded_size():
+    """Quantiles stay close to exact values with bounded centroids"""
+    rng = np.random.default_rng(3)
+    values = rng.gamma(9, 4.5, 50_000)
+    digest = TDigest(compression=100)
+    for value in values:
+        digest.add(value)
+
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert digest.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.02)
+    assert len(digest.means) <= 200
+
+
+def test_tdigest_merge_and_roundtrip():
+    """Merged per-worker digests match a single digest; serialization is lossless"""
+    rng = np.random.default_rng(5)
+    a, b = TDigest(), TDigest()
+    values = rng.normal(40, 5, 20_000)
+    for value in values[:10_000]:
+        a.add(value)
+    for value in values[10_000:]:
+        b.add(value)
+    a.merge(b)
+
+    assert a.count == 20_000
+    assert a.quantile(0.9) == pytest.approx(np.quantile(values, 0.9), rel=0.01)
+    assert TDigest.from_dict(a.to_dict()).quantile(0.5) == a.quantile(0.5)
+
+
+def test_lane_summary_falls_back_to_any_method():
+    """Lanes without data for a method use the lane-wide digest"""
+    stats = TransitTimeStats()
+    for days in range(40, 51):
+        stats.record("Japan", "Uganda", "roro", days)
+
+    assert stats.summary("japan", "uganda", "roro")["p50"] == pytest.approx(45, abs=0.5)
+    assert stats.summary("japan", "uganda", "container")["count"] == 11
+    assert stats.summary("uk") is None
+    assert "Japan (typically 45 days" in stats.describe(["japan", "uk"])
+
+
+@pytest.mark.asyncio
+async def test_workers_share_digests_through_redis(fake_redis):
+    """Each worker saves only its own new values, so no worker overwrites another's"""
+    first, second = TransitTimeStats(), TransitTimeStats()
+    for days in range(30, 40):
+        first.record("Japan", "Uganda", "roro", days)
+    for days in range(50, 60):
+        second.record("Japan", "Uganda", "roro", days)
+
+    await first.save()
+    await second.save()
+    await first.load()
+
+    assert first.summary("japan", "uganda", "roro")["count"] == 20
+    assert second.summary("japan", "uganda", "roro")["count"] == 20
+
+    await first.save()
+    await second.load()
+    assert second.summary("japan", "uganda", "roro")["count"] == 20
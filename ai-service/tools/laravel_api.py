@@ -2,15 +2,44 @@
 Laravel API client for interacting with backend
 """
 
+import asyncio
+import importlib.util
+import random
+import time
+from collections import OrderedDict
 import httpx
 from config.settings import settings
 from loguru import logger
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
+from utils.redis_client import cache_get, cache_mget, cache_set, cache_delete, cache_key
+from utils import deadline
+from utils.metrics import cache_requests
+from utils.tracing import CLIENT, current_span, span
+
+# Gateway/overload responses worth retrying for idempotent requests
+RETRYABLE_STATUSES = {429, 502, 503, 504}
 
 
 class LaravelAPI:
-    """Client for Laravel backend API"""
-    
+    """
+    Client for Laravel backend API
+
+    All requests share one pooled httpx client opened in the app lifespan
+    (start/close), so repeated lookups reuse warm keep-alive connections
+    instead of paying a handshake per call. GETs are retried a bounded
+    number of times with jittered backoff; writes are never retried.
+
+    Shipments, customers and routes are read through a two-level cache: a
+    small in-process LRU and Redis (shared across workers). Entries are
+    served as-is for LARAVEL_CACHE_TTL seconds, then revalidated with
+    If-None-Match so unchanged records cost a 304 and no body. Writes
+    through this client invalidate the record; other workers' in-process
+    copies expire within the TTL.
+
+    Inside a request with a deadline, each call's timeout is cut to the
+    time left and the remainder is forwarded in REQUEST_DEADLINE_HEADER.
+    """
+
     def __init__(self):
         self.base_url = settings.LARAVEL_API_URL
         self.api_key = settings.LARAVEL_API_KEY
@@ -20,101 +49,312 @@ class LaravelAPI:
         }
         if self.api_key:
             self.headers["Authorization"] = f"Bearer {self.api_key}"
-    
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: "OrderedDict[str, dict]" = OrderedDict()
+        # GETs in flight per key, and how often each of those keys was
+        # invalidated meanwhile, so a GET that overlaps a write is not cached.
+        # Both only hold keys with a GET in flight.
+        self._inflight: Dict[str, int] = {}
+        self._generations: Dict[str, int] = {}
+
+    def _build_client(self) -> httpx.AsyncClient:
+        http2 = settings.LARAVEL_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("LARAVEL_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+        return httpx.AsyncClient(
+            headers=self.headers,
+            http2=http2,
+            timeout=httpx.Timeout(
+                settings.LARAVEL_READ_TIMEOUT,
+                connect=settings.LARAVEL_CONNECT_TIMEOUT,
+                pool=settings.LARAVEL_CONNECT_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.LARAVEL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LARAVEL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LARAVEL_KEEPALIVE_EXPIRY
+            )
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared client; created on first use when the lifespan hook has not run"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def start(self):
+        """Open the connection pool"""
+        self.client
+        logger.info("Laravel API client initialized")
+
+    async def warm(self):
+        """Open a keep-alive connection to the backend (any HTTP status will do)"""
+        await self.client.head(self.base_url, timeout=settings.LARAVEL_CONNECT_TIMEOUT)
+
+    async def close(self):
+        """Close the connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Laravel API client closed")
+
+    def _request_options(self, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Headers and timeout for one call, bounded by the current request's deadline"""
+        headers = dict(headers or {})
+        parent = current_span()
+        if parent is not None:
+            headers["traceparent"] = parent.traceparent
+        left = deadline.bound()
+        if left is None:
+            return {"headers": headers or None}
+        return {
+            "headers": {**headers, settings.REQUEST_DEADLINE_HEADER: f"{left:.3f}"},
+            "timeout": httpx.Timeout(
+                min(left, settings.LARAVEL_READ_TIMEOUT),
+                connect=min(left, settings.LARAVEL_CONNECT_TIMEOUT),
+                pool=min(left, settings.LARAVEL_CONNECT_TIMEOUT)
+            )
+        }
+
+    async def _get(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        """GET with bounded retries and full-jitter exponential backoff"""
+        attempt = 0
+        with span("laravel.get", CLIENT, **{"http.target": path}) as current:
+            while True:
+                try:
+                    response = await self.client.get(f"{self.base_url}{path}", params=params, **self._request_options(headers))
+                    if response.status_code not in RETRYABLE_STATUSES or attempt >= settings.LARAVEL_GET_RETRIES:
+                        current.set("http.status_code", response.status_code)
+                        current.set("http.attempts", attempt + 1)
+                        if response.status_code != 304:
+                            response.raise_for_status()
+                        return response
+                except httpx.TransportError:
+                    if attempt >= settings.LARAVEL_GET_RETRIES:
+                        raise
+                attempt += 1
+                backoff = random.uniform(0, settings.LARAVEL_RETRY_BACKOFF * 2 ** attempt)
+                await asyncio.sleep(deadline.bound(backoff))
+
+    def _remember(self, key: str, entry: dict):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > settings.LARAVEL_CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+
+    async def _cached_get(self, key: str, path: str, shared: Optional[dict] = None) -> Optional[Dict[str, Any]]:
+        """
+        Read-through GET: in-process cache, then Redis, then a conditional request
+
+        shared is the Redis entry when the caller already fetched it in bulk.
+        Raises on backend errors only when there is no cached copy to fall back on.
+        """
+        entry = self._cache.get(key)
+        source = "local_hit"
+        if entry is None or time.time() - entry["fetched_at"] >= settings.LARAVEL_CACHE_TTL:
+            if shared is None:
+                shared = await cache_get(key)
+            if shared and (entry is None or shared["fetched_at"] > entry["fetched_at"]):
+                entry = shared
+                source = "redis_hit"
+        if entry is not None and time.time() - entry["fetched_at"] < settings.LARAVEL_CACHE_TTL:
+            cache_requests.labels("laravel", source).inc()
+            self._remember(key, entry)
+            return entry["data"]
+
+        headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else None
+        self._inflight[key] = self._inflight.get(key, 0) + 1
+        generation = self._generations.get(key, 0)
+        try:
+            response = await self._get(path, headers=headers)
+            overlapped = self._generations.get(key, 0) != generation
+        except Exception as e:
+            if entry is None:
+                raise
+            logger.warning(f"Serving stale {key} after backend error: {str(e)}")
+            cache_requests.labels("laravel", "stale").inc()
+            return entry["data"]
+        finally:
+            self._inflight[key] -= 1
+            if not self._inflight[key]:
+                del self._inflight[key]
+                self._generations.pop(key, None)
+
+        if response.status_code == 304 and entry is not None:
+            cache_requests.labels("laravel", "not_modified").inc()
+            entry = {**entry, "fetched_at": time.time()}
+        else:
+            cache_requests.labels("laravel", "miss").inc()
+            entry = {"etag": response.headers.get("etag"), "data": response.json(), "fetched_at": time.time()}
+        if overlapped:
+            # Invalidated while in flight: this copy may predate the write
+            return entry["data"]
+        self._remember(key, entry)
+        await cache_set(key, entry, expire=settings.LARAVEL_CACHE_REDIS_TTL)
+        return entry["data"]
+
+    async def invalidate(self, kind: str, record_id: int):
+        """Drop a cached shipment, customer or route after it changes"""
+        key = cache_key("laravel", kind, record_id)
+        if key in self._inflight:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        self._cache.pop(key, None)
+        await cache_delete(key)
+
     async def get_shipment(self, shipment_id: int) -> Optional[Dict[str, Any]]:
         """Get shipment details"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/admin/crud/shipments/{shipment_id}",
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                return response.json()
+            return await self._cached_get(cache_key("laravel", "shipment", shipment_id), f"/admin/crud/shipments/{shipment_id}")
         except Exception as e:
             logger.error(f"Error fetching shipment: {str(e)}")
             return None
-    
+
+    async def get_shipments(self, shipment_ids: List[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+        """
+        Get several shipments at once
+
+        Redis entries for all ids are read in one round trip; only misses
+        and stale entries go to the backend, concurrently.
+        """
+        keys = [cache_key("laravel", "shipment", shipment_id) for shipment_id in shipment_ids]
+        shared = await cache_mget(keys)
+
+        async def fetch(shipment_id, key, entry):
+            try:
+                return await self._cached_get(key, f"/admin/crud/shipments/{shipment_id}", entry)
+            except Exception as e:
+                logger.error(f"Error fetching shipment {shipment_id}: {str(e)}")
+                return None
+
+        results = await asyncio.gather(*(fetch(*args) for args in zip(shipment_ids, keys, shared)))
+        return dict(zip(shipment_ids, results))
+
+    async def get_shipment_tracking(self, shipment_id: int) -> Optional[Dict[str, Any]]:
+        """Get latest tracking data (current location and history) for a shipment"""
+        try:
+            response = await self._get(f"/admin/crud/shipments/{shipment_id}/map")
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error fetching shipment tracking: {str(e)}")
+            return None
+
     async def get_route(self, route_id: int) -> Optional[Dict[str, Any]]:
         """Get route details"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/routes/{route_id}",
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                return response.json()
+            return await self._cached_get(cache_key("laravel", "route", route_id), f"/routes/{route_id}")
         except Exception as e:
             logger.error(f"Error fetching route: {str(e)}")
             return None
-    
+
     async def create_quote(self, quote_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Create quote in Laravel"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/quotes",
-                    json=quote_data,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                return response.json()
+            response = await self.client.post(f"{self.base_url}/quotes", json=quote_data, **self._request_options())
+            response.raise_for_status()
+            return response.json()
         except Exception as e:
             logger.error(f"Error creating quote: {str(e)}")
             return None
-    
+
     async def update_shipment(self, shipment_id: int, data: Dict[str, Any]) -> bool:
         """Update shipment"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.put(
-                    f"{self.base_url}/admin/crud/shipments/{shipment_id}",
-                    json=data,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                return True
+            response = await self.client.put(
+                f"{self.base_url}/admin/crud/shipments/{shipment_id}", json=data, **self._request_options()
+            )
+            response.raise_for_status()
+            return True
         except Exception as e:
             logger.error(f"Error updating shipment: {str(e)}")
             return False
-    
+        finally:
+            # Even a failed write may have reached the backend
+            await self.invalidate("shipment", shipment_id)
+
     async def get_customer(self, customer_id: int) -> Optional[Dict[str, Any]]:
         """Get customer details"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/admin/customers/{customer_id}",
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                return response.json()
+            return await self._cached_get(cache_key("laravel", "customer", customer_id), f"/admin/customers/{customer_id}")
         except Exception as e:
             logger.error(f"Error fetching customer: {str(e)}")
             return None
-    
+
     async def get_historical_shipments(self, filters: Dict[str, Any] = None) -> list:
-        """Get historical shipment data for ML training"""
+        """Get one page of historical shipment data (see iter_historical_shipments for all of it)"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/admin/crud/shipments",
-                    params=filters or {},
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data.get('data', [])
+            response = await self._get("/admin/crud/shipments", params=filters or {})
+            data = response.json()
+            return data.get('data', [])
         except Exception as e:
             logger.error(f"Error fetching historical shipments: {str(e)}")
             return []
 
+    async def iter_historical_shipments(
+        self,
+        filters: Dict[str, Any] = None,
+        page_size: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the full shipment history, one record at a time
+
+        Pages are requested page_size records at a time and the next page is
+        fetched while the caller works through the current one, so memory
+        stays bounded by one or two pages however long the history is.
+        """
+        # Page by ascending id: the default (created_at desc) shifts every page
+        # when shipments are added mid-walk, duplicating or skipping records
+        params = {
+            **(filters or {}),
+            "per_page": page_size or settings.LARAVEL_PAGE_SIZE,
+            "sort_by": "id",
+            "sort_order": "asc",
+        }
+        path = "/admin/crud/shipments"
+        try:
+            page = 1
+            next_page = asyncio.create_task(self._get_page(path, params, page))
+            try:
+                while next_page is not None:
+                    records, has_more = await next_page
+                    page += 1
+                    next_page = asyncio.create_task(self._get_page(path, params, page)) if has_more else None
+                    for record in records:
+                        yield record
+            finally:
+                if next_page is not None:
+                    next_page.cancel()
+        except Exception as e:
+            logger.error(f"Error streaming historical shipments: {str(e)}")
+            raise
+
+    async def _get_page(self, path: str, params: Dict[str, Any], page: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        One page of a paginated backend response as (records, has_more)
+
+        The backend's ApiResponseService::paginated puts the records in
+        "data" and the paginator state in "meta.pagination".
+        """
+        response = await self._get(path, params={**params, "page": page})
+        body = response.json()
+        records = body.get("data") or []
+        pagination = (body.get("meta") or {}).get("pagination") or {}
+
+        if "has_more_pages" in pagination:
+            has_more = bool(pagination["has_more_pages"])
+        elif "last_page" in pagination:
+            has_more = pagination.get("current_page", page) < pagination["last_page"]
+        else:
+            # Not a paginated response: assume more while pages come back full
+            has_more = len(records) >= params["per_page"]
+        return records, has_more and bool(records)
+
 
 # Singleton instance
 laravel_api = LaravelAPI()
@@ -0,0 +1,236 @@
+"""
+Admission control for agent endpoints
+Per-client rate limiting and per-agent concurrency limits with fast rejection
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+from config.settings import settings
+from utils.auth import is_service_key
+from utils.redis_client import get_redis_client, cache_key
+from utils.metrics import admission_rejections, agent_active, agent_queued
+from utils.logger import throttled
+
+# Atomic token bucket shared by all workers: refill by elapsed time, take one
+_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+# First word of each /agents/* route; anything else shares the "other" gate,
+# so made-up paths cannot create gates (and metric series) without bound
+AGENTS = ("quote", "route", "document", "support", "delay", "notify", "consolidate", "parse", "suggest", "validate")
+OTHER = "other"
+
+
+class RateLimiter:
+    """
+    Per-client token buckets
+
+    Buckets live in Redis when it is available, so the limit holds across
+    workers; otherwise (or if Redis errors) each worker keeps its own
+    buckets in a bounded LRU.
+    """
+
+    def __init__(self, per_minute: Optional[int] = None, burst: Optional[int] = None, max_clients: int = 10000):
+        self.per_minute = per_minute
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    @property
+    def rate(self) -> float:
+        return (self.per_minute or settings.RATE_LIMIT_PER_MINUTE) / 60
+
+    @property
+    def capacity(self) -> float:
+        return float(self.burst or settings.RATE_LIMIT_BURST or self.per_minute or settings.RATE_LIMIT_PER_MINUTE)
+
+    async def acquire(self, client_id: str) -> Tuple[bool, float]:
+        """
+        Take one token for a client
+
+        Returns:
+            (allowed, retry_after_seconds)
+        """
+        now = time.time()
+        client = get_redis_client()
+        if client:
+            try:
+                allowed, tokens = await client.eval(
+                    _BUCKET_SCRIPT, 1, cache_key("ratelimit", client_id), self.rate, self.capacity, now
+                )
+                return bool(allowed), self._retry_after(float(tokens))
+            except Exception as e:
+                logger.warning(f"Redis rate limiter unavailable, using local buckets: {str(e)}")
+        return self._acquire_local(client_id, now)
+
+    def _acquire_local(self, client_id: str, now: float) -> Tuple[bool, float]:
+        tokens, ts = self._buckets.pop(client_id, (self.capacity, now))
+        tokens = min(self.capacity, tokens + max(0.0, now - ts) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[client_id] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return allowed, self._retry_after(tokens)
+
+    def _retry_after(self, tokens: float) -> float:
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+class AgentGate:
+    """
+    Concurrency limit with a bounded wait queue for one agent
+
+    Up to `limit` requests run at once and up to `queue_size` more wait (for
+    at most the queue timeout). Anything beyond that is rejected at once
+    rather than piling up behind slow LLM or OCR work.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+        self._active_gauge = agent_active.labels(name)
+        self._queued_gauge = agent_queued.labels(name)
+
+    async def enter(self, timeout: float) -> bool:
+        """Take a slot; False when the queue is full or the wait timed out"""
+        if self.active < self.limit and not self.waiting:
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            self._queued_gauge.inc()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+                self._queued_gauge.dec()
+        self.active += 1
+        self._active_gauge.inc()
+        return True
+
+    def leave(self):
+        self.active -= 1
+        self._active_gauge.dec()
+        self._semaphore.release()
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware guarding /agents/* endpoints
+
+    Requests over the client's rate get 429 and requests the agent cannot
+    take on get 503, both with Retry-After and before the body is read.
+    """
+
+    def __init__(self, app, prefix: str = "/agents/"):
+        self.app = app
+        self.prefix = prefix
+        self.limiter = RateLimiter()
+        self.gates: Dict[str, AgentGate] = {}
+
+    def gate(self, agent: str) -> AgentGate:
+        gate = self.gates.get(agent)
+        if gate is None:
+            limit = settings.AGENT_CONCURRENCY.get(agent, settings.AGENT_CONCURRENCY_DEFAULT)
+            gate = self.gates[agent] = AgentGate(agent, limit, settings.AGENT_QUEUE_SIZE)
+        return gate
+
+    def client_id(self, scope) -> Optional[str]:
+        """
+        Rate-limit key for a request (None: not rate limited)
+
+        The client header is only believed from the Laravel backend (it
+        sends SERVICE_SECRET) or a trusted proxy; browsers calling the
+        service directly are keyed by their address, so a made-up id does
+        not buy a fresh bucket. Backend requests without a client header
+        come from queue jobs and scheduled tasks and are not limited.
+        """
+        headers = {}
+        for name, value in scope.get("headers", []):
+            headers[name.decode("latin-1").lower()] = value.decode("latin-1")
+        claimed = headers.get(settings.RATE_LIMIT_CLIENT_HEADER.lower())
+        client = scope.get("client")
+        peer = client[0] if client else "unknown"
+
+        if is_service_key(headers.get(settings.SERVICE_KEY_HEADER.lower())):
+            return f"client:{claimed[:128]}" if claimed else None
+        if peer in settings.RATE_LIMIT_TRUSTED_PROXIES:
+            if claimed:
+                return f"client:{claimed[:128]}"
+            forwarded = [hop.strip() for hop in headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+            if forwarded:
+                return forwarded[-1]
+        return peer
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefix) or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        client_id = self.client_id(scope)
+        limited = client_id is not None and settings.RATE_LIMIT_PER_MINUTE > 0
+        allowed, retry_after = await self.limiter.acquire(client_id) if limited else (True, 0)
+        if not allowed:
+            throttled("admission.rate_limit").warning("Rate limit exceeded for client {}", client_id)
+            admission_rejections.labels("*", "rate_limit").inc()
+            await self._reject(send, 429, "Rate limit exceeded", retry_after)
+            return
+
+        # /agents/quote-preview and /agents/quote share the quote agent's slots
+        agent = path[len(self.prefix):].split("/", 1)[0].split("-", 1)[0]
+        if agent not in AGENTS and agent not in settings.AGENT_CONCURRENCY:
+            agent = OTHER
+        gate = self.gate(agent)
+        if not await gate.enter(settings.AGENT_QUEUE_TIMEOUT):
+            throttled(f"admission.shed.{agent}").warning("Shedding {}: {} active, {} queued", path, gate.active, gate.waiting)
+            admission_rejections.labels(agent, "capacity").inc()
+            await self._reject(send, 503, f"The {agent} agent is at capacity", settings.AGENT_QUEUE_TIMEOUT)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.leave()
+
+    async def _reject(self, send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"success": False, "error": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
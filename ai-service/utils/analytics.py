@@ -0,0 +1,207 @@
+"""
+Read-only analytics access to the shipments database
+Streams shipment, quote and booking rows in column-projected batches
+"""
+
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Optional, Sequence, Union
+
+import pandas as pd
+from sqlalchemy import MetaData, Table, and_, event, or_, select
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from loguru import logger
+
+from config.settings import settings
+from utils.database import DATABASE_URL
+from utils.redis_client import cache_get, cache_set, cache_key
+
+if TYPE_CHECKING:
+    import pyarrow
+
+# Tables exposed to analytics; nothing else can be read through this module
+TABLES = ("shipments", "quotes", "bookings")
+
+
+def _plain(value: Any) -> Any:
+    return value.item() if hasattr(value, "item") else value
+
+
+def encode_watermark(value: Any, key: Any = None) -> dict:
+    """
+    JSON-safe watermark that decodes back to the column's type
+
+    `key` is the primary key of the last row read at `value`, which breaks
+    ties between rows sharing a timestamp (see iter_batches).
+    """
+    key = _plain(key)
+    if isinstance(value, (datetime, date)):
+        encoded = {"type": "datetime", "value": pd.Timestamp(value).isoformat()}
+    else:
+        value = _plain(value)
+        encoded = {"type": "number" if isinstance(value, (int, float)) else "string", "value": value}
+    if key is not None:
+        encoded["key"] = key
+    return encoded
+
+
+def decode_watermark(stored: Optional[dict]) -> Any:
+    if not stored:
+        return None
+    if stored["type"] == "datetime":
+        return datetime.fromisoformat(stored["value"])
+    return stored["value"]
+
+
+def decode_watermark_key(stored: Optional[dict]) -> Any:
+    """Tie-breaking primary key of a stored watermark (None for watermarks written without one)"""
+    return stored.get("key") if stored else None
+
+
+class AnalyticsReader:
+    """
+    Streaming reader over the backend's MySQL tables
+
+    Rows are fetched through a server-side cursor (stream_results) and
+    handed out batch_size rows at a time as pandas DataFrames or Arrow
+    record batches, so a scan over the whole history holds one batch in
+    memory. The reader uses its own small pool, pointed at a replica via
+    ANALYTICS_DATABASE_URL when one exists, and MySQL sessions are put in
+    read-only mode on connect.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or settings.ANALYTICS_DATABASE_URL or DATABASE_URL
+        self._engine: Optional[AsyncEngine] = None
+        self._tables: Dict[str, Table] = {}
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            options = {"pool_pre_ping": True}
+            if not self.url.startswith("sqlite"):
+                options.update(pool_size=2, max_overflow=0, pool_recycle=settings.DB_POOL_RECYCLE)
+            self._engine = create_async_engine(self.url, **options)
+
+            if self._engine.dialect.name == "mysql":
+                @event.listens_for(self._engine.sync_engine, "connect")
+                def _read_only(dbapi_connection, _):
+                    cursor = dbapi_connection.cursor()
+                    cursor.execute("SET SESSION TRANSACTION READ ONLY")
+                    cursor.close()
+        return self._engine
+
+    async def close(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+    async def _table(self, name: str) -> Table:
+        """Reflect (once) an allowed table"""
+        if name not in TABLES:
+            raise ValueError(f"Table '{name}' is not available for analytics")
+        if name not in self._tables:
+            metadata = MetaData()
+            async with self.engine.connect() as conn:
+                await conn.run_sync(metadata.reflect, only=[name])
+            self._tables[name] = metadata.tables[name]
+        return self._tables[name]
+
+    async def iter_batches(
+        self,
+        table: str,
+        columns: Optional[Sequence[str]] = None,
+        since: Optional[object] = None,
+        watermark_column: str = "updated_at",
+        batch_size: Optional[int] = None,
+        as_arrow: bool = False,
+        since_key: Optional[object] = None,
+        key_column: str = "id"
+    ) -> AsyncIterator[Union[pd.DataFrame, "pyarrow.RecordBatch"]]:
+        """
+        Stream rows of a table in batches
+
+        Incremental reads are ordered by (watermark, key) and resume after
+        the compound position (since, since_key). A plain `updated_at >
+        since` would skip, forever, rows that share the last timestamp but
+        committed after the previous read. A watermark without a key resumes
+        at `>= since`, re-reading that timestamp's rows once.
+
+        Args:
+            table: One of TABLES
+            columns: Columns to select (all when omitted)
+            since: Only rows at or after this watermark value
+            watermark_column: Column that orders and filters incremental reads
+            batch_size: Rows per batch (ANALYTICS_BATCH_SIZE by default)
+            as_arrow: Yield pyarrow.RecordBatch instead of DataFrame
+            since_key: Primary key of the last row already read at `since`
+            key_column: Primary key column breaking watermark ties
+        """
+        source = await self._table(table)
+        unknown = set(columns or []) | ({watermark_column} if since is not None else set())
+        unknown -= set(source.c.keys())
+        if unknown:
+            raise ValueError(f"Unknown columns for {table}: {', '.join(sorted(unknown))}")
+
+        selected = [source.c[name] for name in columns] if columns else list(source.c)
+        query = select(*selected)
+        keyed = key_column in source.c
+        if since is not None:
+            mark = source.c[watermark_column]
+            if not keyed:
+                query = query.where(mark > since)
+            elif since_key is None:
+                query = query.where(mark >= since)
+            else:
+                query = query.where(or_(mark > since, and_(mark == since, source.c[key_column] > since_key)))
+        if watermark_column in source.c:
+            query = query.order_by(source.c[watermark_column], *([source.c[key_column]] if keyed else []))
+
+        batch_size = batch_size or settings.ANALYTICS_BATCH_SIZE
+        if as_arrow:
+            import pyarrow
+
+        async with self.engine.connect() as conn:
+            result = await conn.stream(query.execution_options(yield_per=batch_size))
+            names = list(result.keys())
+            async for rows in result.partitions(batch_size):
+                frame = pd.DataFrame.from_records(rows, columns=names)
+                yield pyarrow.RecordBatch.from_pandas(frame, preserve_index=False) if as_arrow else frame
+
+    async def read_incremental(
+        self,
+        consumer: str,
+        table: str,
+        columns: Optional[Sequence[str]] = None,
+        watermark_column: str = "updated_at",
+        batch_size: Optional[int] = None,
+        key_column: str = "id"
+    ) -> AsyncIterator[pd.DataFrame]:
+        """
+        Stream rows changed since this consumer's last completed read
+
+        The consumer's (watermark, key) position is kept in Redis and only
+        advanced once the caller has consumed every batch, so an
+        interrupted run is re-read.
+        """
+        key = cache_key("analytics", "watermark", consumer, table)
+        stored = await cache_get(key)
+        since, since_key = decode_watermark(stored), decode_watermark_key(stored)
+        if columns:
+            columns = [*columns, *(name for name in (watermark_column, key_column) if name not in columns)]
+
+        last = None
+        async for frame in self.iter_batches(
+            table, columns, since, watermark_column, batch_size, since_key=since_key, key_column=key_column
+        ):
+            if not frame.empty:
+                last = frame.iloc[-1]
+            yield frame
+
+        if last is not None:
+            position = encode_watermark(last[watermark_column], last.get(key_column))
+            await cache_set(key, position, expire=settings.ANALYTICS_WATERMARK_TTL)
+            logger.info(f"Analytics watermark for {consumer}/{table} advanced to {position['value']}")
+
+
+# Singleton instance
+analytics_reader = AnalyticsReader()
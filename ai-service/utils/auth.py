@@ -0,0 +1,49 @@
+"""
+Caller authentication
+Tokens and keys shared with the Laravel backend
+"""
+
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+from config.settings import settings
+
+
+def _signature(payload: str) -> str:
+    return hmac.new(settings.SERVICE_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def sign_token(customer_id: int, ttl: Optional[int] = None) -> str:
+    """
+    Customer token for direct browser connections (the support WebSocket)
+
+    Laravel issues the same format to a logged-in customer:
+    "{customer_id}.{expires}.{hex HMAC-SHA256 of "{customer_id}.{expires}"}"
+    keyed with SERVICE_SECRET.
+    """
+    expires = int(time.time()) + (ttl or settings.CUSTOMER_TOKEN_TTL)
+    payload = f"{int(customer_id)}.{expires}"
+    return f"{payload}.{_signature(payload)}"
+
+
+def verify_token(token: Optional[str]) -> Optional[int]:
+    """Customer id of a valid, unexpired token (None otherwise, or when no secret is configured)"""
+    if not token or not settings.SERVICE_SECRET:
+        return None
+    try:
+        customer_id, expires, signature = token.split(".")
+        if not hmac.compare_digest(signature, _signature(f"{customer_id}.{expires}")):
+            return None
+        if int(expires) < time.time():
+            return None
+        return int(customer_id)
+    except ValueError:
+        return None
+
+
+def is_service_key(value: Optional[str]) -> bool:
+    """Whether a request carries the backend's SERVICE_SECRET"""
+    return bool(value and settings.SERVICE_SECRET) and hmac.compare_digest(value, settings.SERVICE_SECRET)
+
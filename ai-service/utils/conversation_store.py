@@ -0,0 +1,144 @@
+"""
+Support conversation sessions
+Redis-backed turn history with token-budgeted rolling summaries
+"""
+
+import json
+from typing import Awaitable, Callable, List, Optional, Tuple
+from loguru import logger
+
+from config.settings import settings
+from utils.redis_client import cache_key, get_redis_client, redis_lock
+
+Turn = dict  # {"role": "user" | "assistant", "content": str}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def fit_to_budget(turns: List[Turn], budget: int) -> List[Turn]:
+    """Most recent turns whose combined size fits the token budget"""
+    kept = []
+    used = 0
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn.get("content", ""))
+        if used + cost > budget:
+            break
+        kept.append(turn)
+        used += cost
+    return list(reversed(kept))
+
+
+class ConversationStore:
+    """
+    Append-only conversation turns plus a rolling summary per conversation
+
+    Turns live in a Redis list and the summary in a string key, both
+    refreshed to the session TTL on every write. Once the stored turns
+    exceed the token budget, the oldest ones are folded into the summary
+    and trimmed from the list, so loading a conversation is one round trip
+    of bounded size however long the chat runs.
+    """
+
+    def __init__(self, prefix: str = "support:conversation"):
+        self.prefix = prefix
+
+    def _keys(self, conversation_id: str) -> Tuple[str, str]:
+        base = cache_key(self.prefix, conversation_id)
+        return f"{base}:turns", f"{base}:summary"
+
+    async def load(self, conversation_id: str) -> Tuple[Optional[str], List[Turn]]:
+        """Get (summary, turns) for a conversation"""
+        client = get_redis_client()
+        if not client:
+            return None, []
+        turns_key, summary_key = self._keys(conversation_id)
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(summary_key)
+                pipe.lrange(turns_key, 0, -1)
+                summary, raw_turns = await pipe.execute()
+            return summary.decode() if summary else None, [json.loads(turn) for turn in raw_turns]
+        except Exception as e:
+            logger.error(f"Conversation load error: {str(e)}")
+            return None, []
+
+    async def append(self, conversation_id: str, turns: List[Turn]) -> int:
+        """
+        Append turns to a conversation
+
+        Returns:
+            Number of stored turns after the append (0 if Redis is unavailable)
+        """
+        client = get_redis_client()
+        if not client:
+            return 0
+        turns_key, summary_key = self._keys(conversation_id)
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.rpush(turns_key, *[json.dumps(turn) for turn in turns])
+                pipe.expire(turns_key, settings.SUPPORT_SESSION_TTL)
+                pipe.expire(summary_key, settings.SUPPORT_SESSION_TTL)
+                length, _, _ = await pipe.execute()
+            return length
+        except Exception as e:
+            logger.error(f"Conversation append error: {str(e)}")
+            return 0
+
+    async def compact(
+        self,
+        conversation_id: str,
+        summarize: Callable[[Optional[str], List[Turn]], Awaitable[str]],
+        budget: int
+    ) -> bool:
+        """
+        Fold the oldest turns into the rolling summary when over budget
+
+        Keeps the newest turns that fit in half the budget, so compaction
+        runs once every few turns rather than on every turn. One compaction
+        per conversation runs at a time (across workers); a turn that goes
+        over budget while one is waiting on its summary skips compacting,
+        since two would trim the same turns twice.
+        """
+        # Held past the summary's LLM call, which LLM_TIMEOUT bounds
+        async with redis_lock(f"compact:{conversation_id}", ttl=settings.LLM_TIMEOUT + 10, wait=0) as locked:
+            if not locked:
+                return False
+            return await self._compact(conversation_id, summarize, budget)
+
+    async def _compact(
+        self,
+        conversation_id: str,
+        summarize: Callable[[Optional[str], List[Turn]], Awaitable[str]],
+        budget: int
+    ) -> bool:
+        summary, turns = await self.load(conversation_id)
+        if sum(estimate_tokens(t.get("content", "")) for t in turns) <= budget:
+            return False
+
+        keep = fit_to_budget(turns, budget // 2)
+        folded = turns[:len(turns) - len(keep)]
+        if not folded:
+            return False
+
+        new_summary = await summarize(summary, folded)
+        client = get_redis_client()
+        turns_key, summary_key = self._keys(conversation_id)
+        try:
+            # LTRIM from the left only drops the folded turns, so turns
+            # appended concurrently by another request are preserved
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.set(summary_key, new_summary, ex=settings.SUPPORT_SESSION_TTL)
+                pipe.ltrim(turns_key, len(folded), -1)
+                await pipe.execute()
+            logger.info(f"Compacted {len(folded)} turns of conversation {conversation_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Conversation compaction error: {str(e)}")
+            return False
+
+
+# Singleton instance
+conversation_store = ConversationStore()
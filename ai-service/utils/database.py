@@ -2,60 +2,103 @@
 Database connection utilities
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional
 from config.settings import settings
 from loguru import logger
 
-# Create base class for models
-Base = declarative_base()
+# SQLAlchemy is imported on first use so that importing this module (and
+# main.py) stays cheap; the engine is only built in init_db()
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 
-# Database URL
-DATABASE_URL = f"mysql+pymysql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+_base = None
+
+
+def __getattr__(name: str):
+    # Declarative base for models, built on first access
+    global _base
+    if name == "Base":
+        if _base is None:
+            from sqlalchemy.orm import declarative_base
+            _base = declarative_base()
+        return _base
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Database URL (DATABASE_URL overrides, e.g. sqlite+aiosqlite:///./local.db for tests)
+DATABASE_URL = settings.DATABASE_URL or (
+    f"{settings.DB_DRIVER}://{settings.DB_USER}:{settings.DB_PASSWORD}"
+    f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+)
 
 # Create engine
-engine = None
-SessionLocal = None
+engine: Optional["AsyncEngine"] = None
+SessionLocal: Optional["async_sessionmaker"] = None
 
 
-async def init_db():
-    """Initialize database connection"""
+async def init_db(url: Optional[str] = None):
+    """Initialize database connection pool (connections are opened lazily)"""
     global engine, SessionLocal
-    
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    url = url or DATABASE_URL
     try:
-        engine = create_engine(
-            DATABASE_URL,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-            echo=settings.DEBUG
-        )
-        
-        SessionLocal = sessionmaker(
-            autocommit=False,
+        options = {"echo": settings.DB_ECHO, "pool_pre_ping": True}
+        # SQLite uses a single-connection pool that takes no sizing options
+        if not url.startswith("sqlite"):
+            options.update(
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT,
+                pool_recycle=settings.DB_POOL_RECYCLE
+            )
+        engine = create_async_engine(url, **options)
+
+        SessionLocal = async_sessionmaker(
+            bind=engine,
             autoflush=False,
-            bind=engine
+            expire_on_commit=False
         )
-        
+
         logger.info("Database connection initialized")
     except Exception as e:
         logger.error(f"Database initialization error: {str(e)}")
         raise
 
 
+async def ping_db():
+    """Open a pooled connection (SELECT 1) so the first query does not pay for the connect"""
+    if engine is None:
+        raise RuntimeError("Database is not initialized")
+    from sqlalchemy import text
+
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
 async def close_db():
     """Close database connection"""
     global engine
-    
+
     if engine:
-        engine.dispose()
+        await engine.dispose()
         logger.info("Database connection closed")
 
 
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator["AsyncSession"]:
+    """Get database session (FastAPI dependency)"""
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def pool_status() -> Optional[Dict[str, int]]:
+    """Connection pool usage: configured size, idle, in use and overflow connections"""
+    if engine is None:
+        return None
+    pool = engine.pool
+    status = {}
+    for name, method in (("size", "size"), ("idle", "checkedin"), ("in_use", "checkedout"), ("overflow", "overflow")):
+        if hasattr(pool, method):
+            # QueuePool reports overflow as negative until the base size is in use
+            status[name] = max(getattr(pool, method)(), 0)
+    return status
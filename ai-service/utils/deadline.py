@@ -0,0 +1,181 @@
+"""
+Request deadlines
+How long the current request may still run, shared by every call it makes
+"""
+
+import asyncio
+import json
+import time
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from typing import Iterator, NamedTuple, Optional
+from loguru import logger
+
+from config.settings import settings
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request's deadline passed before (or while) making a call"""
+
+
+class _Budget(NamedTuple):
+    expires_at: float
+    hedge: bool
+
+
+_budget: ContextVar[Optional[_Budget]] = ContextVar("request_budget", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None when it has no deadline"""
+    budget = _budget.get()
+    return None if budget is None else budget.expires_at - time.monotonic()
+
+
+def bound(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    The shorter of a call's own timeout and the time the request has left
+
+    Raises:
+        DeadlineExceeded: when the request has no time left
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+def hedging() -> bool:
+    """Whether the current request may hedge slow LLM calls"""
+    budget = _budget.get()
+    return bool(budget and budget.hedge)
+
+
+@contextmanager
+def deadline(seconds: float, hedge: bool = False) -> Iterator[None]:
+    """
+    Run the enclosed code (and tasks it starts) under a deadline
+
+    A nested deadline can only shorten the one already in force.
+    """
+    expires_at = time.monotonic() + seconds
+    current = _budget.get()
+    if current is not None:
+        expires_at = min(expires_at, current.expires_at)
+    token = _budget.set(_Budget(expires_at, hedge))
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+def endpoint_timeout(endpoint: str, requested: Optional[str] = None) -> float:
+    """Deadline for an endpoint: the caller's header value if valid, else the endpoint default"""
+    timeout = settings.REQUEST_DEADLINES.get(endpoint, settings.REQUEST_DEADLINE_DEFAULT)
+    if requested:
+        try:
+            value = float(requested)
+            if value > 0:
+                timeout = value
+        except ValueError:
+            pass
+    return min(timeout, settings.REQUEST_DEADLINE_MAX)
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware giving each /agents/* request a deadline
+
+    The deadline comes from the REQUEST_DEADLINE_HEADER header (seconds)
+    or the endpoint's default, and is visible to LLM, OCR and Laravel calls
+    through this module. The request is cancelled when the deadline passes
+    (504 if nothing was sent yet) or when the client disconnects, so no
+    work continues for a caller that has already given up.
+    """
+
+    def __init__(self, app, prefix: str = "/agents/"):
+        self.app = app
+        self.prefix = prefix
+
+    def _header(self, scope) -> Optional[str]:
+        wanted = settings.REQUEST_DEADLINE_HEADER.lower()
+        for name, value in scope.get("headers", []):
+            if name.decode("latin-1").lower() == wanted:
+                return value.decode("latin-1")
+        return None
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefix) or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = path[len(self.prefix):].split("/", 1)[0]
+        timeout = endpoint_timeout(endpoint, self._header(scope))
+        hedge = settings.LLM_HEDGE_ENABLED and endpoint in settings.LLM_HEDGE_ENDPOINTS
+        body_read = asyncio.Event()
+        disconnected = asyncio.Event()
+        response = {"started": False, "finished": False}
+
+        async def receive_wrapper():
+            # Once the body is read, the only message left is the disconnect,
+            # which the watcher below is already waiting for
+            if body_read.is_set():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_read.set()
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response["finished"] = True
+            await send(message)
+
+        async def watch_disconnect():
+            await body_read.wait()
+            if (await receive())["type"] == "http.disconnect":
+                disconnected.set()
+
+        with deadline(timeout, hedge=hedge):
+            handler = asyncio.create_task(self.app(scope, receive_wrapper, send_wrapper))
+        watcher = asyncio.create_task(watch_disconnect())
+        left = asyncio.create_task(disconnected.wait())
+        try:
+            await asyncio.wait({handler, left}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if handler.done() or response["finished"]:
+                # Finished, or only background work after the response is left
+                await handler
+                return
+
+            handler.cancel()
+            with suppress(asyncio.CancelledError):
+                await handler
+            if disconnected.is_set():
+                logger.info(f"Client disconnected, cancelled {path}")
+                return
+            logger.warning(f"Deadline of {timeout:.1f}s exceeded for {path}")
+            if not response["started"]:
+                await self._timeout(send)
+        finally:
+            watcher.cancel()
+            left.cancel()
+
+    async def _timeout(self, send):
+        body = json.dumps({"success": False, "error": "Request deadline exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,150 @@
+"""
+Vectorized geodesic distance utilities
+Batch Haversine computations over arrays of coordinates
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+EARTH_RADIUS_KM = 6371.0  # Same radius as helpers.calculate_distance
+
+# Reference coordinates (lat, lon) for ports on our shipping lanes
+PORTS: Dict[str, Tuple[float, float]] = {
+    "Yokohama": (35.4437, 139.6380),
+    "Tokyo": (35.6175, 139.7780),
+    "Nagoya": (35.0833, 136.8833),
+    "Osaka": (34.6537, 135.4300),
+    "Kobe": (34.6901, 135.1955),
+    "Southampton": (50.8998, -1.4044),
+    "Liverpool": (53.4084, -2.9916),
+    "Jebel Ali": (25.0112, 55.0610),
+    "Dubai": (25.2697, 55.2747),
+    "Baltimore": (39.2640, -76.5800),
+    "Mombasa": (-4.0435, 39.6682),
+    "Dar es Salaam": (-6.8235, 39.2695),
+    "Port Bell": (0.2890, 32.6520),
+}
+
+# Ports a shipment passes through, by country (lowercase, as in quotes)
+COUNTRY_PORTS: Dict[str, List[str]] = {
+    "japan": ["Yokohama", "Tokyo", "Nagoya", "Osaka", "Kobe"],
+    "uk": ["Southampton", "Liverpool"],
+    "uae": ["Jebel Ali", "Dubai"],
+    "usa": ["Baltimore"],
+    "uganda": ["Port Bell"],
+}
+
+# East African transshipment ports on the way inland to Uganda
+TRANSIT_PORTS: List[str] = ["Mombasa", "Dar es Salaam"]
+
+Coordinates = Union[Sequence[Tuple[float, float]], np.ndarray]
+
+
+def as_coordinates(points: Coordinates) -> np.ndarray:
+    """
+    Convert coordinates to a float64 array of shape (n, 2)
+
+    Args:
+        points: Sequence of (lat, lon) pairs in degrees, or a single pair
+
+    Returns:
+        Array of (lat, lon) rows in degrees
+    """
+    arr = np.asarray(points, dtype=np.float64)
+    if arr.ndim == 1:
+        arr = arr.reshape(1, -1)
+    if arr.ndim != 2 or arr.shape[1] != 2:
+        raise ValueError(f"Expected (lat, lon) pairs, got array of shape {arr.shape}")
+    return arr
+
+
+def _haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Haversine distance on radian arrays (broadcasting)"""
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    # arcsin form is equivalent to 2*atan2(sqrt(a), sqrt(1-a)); clip guards rounding above 1
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distances_from(origin: Tuple[float, float], points: Coordinates) -> np.ndarray:
+    """
+    Calculate distances from one coordinate to many
+
+    Returns:
+        Array of shape (n,) with distances in kilometers
+    """
+    lat0, lon0 = np.radians(as_coordinates(origin)[0])
+    pts = np.radians(as_coordinates(points))
+    return _haversine(lat0, lon0, pts[:, 0], pts[:, 1])
+
+
+def pairwise_distances(a: Coordinates, b: Optional[Coordinates] = None) -> np.ndarray:
+    """
+    Calculate the full distance matrix between two sets of coordinates
+
+    Args:
+        a: n coordinates
+        b: m coordinates (defaults to a, giving a symmetric matrix)
+
+    Returns:
+        Array of shape (n, m) with distances in kilometers
+    """
+    pa = np.radians(as_coordinates(a))
+    pb = pa if b is None else np.radians(as_coordinates(b))
+    return _haversine(
+        pa[:, 0, np.newaxis], pa[:, 1, np.newaxis],
+        pb[np.newaxis, :, 0], pb[np.newaxis, :, 1]
+    )
+
+
+def nearest_k(
+    points: Coordinates,
+    candidates: Coordinates,
+    k: int = 1,
+    chunk_size: int = 4096
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the k nearest candidates for each point
+
+    Points are processed in chunks so memory stays bounded at
+    chunk_size x len(candidates) regardless of how many points are passed.
+
+    Returns:
+        (indices, distances), both of shape (n, k), ordered nearest first
+    """
+    pts = as_coordinates(points)
+    cands = as_coordinates(candidates)
+    if not 1 <= k <= len(cands):
+        raise ValueError(f"k must be between 1 and {len(cands)}")
+
+    indices = np.empty((len(pts), k), dtype=np.intp)
+    distances = np.empty((len(pts), k), dtype=np.float64)
+
+    for start in range(0, len(pts), chunk_size):
+        matrix = pairwise_distances(pts[start:start + chunk_size], cands)
+        if k < len(cands):
+            part = np.argpartition(matrix, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(k), (len(matrix), k))
+        part_dist = np.take_along_axis(matrix, part, axis=1)
+        order = np.argsort(part_dist, axis=1)
+        indices[start:start + chunk_size] = np.take_along_axis(part, order, axis=1)
+        distances[start:start + chunk_size] = np.take_along_axis(part_dist, order, axis=1)
+
+    return indices, distances
+
+
+def nearest_ports(points: Coordinates, k: int = 1) -> list:
+    """
+    Find the k nearest known ports for each point
+
+    Returns:
+        One list per point of (port_name, distance_km) tuples
+    """
+    names = list(PORTS)
+    indices, distances = nearest_k(points, list(PORTS.values()), k=k)
+    return [
+        [(names[i], float(d)) for i, d in zip(row_idx, row_dist)]
+        for row_idx, row_dist in zip(indices, distances)
+    ]
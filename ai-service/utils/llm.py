@@ -0,0 +1,317 @@
+"""
+Guarded access to the Mistral chat models
+Per-model circuit breakers so a brownout degrades agents to their fallbacks
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+from loguru import logger
+
+from config.settings import settings
+from utils import deadline
+from utils.llm_backends import create_chat_model
+from utils.metrics import record_llm_call
+from utils.tracing import CLIENT, span, start_span
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose breaker is open"""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"LLM circuit for {model} is open (retry in {retry_after:.0f}s)")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Error-rate and latency breaker for one model
+
+    Outcomes of recent calls are kept in a sliding window. Once it holds
+    LLM_BREAKER_MIN_CALLS calls, the breaker opens when the error rate or
+    the p95 latency crosses its threshold. While open every call is refused
+    at once; after LLM_BREAKER_COOLDOWN seconds up to LLM_BREAKER_PROBES
+    calls are let through, and the breaker closes if they are fast and
+    successful or opens again if not.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._probes = 0
+        self._calls: Deque[Tuple[float, bool, float]] = deque(maxlen=settings.LLM_BREAKER_WINDOW)
+
+    def allow(self) -> Tuple[bool, bool]:
+        """
+        Ask to make a call
+
+        Returns:
+            (allowed, is_probe)
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < settings.LLM_BREAKER_COOLDOWN:
+                return False, False
+            self.state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"LLM circuit for {self.model} half-open, probing")
+        if self.state == HALF_OPEN:
+            if self._probes >= settings.LLM_BREAKER_PROBES:
+                return False, False
+            self._probes += 1
+            return True, True
+        return True, False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + settings.LLM_BREAKER_COOLDOWN - time.monotonic())
+
+    def record(self, ok: bool, latency: float, probe: bool = False):
+        """Record the outcome of an allowed call"""
+        slow = latency >= settings.LLM_BREAKER_SLOW_SECONDS
+        if probe:
+            self._probes = max(0, self._probes - 1)
+            if self.state == HALF_OPEN:
+                if ok and not slow:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"LLM circuit for {self.model} closed")
+                else:
+                    self._open("probe failed" if not ok else f"probe took {latency:.1f}s")
+            return
+
+        self._calls.append((time.monotonic(), ok, latency))
+        if self.state != CLOSED:
+            return
+        recent = self._recent()
+        if len(recent) < settings.LLM_BREAKER_MIN_CALLS:
+            return
+        error_rate = sum(1 for _, success, _ in recent if not success) / len(recent)
+        latencies = sorted(call[2] for call in recent)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        if error_rate >= settings.LLM_BREAKER_ERROR_RATE:
+            self._open(f"error rate {error_rate:.0%}")
+        elif p95 >= settings.LLM_BREAKER_SLOW_SECONDS:
+            self._open(f"p95 latency {p95:.1f}s")
+
+    def _recent(self):
+        now = time.monotonic()
+        return [call for call in self._calls if now - call[0] <= settings.LLM_BREAKER_WINDOW_SECONDS]
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        """Latency percentile of recent successful calls (None until there are enough)"""
+        latencies = sorted(latency for _, ok, latency in self._recent() if ok)
+        if len(latencies) < settings.LLM_BREAKER_MIN_CALLS:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+    def release(self, probe: bool):
+        """Give back a probe slot for a call that was cancelled before finishing"""
+        if probe:
+            self._probes = max(0, self._probes - 1)
+
+    def _open(self, reason: str):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._calls.clear()
+        logger.warning(f"LLM circuit for {self.model} opened: {reason}")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    """Shared breaker for a model (one per worker process)"""
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(model)
+    return breaker
+
+
+def breaker_status() -> Dict[str, str]:
+    """State of every model's breaker, for the health endpoint"""
+    return {model: breaker.state for model, breaker in _breakers.items()}
+
+
+class GuardedLLM:
+    """
+    Chat model wrapper that goes through the model's circuit breaker
+
+    Exposes the async half of the LangChain chat interface (ainvoke,
+    astream). Calls are bounded by LLM_TIMEOUT, and a timeout counts as a
+    failure. When the breaker is open CircuitOpenError is raised at once,
+    so agents drop to their deterministic fallbacks without waiting.
+
+    Calls are also bounded by the request's deadline (utils.deadline);
+    running out of request time raises DeadlineExceeded. It is only held
+    against the model when the call had already waited past
+    LLM_BREAKER_SLOW_SECONDS, so tight deadlines alone never open the
+    breaker but a model that stalls every caller still does. Requests that
+    allow hedging send a second, identical call when the first is slower
+    than the model's recent p90 and take whichever answers first.
+
+    The chat model itself comes from LLM_BACKEND (utils.llm_backends), so
+    the same agents run against Mistral, the offline fake or a replay.
+    """
+
+    def __init__(self, model: Optional[str] = None, temperature: float = 0.7, chat_model=None):
+        self.model = model or settings.MISTRAL_MODEL
+        self.temperature = temperature
+        self._chat_model = chat_model
+
+    def __str__(self) -> str:
+        backend = settings.LLM_BACKEND if self._chat_model is None else type(self._chat_model).__name__
+        return f"{self.model} ({backend})"
+
+    @property
+    def chat_model(self):
+        if self._chat_model is None:
+            self._chat_model = create_chat_model(self.model, self.temperature)
+        return self._chat_model
+
+    async def warm(self):
+        """Open a connection to the Mistral API without spending tokens (GET /models)"""
+        client = getattr(self.chat_model, "async_client", None)
+        if client is not None:
+            response = await client.get("models")
+            response.raise_for_status()
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return get_breaker(self.model)
+
+    def _admit(self) -> bool:
+        allowed, probe = self.breaker.allow()
+        if not allowed:
+            record_llm_call(self.model, "circuit_open")
+            raise CircuitOpenError(self.model, self.breaker.retry_after())
+        return probe
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Any:
+        """Invoke the model through the breaker"""
+        with span("llm.invoke", CLIENT, **{"llm.model": self.model}) as current:
+            response = await self._invoke(messages, kwargs)
+            usage = getattr(response, "usage_metadata", None) or {}
+            current.set("llm.input_tokens", usage.get("input_tokens", 0))
+            current.set("llm.output_tokens", usage.get("output_tokens", 0))
+            return response
+
+    async def _invoke(self, messages: Any, kwargs: dict) -> Any:
+        timeout = deadline.bound(settings.LLM_TIMEOUT)
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            call = self._hedged(messages, kwargs) if deadline.hedging() and not probe else self.chat_model.ainvoke(messages, **kwargs)
+            response = await asyncio.wait_for(call, timeout=timeout)
+        except asyncio.CancelledError:
+            self.breaker.release(probe)
+            record_llm_call(self.model, "cancelled")
+            raise
+        except asyncio.TimeoutError:
+            if timeout < settings.LLM_TIMEOUT:
+                self._cut_short(started, probe)
+                raise deadline.DeadlineExceeded(f"Request deadline reached waiting for {self.model}")
+            self._finished(False, started, probe, "timeout")
+            raise
+        except Exception:
+            self._finished(False, started, probe, "error")
+            raise
+        self._finished(True, started, probe, "success", response)
+        return response
+
+    def _finished(self, ok: bool, started: float, probe: bool, outcome: str, response=None, latency: Optional[float] = None):
+        latency = time.monotonic() - started if latency is None else latency
+        self.breaker.record(ok, latency, probe)
+        record_llm_call(self.model, outcome, latency, response)
+
+    def _cut_short(self, started: float, probe: bool):
+        """Account for a call the request deadline stopped before the model answered"""
+        waited = time.monotonic() - started
+        if waited >= settings.LLM_BREAKER_SLOW_SECONDS:
+            # Waited long enough to call the model slow, whatever the deadline
+            self._finished(False, started, probe, "deadline", latency=waited)
+        else:
+            self.breaker.release(probe)
+            record_llm_call(self.model, "deadline")
+
+    async def _hedged(self, messages: Any, kwargs: dict) -> Any:
+        """First successful reply of the call and, once it runs past the p90, a duplicate"""
+        delay = max(settings.LLM_HEDGE_MIN_DELAY, self.breaker.latency_percentile(0.9) or settings.LLM_HEDGE_DELAY)
+        tasks = {asyncio.create_task(self.chat_model.ainvoke(messages, **kwargs))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                logger.debug(f"Hedging {self.model} call after {delay:.2f}s")
+                record_llm_call(self.model, "hedge")
+                tasks.add(asyncio.create_task(self.chat_model.ainvoke(messages, **kwargs)))
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    raise next(iter(done)).exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, messages: Any, **kwargs) -> AsyncIterator[Any]:
+        """
+        Stream the model's reply through the breaker
+
+        LLM_TIMEOUT bounds the wait for the first chunk, and that wait is
+        the latency the breaker sees; the outcome is recorded once the
+        stream ends. The request deadline bounds the whole stream.
+        """
+        first_timeout = deadline.bound(settings.LLM_TIMEOUT)
+        probe = self._admit()
+        started = time.monotonic()
+        # Not a with-block span: the generator may resume in another context
+        current = start_span("llm.stream", CLIENT, **{"llm.model": self.model})
+        latency = None
+        usage = None
+        stream = self.chat_model.astream(messages, **kwargs).__aiter__()
+        try:
+            while True:
+                try:
+                    if latency is None:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=first_timeout)
+                        latency = time.monotonic() - started
+                    else:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=deadline.bound())
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    if latency is None and first_timeout >= settings.LLM_TIMEOUT:
+                        raise
+                    raise deadline.DeadlineExceeded(f"Request deadline reached streaming from {self.model}")
+                if getattr(chunk, "usage_metadata", None):
+                    usage = chunk
+                yield chunk
+        except deadline.DeadlineExceeded as e:
+            if latency is None:
+                self._cut_short(started, probe)
+            else:
+                self.breaker.release(probe)
+                record_llm_call(self.model, "deadline")
+            current.fail(e)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.release(probe)
+            record_llm_call(self.model, "cancelled")
+            raise
+        except Exception as e:
+            self._finished(False, started, probe, "error")
+            current.fail(e)
+            raise
+        finally:
+            current.end()
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+        self._finished(True, started, probe, "success", usage, latency)
@@ -0,0 +1,327 @@
+"""
+Chat model backends behind GuardedLLM
+Mistral in production; a deterministic fake and record/replay for offline tests and load tests
+
+Every agent talks to its model through GuardedLLM, which builds its chat
+model here from LLM_BACKEND:
+
+    mistral  ChatMistralAI (the default)
+    fake     canned answers shaped like the prompt asks, no network
+    record   Mistral, appending every answer to LLM_RECORDINGS_PATH
+    replay   answers from LLM_RECORDINGS_PATH, no network
+
+A backend only needs the async half of the LangChain chat interface:
+ainvoke(messages) returning an object with .content (and optionally
+.usage_metadata) and astream(messages) yielding such chunks.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from loguru import logger
+
+from config.settings import settings
+
+
+class FakeLLMError(Exception):
+    """Injected failure from the fake backend (LLM_FAKE_ERROR_RATE)"""
+
+
+class ReplayMissError(Exception):
+    """The replay backend has no recording for a prompt"""
+
+
+class Message:
+    """Reply or stream chunk with the attributes callers read from LangChain's AIMessage"""
+
+    def __init__(self, content: str, usage_metadata: Optional[dict] = None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+    def __repr__(self):
+        return f"Message({self.content!r})"
+
+
+def normalize_messages(messages: Any) -> List[Dict[str, str]]:
+    """A prompt string, dict/tuple messages or LangChain messages as [{"role", "content"}]"""
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    normalized = []
+    for message in messages:
+        if isinstance(message, dict):
+            role, content = message.get("role", "user"), message.get("content", "")
+        elif isinstance(message, (tuple, list)):
+            role, content = message
+        else:
+            role, content = getattr(message, "type", "user"), getattr(message, "content", "")
+        normalized.append({"role": str(role), "content": str(content)})
+    return normalized
+
+
+def prompt_key(model: str, messages: Any) -> str:
+    """Recording key: sha256 of the model and the normalized messages"""
+    payload = json.dumps({"model": model, "messages": normalize_messages(messages)}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _usage(messages: List[Dict[str, str]], content: str) -> dict:
+    # Rough token counts (~4 characters a token), enough for the token metrics
+    input_tokens = sum(len(message["content"]) for message in messages) // 4
+    output_tokens = max(1, len(content) // 4)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+def _chunks(content: str) -> List[str]:
+    return re.findall(r"\S+\s*|\s+", content) or [""]
+
+
+# What the fake answers for a field, by field name
+_LIST_FIELDS = ("routes", "factors", "actions", "steps")
+_RISK_LEVELS = ("Low", "Medium", "High")
+
+
+def _fake_value(field: str, rng: random.Random, hint: str = "") -> Any:
+    name = field.lower()
+    options = re.search(r"one of:\s*([^)\u2014]+)", hint)
+    if options:
+        return rng.choice([option.strip() for option in options.group(1).split(",") if option.strip()])
+    if "confidence" in name or "score" in name:
+        return round(rng.uniform(0.6, 0.95), 2)
+    example = re.search(r'e\.g\.\s*"([^"]+)"', hint)
+    if example:
+        return example.group(1)
+    if name.endswith("days"):
+        return rng.randint(0, 10) if "delay" in name else rng.randint(25, 50)
+    if name == "risk_level":
+        return rng.choice(_RISK_LEVELS)
+    if name == "valid":
+        return True
+    if name == "warnings":
+        return []
+    if name.endswith(_LIST_FIELDS):
+        return [f"{field.replace('_', ' ')} {i + 1}" for i in range(rng.randint(1, 3))]
+    if name == "year":
+        return str(rng.randint(2010, 2022))
+    if "engine" in name and "size" in name:
+        return str(rng.choice((1500, 1800, 2000, 2500, 3000)))
+    if "range" in name:
+        low = rng.randint(20, 35) * 100
+        return f"${low:,} - ${low + 1000:,}"
+    return f"{field.replace('_', ' ')} (offline answer)"
+
+
+class FakeChatModel:
+    """
+    Deterministic offline stand-in for the chat model
+
+    The reply depends only on the prompt, so tests can assert on it. It is
+    shaped like the prompt asks: a bare number for "Respond with ONLY a
+    single number", "KEY: value" lines for "Format your response as:",
+    a JSON object for "Format as JSON with keys: ..." or a list of
+    "- field" bullets, the first example for prompts that show one, and a
+    sentence otherwise. Latency (lognormal around LLM_FAKE_LATENCY) and
+    failures (LLM_FAKE_ERROR_RATE) are drawn from their own seeded stream,
+    so a load test sees realistic timing without touching the answers.
+    """
+
+    def __init__(self, model: str = "fake", latency: Optional[float] = None, latency_sigma: Optional[float] = None,
+                 error_rate: Optional[float] = None, seed: Optional[int] = None):
+        self.model = model
+        self.latency = settings.LLM_FAKE_LATENCY if latency is None else latency
+        self.latency_sigma = settings.LLM_FAKE_LATENCY_SIGMA if latency_sigma is None else latency_sigma
+        self.error_rate = settings.LLM_FAKE_ERROR_RATE if error_rate is None else error_rate
+        self._random = random.Random(settings.LLM_FAKE_SEED if seed is None else seed)
+
+    def respond(self, messages: Any) -> str:
+        """The reply to a prompt (without latency or errors)"""
+        normalized = normalize_messages(messages)
+        prompt = "\n".join(message["content"] for message in normalized)
+        rng = random.Random(prompt_key(self.model, normalized))
+
+        if re.search(r"ONLY a single number", prompt, re.IGNORECASE):
+            return str(rng.randint(5, 40) * 100)
+
+        lines = re.search(r"Format your response as:\s*\n((?:\s*[A-Z_]+:.*\n?)+)", prompt)
+        if lines:
+            return "\n".join(self._line(key, hint, rng) for key, hint in re.findall(r"([A-Z_]+):\s*(.*)", lines.group(1)))
+
+        keys = re.search(r"JSON with keys:\s*(.+)", prompt)
+        if keys:
+            fields = [field.strip(" .") for field in keys.group(1).split(",")]
+            return json.dumps({field: _fake_value(field, rng) for field in fields if field})
+
+        if "JSON" in prompt:
+            example = re.search(r"return:\s*(\{.*?\})", prompt)
+            if example:
+                return example.group(1)
+            fields = re.findall(r"^\s*-\s*(\w+)(.*)$", prompt, re.MULTILINE)
+            if fields:
+                return json.dumps({field: _fake_value(field, rng, hint) for field, hint in fields})
+
+        return f"Thanks for your question. This is an offline answer ({rng.randint(1000, 9999)})."
+
+    def _line(self, key: str, hint: str, rng: random.Random) -> str:
+        if "percent" in hint:
+            return f"{key}: {rng.randint(-10, 20)}%"
+        if "score" in hint:
+            return f"{key}: {rng.uniform(0.6, 0.95):.2f}"
+        return f"{key}: Offline estimate based on typical conditions for this route."
+
+    async def _delay(self):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency * self._random.lognormvariate(0, self.latency_sigma))
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            raise FakeLLMError("Injected fake LLM failure")
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Message:
+        await self._delay()
+        content = self.respond(messages)
+        return Message(content, _usage(normalize_messages(messages), content))
+
+    async def astream(self, messages: Any, **kwargs) -> AsyncIterator[Message]:
+        await self._delay()
+        content = self.respond(messages)
+        for piece in _chunks(content):
+            yield Message(piece)
+        yield Message("", _usage(normalize_messages(messages), content))
+
+
+class Recordings:
+    """Recorded replies in a JSON-lines file, keyed by prompt_key"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.LLM_RECORDINGS_PATH
+        self._entries: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, dict]:
+        if self._entries is None:
+            entries = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            entries[entry["key"]] = entry
+            self._entries = entries
+            logger.debug("Loaded {} LLM recordings from {}", len(entries), self.path)
+        return self._entries
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._load().get(key)
+
+    def add(self, key: str, model: str, messages: Any, content: str, usage: Optional[dict]):
+        entry = {"key": key, "model": model, "messages": normalize_messages(messages), "content": content, "usage": usage}
+        with self._lock:
+            self._load()[key] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # One line per write, so workers recording at once do not interleave
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+_recordings: Dict[str, Recordings] = {}
+
+
+def get_recordings(path: Optional[str] = None) -> Recordings:
+    """Shared recordings for a file (one per worker process, loaded on first use)"""
+    path = path or settings.LLM_RECORDINGS_PATH
+    recordings = _recordings.get(path)
+    if recordings is None:
+        recordings = _recordings[path] = Recordings(path)
+    return recordings
+
+
+class RecordingChatModel:
+    """Passes calls to the real model and records each reply"""
+
+    def __init__(self, inner, model: str, recordings: Optional[Recordings] = None):
+        self.inner = inner
+        self.model = model
+        self.recordings = recordings or get_recordings()
+
+    @property
+    def async_client(self):
+        return getattr(self.inner, "async_client", None)
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Any:
+        response = await self.inner.ainvoke(messages, **kwargs)
+        self.recordings.add(prompt_key(self.model, messages), self.model, messages,
+                            response.content, getattr(response, "usage_metadata", None))
+        return response
+
+    async def astream(self, messages: Any, **kwargs) -> AsyncIterator[Any]:
+        parts = []
+        usage = None
+        async for chunk in self.inner.astream(messages, **kwargs):
+            parts.append(chunk.content)
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+        self.recordings.add(prompt_key(self.model, messages), self.model, messages, "".join(parts), usage)
+
+
+class ReplayChatModel:
+    """
+    Serves recorded replies without a network
+
+    A prompt that was never recorded raises ReplayMissError (which the
+    agents treat like any model failure), or with LLM_REPLAY_FALLBACK gets
+    the fake backend's answer. Prompts that embed the current date (quote
+    pricing, delay prediction) only replay on the day they were recorded.
+    """
+
+    def __init__(self, model: str, recordings: Optional[Recordings] = None, fallback: Optional[bool] = None):
+        self.model = model
+        self.recordings = recordings or get_recordings()
+        use_fallback = settings.LLM_REPLAY_FALLBACK if fallback is None else fallback
+        self.fallback = FakeChatModel(model, latency=0, error_rate=0) if use_fallback else None
+
+    def _lookup(self, messages: Any) -> Optional[dict]:
+        entry = self.recordings.get(prompt_key(self.model, messages))
+        if entry is None and self.fallback is None:
+            raise ReplayMissError(f"No recording for this {self.model} prompt in {self.recordings.path}")
+        return entry
+
+    async def ainvoke(self, messages: Any, **kwargs) -> Any:
+        entry = self._lookup(messages)
+        if entry is None:
+            return await self.fallback.ainvoke(messages)
+        return Message(entry["content"], entry.get("usage"))
+
+    async def astream(self, messages: Any, **kwargs) -> AsyncIterator[Any]:
+        entry = self._lookup(messages)
+        if entry is None:
+            async for chunk in self.fallback.astream(messages):
+                yield chunk
+            return
+        for piece in _chunks(entry["content"]):
+            yield Message(piece)
+        yield Message("", entry.get("usage"))
+
+
+def _mistral(model: str, temperature: float):
+    # Imported here: langchain_mistralai costs ~0.25s at startup
+    from langchain_mistralai import ChatMistralAI
+    return ChatMistralAI(model=model, temperature=temperature, mistral_api_key=settings.MISTRAL_API_KEY)
+
+
+BACKENDS: Dict[str, Callable[[str, float], Any]] = {
+    "mistral": _mistral,
+    "fake": lambda model, temperature: FakeChatModel(model),
+    "record": lambda model, temperature: RecordingChatModel(_mistral(model, temperature), model),
+    "replay": lambda model, temperature: ReplayChatModel(model),
+}
+
+
+def create_chat_model(model: str, temperature: float, backend: Optional[str] = None):
+    """Chat model for LLM_BACKEND (or the given backend)"""
+    name = backend or settings.LLM_BACKEND
+    factory = BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown LLM_BACKEND {name!r} (expected one of {', '.join(BACKENDS)})")
+    return factory(model, temperature)
@@ -1,38 +1,135 @@
 """
 Logging configuration
+Queued (non-blocking) sinks, optional JSON lines, per-module levels and hot-path throttling
 """
 
 from loguru import logger
 from config.settings import settings
+import json
 import sys
+import time
+from typing import Dict, Optional
+
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+COLOR_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+
+
+def _json_format(record) -> str:
+    """One compact JSON object per line"""
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "module": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    extra = {key: value for key, value in record["extra"].items() if not key.startswith("_")}
+    if extra:
+        entry["extra"] = extra
+    if record["exception"]:
+        entry["exception"] = repr(record["exception"].value)
+    record["extra"]["_json"] = json.dumps(entry, default=str)
+    return "{extra[_json]}\n"
+
+
+def _module_filter(levels: Dict[str, str], default: str):
+    """
+    Record filter applying the most specific LOG_LEVELS entry for the module
+
+    e.g. {"agents.document_agent": "WARNING", "tools": "DEBUG"}
+    """
+    default_no = logger.level(default.upper()).no
+    table = sorted(
+        ((prefix, logger.level(level.upper()).no) for prefix, level in levels.items()),
+        key=lambda item: -len(item[0])
+    )
+
+    def accept(record) -> bool:
+        name = record["name"] or ""
+        for prefix, level_no in table:
+            if name == prefix or name.startswith(prefix + "."):
+                return record["level"].no >= level_no
+        return record["level"].no >= default_no
+
+    return accept
 
 
 def setup_logger():
-    """Configure logger"""
-    
+    """
+    Configure logger
+
+    Sinks are queued (LOG_ENQUEUE), so a log call only formats the record
+    and hands it to a background writer; file writes, rotation and
+    compression never run on the request path.
+    """
+
     # Remove default handler
     logger.remove()
-    
+
+    levels = {prefix: level.upper() for prefix, level in settings.LOG_LEVELS.items()}
+    # Handlers must let through the most verbose module level; the filter does the rest
+    floor = min([logger.level(settings.LOG_LEVEL.upper()).no, *(logger.level(level).no for level in levels.values())])
+    accept = _module_filter(levels, settings.LOG_LEVEL)
+
     # Console handler
     logger.add(
         sys.stdout,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level=settings.LOG_LEVEL,
-        colorize=True
+        format=_json_format if settings.LOG_JSON else COLOR_FORMAT,
+        level=floor,
+        filter=accept,
+        colorize=not settings.LOG_JSON,
+        enqueue=settings.LOG_ENQUEUE
     )
-    
+
     # File handler
-    logger.add(
-        settings.LOG_FILE,
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level=settings.LOG_LEVEL,
-        rotation="10 MB",
-        retention="30 days",
-        compression="zip"
-    )
-    
+    if settings.LOG_FILE:
+        logger.add(
+            settings.LOG_FILE,
+            format=_json_format if settings.LOG_JSON else TEXT_FORMAT,
+            level=floor,
+            filter=accept,
+            rotation="10 MB",
+            retention="30 days",
+            compression=settings.LOG_FILE_COMPRESSION or None,
+            enqueue=settings.LOG_ENQUEUE
+        )
+
     return logger
 
 
-# Initialize logger
-setup_logger()
+class _Silent:
+    """Logger stand-in that drops everything (returned for suppressed hot-path logs)"""
+
+    def __getattr__(self, name):
+        return self._drop
+
+    def _drop(self, *args, **kwargs):
+        return None
+
+
+_silent = _Silent()
+_last_logged: Dict[str, float] = {}
+_suppressed: Dict[str, int] = {}
+
+
+def throttled(key: str, interval: Optional[float] = None):
+    """
+    Logger for at most one message per `key` every `interval` seconds
+
+    Usage: throttled("admission.shed").warning("Shedding {}", path). Dropped
+    messages are counted, and the next one ends with "(N similar suppressed)"
+    and carries the count as extra["suppressed"].
+    """
+    now = time.monotonic()
+    interval = settings.LOG_THROTTLE_SECONDS if interval is None else interval
+    if now - _last_logged.get(key, float("-inf")) < interval:
+        _suppressed[key] = _suppressed.get(key, 0) + 1
+        return _silent
+    _last_logged[key] = now
+    dropped = _suppressed.pop(key, 0)
+    if not dropped:
+        return logger
+    return logger.bind(suppressed=dropped).patch(
+        lambda record: record.update(message=f"{record['message']} ({dropped} similar suppressed)")
+    )
@@ -0,0 +1,158 @@
+"""
+Prometheus metrics
+Request, agent-stage, OCR, LLM, cache and event-loop instrumentation served at /metrics
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+import time
+from typing import Callable, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from config.settings import settings
+from utils.logger import throttled
+
+# Seconds; LLM-backed endpoints run from ~0.5s to the 55s deadline
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests", ["endpoint", "method", "status"]
+)
+http_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["endpoint", "method"], buckets=LATENCY_BUCKETS
+)
+node_latency = Histogram(
+    "agent_node_duration_seconds", "Duration of one agent graph node or step", ["graph", "node"], buckets=LATENCY_BUCKETS
+)
+ocr_page_latency = Histogram(
+    "ocr_page_duration_seconds", "Tesseract time per page or image", ["source"], buckets=LATENCY_BUCKETS
+)
+llm_requests = Counter(
+    "llm_requests_total", "LLM calls by outcome", ["model", "outcome"]
+)
+llm_latency = Histogram(
+    "llm_request_duration_seconds", "LLM call latency (to first chunk when streaming)", ["model"], buckets=LATENCY_BUCKETS
+)
+llm_tokens = Counter(
+    "llm_tokens_total", "LLM tokens consumed", ["model", "direction"]
+)
+agent_fallbacks = Counter(
+    "agent_fallbacks_total", "Answers served by an agent's deterministic fallback", ["agent"]
+)
+cache_requests = Counter(
+    "cache_requests_total", "Cache lookups by result", ["cache", "result"]
+)
+# multiprocess_mode says how gauges combine across gunicorn workers (ignored with one process)
+agent_active = Gauge(
+    "agent_requests_active", "Requests an agent is running", ["agent"], multiprocess_mode="livesum"
+)
+agent_queued = Gauge(
+    "agent_requests_queued", "Requests waiting for an agent slot", ["agent"], multiprocess_mode="livesum"
+)
+admission_rejections = Counter(
+    "admission_rejections_total", "Requests rejected by admission control", ["agent", "reason"]
+)
+loop_lag = Gauge(
+    "event_loop_lag_seconds", "How late the last event-loop probe woke up", multiprocess_mode="livemax"
+)
+loop_lag_histogram = Histogram(
+    "event_loop_lag_distribution_seconds", "Event-loop probe lateness",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+
+def render() -> tuple:
+    """
+    (body, content type) for the /metrics endpoint
+
+    Under gunicorn (PROMETHEUS_MULTIPROC_DIR set by gunicorn.conf.py) every
+    worker writes its samples to that directory and whichever worker serves
+    the scrape reports the sum over all of them.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def record_llm_call(model: str, outcome: str, latency: Optional[float] = None, response=None):
+    """Count one LLM call and, when the response reports usage, its tokens"""
+    llm_requests.labels(model, outcome).inc()
+    if latency is not None:
+        llm_latency.labels(model).observe(latency)
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        llm_tokens.labels(model, "in").inc(usage.get("input_tokens", 0))
+        llm_tokens.labels(model, "out").inc(usage.get("output_tokens", 0))
+
+
+def observe_node(graph: str, name: str, fn: Callable) -> Callable:
+    """Wrap a graph node (sync or async) so its duration lands in agent_node_duration_seconds"""
+    histogram = node_latency.labels(graph, name)
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+    else:
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+    return timed
+
+
+async def monitor_event_loop(interval: Optional[float] = None):
+    """Sleep in a loop and report how late each wake-up is; runs until cancelled"""
+    interval = interval or settings.METRICS_LOOP_LAG_INTERVAL
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        loop_lag.set(lag)
+        loop_lag_histogram.observe(lag)
+        if lag > 0.5:
+            throttled("metrics.loop_lag").warning("Event loop blocked for {:.2f}s", lag)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request count and latency per route
+
+    Requests are labelled with the route template (e.g. /agents/quote), not
+    the raw path, so ids in URLs do not multiply series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or ("/agents/*" if scope.get("path", "").startswith("/agents/") else "other")
+            method = scope.get("method", "GET")
+            http_requests.labels(endpoint, method, str(status["code"])).inc()
+            http_latency.labels(endpoint, method).observe(time.perf_counter() - started)
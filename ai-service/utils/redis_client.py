@@ -2,29 +2,100 @@
 Redis client for caching and state management
 """
 
-import redis.asyncio as redis
 from config.settings import settings
 from loguru import logger
+import asyncio
 import json
-from typing import Optional, Any
+import os
+import time
+import zlib
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Optional, Any, AsyncIterator, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    import redis.asyncio as redis
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional codec
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional codec
+    orjson = None
 
 # Redis client instance
-redis_client: Optional[redis.Redis] = None
+redis_client: Optional["redis.Redis"] = None
+
+# Cached values start with a one-byte codec marker, optionally preceded by
+# a zlib marker. Values written before markers existed are plain JSON text,
+# which never starts with one of these bytes.
+_ZLIB = b"Z"
+_ENCODERS = {
+    "msgpack": (b"M", lambda value: msgpack.packb(value, default=str, use_bin_type=True)),
+    "orjson": (b"O", lambda value: orjson.dumps(value, default=str)),
+    "json": (b"J", lambda value: json.dumps(value, default=str).encode()),
+}
+_DECODERS = {
+    b"M": lambda data: msgpack.unpackb(data, raw=False),
+    b"O": lambda data: orjson.loads(data),
+    b"J": lambda data: json.loads(data),
+}
+
+
+def _codec() -> str:
+    codec = settings.REDIS_CODEC
+    if (codec == "msgpack" and msgpack is None) or (codec == "orjson" and orjson is None):
+        return "json"
+    return codec if codec in _ENCODERS else "json"
+
+
+def encode_value(value: Any) -> bytes:
+    """Serialize a cache value with the configured codec, compressing large payloads"""
+    marker, encode = _ENCODERS[_codec()]
+    data = marker + encode(value)
+    if settings.REDIS_COMPRESS_MIN_BYTES and len(data) >= settings.REDIS_COMPRESS_MIN_BYTES:
+        data = _ZLIB + zlib.compress(data, 1)
+    return data
+
+
+def decode_value(data: Optional[bytes]) -> Optional[Any]:
+    """Inverse of encode_value; also reads legacy plain-JSON values"""
+    if data is None:
+        return None
+    if isinstance(data, str):
+        data = data.encode()
+    if data[:1] == _ZLIB:
+        data = zlib.decompress(data[1:])
+    decode = _DECODERS.get(data[:1])
+    return decode(data[1:]) if decode else json.loads(data)
+
+
+def cache_key(namespace: str, *parts: Any) -> str:
+    """Build a namespaced key, e.g. cache_key("laravel", "shipment", 12) -> "sg:laravel:shipment:12" """
+    key = ":".join([namespace, *(str(part) for part in parts)])
+    return f"{settings.REDIS_KEY_PREFIX}:{key}" if settings.REDIS_KEY_PREFIX else key
 
 
 async def init_redis():
     """Initialize Redis connection"""
     global redis_client
-    
+    # Imported here so that importing this module does not cost ~0.1s at startup
+    import redis.asyncio as redis
+
     try:
         redis_client = redis.Redis(
             host=settings.REDIS_HOST,
             port=settings.REDIS_PORT,
             password=settings.REDIS_PASSWORD,
             db=settings.REDIS_DB,
-            decode_responses=True
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            health_check_interval=30
         )
-        
+
         # Test connection
         await redis_client.ping()
         logger.info("Redis connection initialized")
@@ -38,9 +109,9 @@ async def init_redis():
 async def close_redis():
     """Close Redis connection"""
     global redis_client
-    
+
     if redis_client:
-        await redis_client.close()
+        await redis_client.aclose()
         logger.info("Redis connection closed")
 
 
@@ -48,10 +119,9 @@ async def cache_set(key: str, value: Any, expire: int = 3600):
     """Set cache value"""
     if not redis_client:
         return False
-    
+
     try:
-        serialized = json.dumps(value)
-        await redis_client.setex(key, expire, serialized)
+        await redis_client.set(key, encode_value(value), ex=expire)
         return True
     except Exception as e:
         logger.error(f"Cache set error: {str(e)}")
@@ -62,30 +132,125 @@ async def cache_get(key: str) -> Optional[Any]:
     """Get cache value"""
     if not redis_client:
         return None
-    
+
     try:
-        value = await redis_client.get(key)
-        if value:
-            return json.loads(value)
-        return None
+        return decode_value(await redis_client.get(key))
     except Exception as e:
         logger.error(f"Cache get error: {str(e)}")
         return None
 
 
-async def cache_delete(key: str):
-    """Delete cache value"""
-    if not redis_client:
+async def cache_mget(keys: List[str]) -> List[Optional[Any]]:
+    """Get many cache values in one round trip (None for misses)"""
+    if not redis_client or not keys:
+        return [None] * len(keys)
+
+    try:
+        return [decode_value(value) for value in await redis_client.mget(keys)]
+    except Exception as e:
+        logger.error(f"Cache mget error: {str(e)}")
+        return [None] * len(keys)
+
+
+async def cache_mset(mapping: Dict[str, Any], expire: int = 3600):
+    """Set many cache values with a TTL in one pipelined round trip"""
+    if not redis_client or not mapping:
         return False
-    
+
     try:
-        await redis_client.delete(key)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, encode_value(value), ex=expire)
+            await pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"Cache mset error: {str(e)}")
+        return False
+
+
+async def cache_expire(keys: Iterable[str], expire: int):
+    """Refresh the TTL of many keys in one pipelined round trip"""
+    keys = list(keys)
+    if not redis_client or not keys:
+        return False
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.expire(key, expire)
+            await pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"Cache expire error: {str(e)}")
+        return False
+
+
+async def cache_delete(*keys: str):
+    """Delete cache values"""
+    if not redis_client or not keys:
+        return False
+
+    try:
+        await redis_client.delete(*keys)
         return True
     except Exception as e:
         logger.error(f"Cache delete error: {str(e)}")
         return False
 
 
-def get_redis_client() -> Optional[redis.Redis]:
-    """Get Redis client instance"""
+# Delete the lock only if it still holds our token (it may have expired and been re-taken)
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+async def claim(name: str, ttl: float, token: Optional[str] = None) -> bool:
+    """
+    Claim `name` for `ttl` seconds across all workers and replicas (SET NX PX)
+
+    For work that should run once per interval however many processes
+    schedule it, e.g. claim("snapshot_sync", interval). Without Redis the
+    claim always succeeds: a single process needs no coordination. Redis
+    errors fail closed.
+    """
+    if not redis_client:
+        return True
+    try:
+        return bool(await redis_client.set(cache_key("lock", name), token or "1", nx=True, px=max(1, int(ttl * 1000))))
+    except Exception as e:
+        logger.error(f"Redis claim error for {name}: {str(e)}")
+        return False
+
+
+@asynccontextmanager
+async def redis_lock(name: str, ttl: float = 10.0, wait: float = 5.0) -> AsyncIterator[bool]:
+    """
+    Mutual exclusion across workers, yielding whether the lock was taken
+
+    Usage: async with redis_lock("transit_stats") as locked: ... The lock
+    expires after `ttl` seconds in case its holder dies, and is released on
+    exit only if it is still ours. Acquisition is retried for up to `wait`
+    seconds.
+    """
+    token = os.urandom(8).hex()
+    give_up = time.monotonic() + wait
+    locked = await claim(name, ttl, token)
+    while not locked and redis_client and time.monotonic() < give_up:
+        await asyncio.sleep(0.05)
+        locked = await claim(name, ttl, token)
+    try:
+        yield locked
+    finally:
+        if locked and redis_client:
+            try:
+                await redis_client.eval(_RELEASE_SCRIPT, 1, cache_key("lock", name), token)
+            except Exception as e:
+                logger.error(f"Redis lock release error for {name}: {str(e)}")
+
+
+def get_redis_client() -> Optional["redis.Redis"]:
+    """Get Redis client instance (responses are bytes)"""
     return redis_client
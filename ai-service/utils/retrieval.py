@@ -0,0 +1,127 @@
+"""
+Local lexical retrieval
+BM25 index over short documents with word and bigram terms
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "could", "do", "does",
+    "for", "from", "get", "has", "have", "how", "i", "if", "in", "is", "it", "me",
+    "my", "of", "on", "or", "our", "please", "should", "so", "that", "the", "there",
+    "this", "to", "us", "was", "we", "what", "when", "where", "which", "will",
+    "with", "would", "you", "your",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    """Very light suffix stripping so shipping/shipped/ships all match ship"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            token = token[:-len(suffix)]
+            if len(token) > 2 and token[-1] == token[-2] and token[-1] not in "ls":
+                token = token[:-1]
+            return token
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase content words plus adjacent-word bigrams"""
+    words = [_stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class BM25Index:
+    """
+    In-memory BM25 index
+
+    Besides the BM25 score, each hit carries a coverage value: the share of
+    the query's word IDF weight found in the document. Coverage is bounded in
+    [0, 1], which makes it usable as a confidence threshold where raw BM25
+    scores are not.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: List[Dict[str, Any]] = []
+        self._term_freqs: List[Counter] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+        self._stale = False
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, text: str, **payload):
+        """Add a document; payload fields are returned with search hits"""
+        terms = Counter(tokenize(text))
+        doc_id = len(self.docs)
+        self.docs.append({"text": text, **payload})
+        self._term_freqs.append(terms)
+        self._lengths.append(sum(terms.values()))
+        for term in terms:
+            self._postings.setdefault(term, []).append(doc_id)
+        self._stale = True
+
+    def _refresh(self):
+        """Recompute corpus statistics after documents were added"""
+        n = len(self.docs)
+        self._avg_length = sum(self._lengths) / n if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            for term, ids in self._postings.items()
+        }
+        self._stale = False
+
+    def search(self, query: str, k: int = 3, filter_type: Optional[str] = None) -> List[Tuple[Dict[str, Any], float, float]]:
+        """
+        Rank documents for a query
+
+        Returns:
+            Up to k (document, bm25_score, coverage) tuples, best first
+        """
+        if self._stale:
+            self._refresh()
+        terms = Counter(tokenize(query))
+        if not terms:
+            return []
+
+        scores: Dict[int, float] = {}
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id in self._postings[term]:
+                tf = self._term_freqs[doc_id][term]
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / self._avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        # Coverage is measured on single words so paraphrases are not penalized
+        # for missing bigrams; unknown words count at the highest IDF seen
+        words = [term for term in terms if "_" not in term]
+        unknown_idf = max(self._idf.values(), default=1.0)
+        query_weight = sum(self._idf.get(word, unknown_idf) for word in words) or 1.0
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        hits = []
+        for doc_id, score in ranked:
+            doc = self.docs[doc_id]
+            if filter_type and doc.get("type") != filter_type:
+                continue
+            matched = sum(self._idf[word] for word in words if word in self._term_freqs[doc_id])
+            hits.append((doc, score, matched / query_weight))
+            if len(hits) == k:
+                break
+        return hits
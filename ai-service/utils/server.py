@@ -0,0 +1,60 @@
+"""
+Production worker
+Gunicorn worker running the app on uvicorn with uvloop/httptools and a graceful drain
+"""
+
+import asyncio
+import signal
+import sys
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn_worker import UvicornWorker
+from loguru import logger
+
+from config.settings import settings
+from utils.startup import warmup
+
+
+class DrainingServer(Server):
+    """
+    uvicorn server that drains before it stops accepting
+
+    On the first SIGTERM/SIGINT it keeps serving for SHUTDOWN_DRAIN_SECONDS
+    with /ready at 503, so load balancers take the replica out of rotation
+    before its listener closes. uvicorn then stops accepting and waits up
+    to SHUTDOWN_GRACE_SECONDS for in-flight requests (LLM calls included;
+    they are bounded by the request deadline) before the lifespan shutdown
+    flushes background work. A second signal skips the drain.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.draining = False
+
+    def handle_exit(self, sig, frame):
+        if self.draining or self.should_exit or settings.SHUTDOWN_DRAIN_SECONDS <= 0:
+            super().handle_exit(sig, frame)
+            return
+        self.draining = True
+        warmup.stop()
+        logger.info(f"Received {signal.Signals(sig).name}, draining for {settings.SHUTDOWN_DRAIN_SECONDS}s")
+        asyncio.get_event_loop().call_later(settings.SHUTDOWN_DRAIN_SECONDS, super().handle_exit, sig, frame)
+
+
+class ServiceWorker(UvicornWorker):
+    """Worker class for gunicorn.conf.py"""
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "timeout_graceful_shutdown": settings.SHUTDOWN_GRACE_SECONDS,
+    }
+
+    async def _serve(self):
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
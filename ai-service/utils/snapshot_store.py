@@ -0,0 +1,297 @@
+"""
+Local columnar snapshots of shipment and quote history
+Month-partitioned Arrow IPC files, synced incrementally and read memory-mapped
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+
+from config.settings import settings
+from utils.analytics import analytics_reader, encode_watermark, decode_watermark, decode_watermark_key
+
+# Per dataset: primary key, change watermark, partition date and lane columns.
+# Quotes have no lane columns: the backend moved origin and destination into
+# route_id and the vehicle_details JSON.
+DATASETS: Dict[str, dict] = {
+    "shipments": {
+        "key": "id",
+        "watermark": "updated_at",
+        "date": "created_at",
+        "lane": ("port_of_loading", "port_of_discharge"),
+    },
+    "quotes": {
+        "key": "id",
+        "watermark": "updated_at",
+        "date": "created_at",
+        "lane": None,
+    },
+}
+
+LaneFilter = Union[str, Sequence[str], None]
+
+
+def _month(value) -> str:
+    return "unknown" if pd.isna(value) else pd.Timestamp(value).strftime("%Y-%m")
+
+
+class SnapshotStore:
+    """
+    Columnar copy of backend history for analytics
+
+    Each sync appends the rows changed since the last watermark as a new
+    part file in the row's month partition. Queries prune partitions by
+    month, memory-map the part files (no copy, no backend round trip),
+    filter with Arrow compute and keep the newest version of each row.
+    Partitions are compacted into one file once they collect
+    SNAPSHOT_MAX_PARTS parts.
+    """
+
+    def __init__(self, root: Optional[str] = None, reader=analytics_reader):
+        self.root = Path(root or settings.SNAPSHOT_DIR)
+        self.reader = reader
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._syncing: Optional[asyncio.Future] = None
+        self._sync_lock = None
+
+    def _manifest_path(self, dataset: str) -> Path:
+        return self.root / dataset / "_manifest.json"
+
+    def _manifest(self, dataset: str) -> dict:
+        path = self._manifest_path(dataset)
+        if path.exists():
+            return json.loads(path.read_text())
+        return {"watermark": None, "sequence": 0, "rows": 0}
+
+    def _write_atomic(self, path: Path, write):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        write(tmp)
+        os.replace(tmp, path)
+
+    def _write_part(self, dataset: str, month: str, sequence: int, table: pa.Table):
+        def write(tmp):
+            with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        self._write_atomic(self.root / dataset / f"month={month}" / f"part-{sequence:08d}.arrow", write)
+
+    async def sync(self, dataset: str) -> int:
+        """
+        Pull rows changed since the last sync into the snapshot
+
+        Returns:
+            Number of rows written
+        """
+        spec = DATASETS[dataset]
+        lock = self._locks.setdefault(dataset, asyncio.Lock())
+        async with lock:
+            manifest = self._manifest(dataset)
+            since = decode_watermark(manifest["watermark"])
+            since_key = decode_watermark_key(manifest["watermark"])
+            written = 0
+            touched = set()
+
+            async for frame in self.reader.iter_batches(
+                dataset, since=since, watermark_column=spec["watermark"], since_key=since_key, key_column=spec["key"]
+            ):
+                if frame.empty:
+                    continue
+                months = frame[spec["date"]].map(_month)
+                for month, rows in frame.groupby(months, sort=False):
+                    manifest["sequence"] += 1
+                    table = pa.Table.from_pandas(rows, preserve_index=False)
+                    await asyncio.to_thread(self._write_part, dataset, month, manifest["sequence"], table)
+                    touched.add(month)
+                written += len(frame)
+                # Rows arrive ordered by (watermark, key), so the last one is the new position
+                last = frame.iloc[-1]
+                manifest["watermark"] = encode_watermark(last[spec["watermark"]], last[spec["key"]])
+
+            if written:
+                manifest["rows"] += written
+                manifest["synced_at"] = datetime.now().isoformat()
+                self._write_atomic(self._manifest_path(dataset), lambda tmp: tmp.write_text(json.dumps(manifest)))
+                for month in touched:
+                    await asyncio.to_thread(self._compact_if_needed, dataset, month, manifest)
+                logger.info(f"Snapshot sync of {dataset}: {written} rows into {len(touched)} partitions")
+            return written
+
+    def _parts(self, dataset: str, month: str) -> List[Path]:
+        return sorted((self.root / dataset / f"month={month}").glob("part-*.arrow"))
+
+    def _read_parts(self, parts: List[Path]) -> Optional[pa.Table]:
+        tables = []
+        for part in parts:
+            # Memory-mapped IPC reads reference the page cache instead of copying
+            with pa.ipc.open_file(pa.memory_map(str(part))) as reader:
+                tables.append(reader.read_all())
+        if not tables:
+            return None
+        return pa.concat_tables(tables, promote_options="default")
+
+    def _compact_if_needed(self, dataset: str, month: str, manifest: dict):
+        parts = self._parts(dataset, month)
+        if len(parts) < settings.SNAPSHOT_MAX_PARTS:
+            return
+        key = DATASETS[dataset]["key"]
+        frame = self._read_parts(parts).to_pandas()
+        frame = frame.drop_duplicates(subset=key, keep="last")
+        # Named after the newest part it replaces so part order stays by sequence
+        self._write_part(dataset, month, int(parts[-1].stem.split("-")[1]), pa.Table.from_pandas(frame, preserve_index=False))
+        for part in parts[:-1]:
+            part.unlink()
+
+    def version(self, dataset: str) -> Tuple[int, int]:
+        """Changes whenever a sync (in any worker on this host) writes rows to the dataset"""
+        try:
+            # The manifest is replaced, not rewritten, so its inode changes even within one mtime tick
+            stat = self._manifest_path(dataset).stat()
+            return stat.st_ino, stat.st_mtime_ns
+        except FileNotFoundError:
+            return 0, 0
+
+    def months(self, dataset: str) -> List[str]:
+        """Partitions present for a dataset"""
+        base = self.root / dataset
+        if not base.exists():
+            return []
+        return sorted(path.name.split("=", 1)[1] for path in base.glob("month=*") if path.is_dir())
+
+    def query(
+        self,
+        dataset: str,
+        columns: Optional[Sequence[str]] = None,
+        origin: LaneFilter = None,
+        destination: LaneFilter = None,
+        start: Optional[Union[date, datetime]] = None,
+        end: Optional[Union[date, datetime]] = None
+    ) -> pd.DataFrame:
+        """
+        Read snapshot rows filtered by lane and partition date
+
+        Args:
+            dataset: One of DATASETS
+            columns: Columns to return (all when omitted)
+            origin, destination: Lane value or values, matched case-insensitively
+            start, end: Inclusive bounds on the dataset's date column
+        """
+        spec = DATASETS[dataset]
+        if (origin or destination) and not spec["lane"]:
+            raise ValueError(f"Snapshot dataset '{dataset}' cannot be filtered by lane")
+        first = pd.Timestamp(start).strftime("%Y-%m") if start is not None else None
+        last = pd.Timestamp(end).strftime("%Y-%m") if end is not None else None
+
+        tables = []
+        elsewhere = []
+        for month in self.months(dataset):
+            table = self._read_parts(self._parts(dataset, month))
+            if table is None:
+                continue
+            skipped = (first or last) and (
+                month == "unknown" or (first and month < first) or (last and month > last)
+            )
+            if skipped:
+                # Only needed to spot rows whose newer version moved out of the range
+                elsewhere.append(table.select([spec["key"], spec["watermark"]]))
+            else:
+                tables.append(table)
+        if not tables:
+            return pd.DataFrame(columns=list(columns or []))
+        table = self._latest(pa.concat_tables(tables, promote_options="default"), spec, elsewhere)
+
+        mask = None
+        for column, wanted in zip(spec["lane"] or (), (origin, destination)):
+            if wanted:
+                values = [wanted] if isinstance(wanted, str) else list(wanted)
+                condition = pc.is_in(pc.utf8_lower(table[column]), value_set=pa.array([v.lower() for v in values]))
+                mask = condition if mask is None else pc.and_(mask, condition)
+        dates = pc.cast(table[spec["date"]], pa.timestamp("us")) if (start or end) else None
+        if start is not None:
+            condition = pc.greater_equal(dates, pa.scalar(pd.Timestamp(start).to_pydatetime(), pa.timestamp("us")))
+            mask = condition if mask is None else pc.and_(mask, condition)
+        if end is not None:
+            bound = pd.Timestamp(end)
+            if isinstance(end, date) and not isinstance(end, datetime):
+                bound += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+            condition = pc.less_equal(dates, pa.scalar(bound.to_pydatetime(), pa.timestamp("us")))
+            mask = condition if mask is None else pc.and_(mask, condition)
+        if mask is not None:
+            table = table.filter(pc.fill_null(mask, False))
+
+        frame = table.to_pandas()
+        return frame[list(columns)] if columns else frame
+
+    def _latest(self, table: pa.Table, spec: dict, elsewhere: List[pa.Table]) -> pa.Table:
+        """
+        Newest version of each row, before any filtering
+
+        Filtering first would return an old version that still matches
+        after the row changed. The newest version is the one with the
+        highest watermark (the part written last on ties); rows with a newer
+        version in a partition outside the query's range are dropped.
+        """
+        key, watermark = spec["key"], spec["watermark"]
+        index = table.select([key, watermark]).to_pandas()
+        index["_row"] = range(len(index))
+        index = index.sort_values([watermark, "_row"], na_position="first", kind="stable")
+        index = index.drop_duplicates(subset=key, keep="last")
+        if elsewhere:
+            newest = pa.concat_tables(elsewhere, promote_options="default").to_pandas().groupby(key)[watermark].max()
+            index = index[~(index[key].map(newest) > index[watermark])]
+        return table.take(pa.array(sorted(index["_row"])))
+
+    async def sync_all(self):
+        for dataset in DATASETS:
+            try:
+                await self.sync(dataset)
+            except Exception as e:
+                logger.error(f"Snapshot sync error for {dataset}: {str(e)}")
+
+    async def run_periodic(self):
+        """
+        Sync every dataset forever at SNAPSHOT_SYNC_INTERVAL
+
+        Every worker runs this loop, but the snapshot directory is shared by
+        the workers on a host, so only the worker holding the directory's
+        lock file syncs. The lock is taken with flock and kept for the life
+        of the process; when its holder exits another worker takes it at its
+        next round. Cancelling the loop leaves a sync in progress running;
+        drain() waits for it.
+        """
+        while True:
+            if self._hold_sync_lock():
+                self._syncing = asyncio.ensure_future(self.sync_all())
+                await asyncio.shield(self._syncing)
+            await asyncio.sleep(settings.SNAPSHOT_SYNC_INTERVAL)
+
+    def _hold_sync_lock(self) -> bool:
+        """Whether this worker holds the snapshot directory's sync lock, taking it if free"""
+        if self._sync_lock is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            handle = open(self.root / ".sync.lock", "a")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                return False
+            self._sync_lock = handle
+        return True
+
+    async def drain(self):
+        """Wait for a sync started by run_periodic() to finish writing"""
+        if self._syncing is not None and not self._syncing.done():
+            await asyncio.wait([self._syncing])
+
+
+# Singleton instance
+snapshot_store = SnapshotStore()
@@ -0,0 +1,267 @@
+"""
+Spatial index of live shipment positions
+Grid-bucketed latest position per shipment for radius and port density queries
+"""
+
+import asyncio
+import math
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from loguru import logger
+
+from config.settings import settings
+from utils.geo import COUNTRY_PORTS, PORTS, TRANSIT_PORTS, distances_from
+from utils.redis_client import cache_key, get_redis_client
+
+KM_PER_DEGREE_LAT = 111.195
+
+# Radius around a port within which tracked shipments count towards congestion
+PORT_CONGESTION_RADIUS_KM = 50.0
+
+# (shipments within radius, level, expected extra days)
+CONGESTION_LEVELS = [
+    (25, "high", 5),
+    (10, "moderate", 2),
+    (0, "low", 0),
+]
+
+# Write positions unless Redis already holds a newer one for the shipment.
+# KEYS: positions hash, timestamps hash; ARGV: (id, "lat,lon", epoch or "") triples
+_SAVE_SCRIPT = """
+for i = 1, #ARGV, 3 do
+    local stored = redis.call('HGET', KEYS[2], ARGV[i])
+    if ARGV[i + 2] == '' or not stored or tonumber(ARGV[i + 2]) >= tonumber(stored) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+        if ARGV[i + 2] ~= '' then
+            redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+        end
+    end
+end
+return 0
+"""
+
+
+def _redis_keys() -> Tuple[str, str]:
+    """Hashes of every shipment's latest "lat,lon" and its epoch timestamp"""
+    return cache_key("positions", "v1"), cache_key("positions", "v1", "recorded_at")
+
+
+class ShipmentPositionIndex:
+    """
+    In-memory grid index of the latest position per shipment
+
+    The globe is split into cell_deg x cell_deg cells. Each shipment lives
+    in exactly one cell, so updates are O(1) and a radius query only
+    inspects the few cells overlapping the search circle.
+
+    With several workers each keeps its own grid. The worker receiving an
+    update also saves it to Redis (a newer stored position wins), and
+    run_periodic() rebuilds the grid from Redis, so every worker sees the
+    positions posted to the others.
+    """
+
+    def __init__(self, cell_deg: float = 1.0):
+        self.cell_deg = cell_deg
+        self.columns = int(math.ceil(360 / cell_deg))
+        self.rows = int(math.ceil(180 / cell_deg))
+        self._positions: Dict[int, Tuple[float, float, Optional[datetime]]] = {}
+        self._cell_of: Dict[int, Tuple[int, int]] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = min(int((lat + 90) // self.cell_deg), self.rows - 1)
+        col = int((lon + 180) // self.cell_deg) % self.columns
+        return row, col
+
+    def update(self, shipment_id: int, lat: float, lon: float, recorded_at: Optional[datetime] = None) -> bool:
+        """
+        Record the latest position of a shipment
+
+        Updates older than the stored position are ignored so out-of-order
+        delivery cannot move a shipment backwards. An update without
+        recorded_at keeps the stored timestamp, so it cannot let an older
+        timed update through afterwards.
+
+        Returns:
+            True if the index changed
+        """
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"Invalid coordinates: {lat}, {lon}")
+        if recorded_at and recorded_at.tzinfo:
+            recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+        current = self._positions.get(shipment_id)
+        if current and current[2]:
+            if recorded_at is None:
+                recorded_at = current[2]
+            elif recorded_at < current[2]:
+                return False
+
+        cell = self._cell(lat, lon)
+        old_cell = self._cell_of.get(shipment_id)
+        if old_cell != cell:
+            if old_cell is not None:
+                self._discard(shipment_id, old_cell)
+            self._cells.setdefault(cell, set()).add(shipment_id)
+            self._cell_of[shipment_id] = cell
+
+        self._positions[shipment_id] = (lat, lon, recorded_at)
+        return True
+
+    def remove(self, shipment_id: int) -> bool:
+        """Drop a shipment, e.g. once delivered"""
+        cell = self._cell_of.pop(shipment_id, None)
+        if cell is None:
+            return False
+        self._discard(shipment_id, cell)
+        del self._positions[shipment_id]
+        return True
+
+    def _discard(self, shipment_id: int, cell: Tuple[int, int]):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(shipment_id)
+            if not members:
+                del self._cells[cell]
+
+    async def save(self, updated: Iterable[int], removed: Iterable[int] = ()):
+        """Publish updated shipments' current positions and drop removed ones"""
+        client = get_redis_client()
+        if not client:
+            return
+        args = []
+        for shipment_id in updated:
+            lat, lon, recorded_at = self._positions[shipment_id]
+            at = recorded_at.replace(tzinfo=timezone.utc).timestamp() if recorded_at else ""
+            args.extend([shipment_id, f"{lat},{lon}", at])
+        removed = list(removed)
+        try:
+            if args:
+                await client.eval(_SAVE_SCRIPT, 2, *_redis_keys(), *args)
+            if removed:
+                async with client.pipeline(transaction=False) as pipe:
+                    for key in _redis_keys():
+                        pipe.hdel(key, *removed)
+                    await pipe.execute()
+        except Exception as e:
+            logger.error(f"Position save error: {str(e)}")
+
+    async def load(self):
+        """Replace the grid with the positions stored in Redis (kept as is when Redis is unavailable)"""
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            positions_key, recorded_key = _redis_keys()
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.hgetall(positions_key)
+                pipe.hgetall(recorded_key)
+                positions, recorded = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Position load error: {str(e)}")
+            return
+        fresh = ShipmentPositionIndex(self.cell_deg)
+        for shipment_id, value in positions.items():
+            lat, lon = (float(part) for part in value.decode().split(","))
+            at = recorded.get(shipment_id)
+            recorded_at = datetime.fromtimestamp(float(at), timezone.utc).replace(tzinfo=None) if at else None
+            fresh.update(int(shipment_id), lat, lon, recorded_at)
+        self._positions, self._cell_of, self._cells = fresh._positions, fresh._cell_of, fresh._cells
+        logger.debug("Loaded {} shipment positions", len(self._positions))
+
+    async def run_periodic(self):
+        """Reload the shared positions every POSITIONS_SYNC_INTERVAL"""
+        while True:
+            await self.load()
+            await asyncio.sleep(settings.POSITIONS_SYNC_INTERVAL)
+
+    def get(self, shipment_id: int) -> Optional[Tuple[float, float, Optional[datetime]]]:
+        """Latest (lat, lon, recorded_at) for a shipment"""
+        return self._positions.get(shipment_id)
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> List[int]:
+        """Shipments in cells overlapping the search circle"""
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        row_min, _ = self._cell(max(lat - dlat, -90), lon)
+        row_max, _ = self._cell(min(lat + dlat, 90), lon)
+
+        # Longitude degrees shrink towards the poles; widen the search accordingly
+        max_abs_lat = min(abs(lat) + dlat, 89.9)
+        dlon = radius_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(max_abs_lat)))
+        span = int(math.ceil(dlon / self.cell_deg))
+        _, center_col = self._cell(lat, lon)
+        if 2 * span + 1 >= self.columns:
+            cols = range(self.columns)
+        else:
+            cols = [(center_col + offset) % self.columns for offset in range(-span, span + 1)]
+
+        candidates = []
+        for row in range(row_min, row_max + 1):
+            for col in cols:
+                members = self._cells.get((row, col))
+                if members:
+                    candidates.extend(members)
+        return candidates
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """
+        Find shipments within radius_km of a point
+
+        Returns:
+            (shipment_id, distance_km) tuples, nearest first
+        """
+        candidates = self._candidates(lat, lon, radius_km)
+        if not candidates:
+            return []
+        coords = [self._positions[sid][:2] for sid in candidates]
+        distances = distances_from((lat, lon), coords)
+        hits = [(sid, float(d)) for sid, d in zip(candidates, distances) if d <= radius_km]
+        return sorted(hits, key=lambda hit: hit[1])
+
+    def count_within(self, lat: float, lon: float, radius_km: float) -> int:
+        """Number of shipments within radius_km of a point"""
+        return len(self.within_radius(lat, lon, radius_km))
+
+    def port_density(self, port: str, radius_km: float = PORT_CONGESTION_RADIUS_KM) -> int:
+        """Number of tracked shipments near a known port"""
+        if port not in PORTS:
+            raise KeyError(f"Unknown port: {port}")
+        lat, lon = PORTS[port]
+        return self.count_within(lat, lon, radius_km)
+
+    def port_densities(self, ports: Optional[List[str]] = None, radius_km: float = PORT_CONGESTION_RADIUS_KM) -> Dict[str, int]:
+        """Shipment counts near each port (all known ports by default)"""
+        return {port: self.port_density(port, radius_km) for port in (ports or PORTS)}
+
+
+def congestion_level(count: int) -> Tuple[str, int]:
+    """Map a port's shipment count to (level, expected extra days)"""
+    for threshold, level, days in CONGESTION_LEVELS:
+        if count >= threshold:
+            return level, days
+    return "low", 0
+
+
+def lane_ports(origin: str, destination: str = "Uganda") -> List[str]:
+    """Ports a shipment on this lane typically passes through"""
+    origin_ports = COUNTRY_PORTS.get((origin or "").lower(), [])
+    destination_ports = COUNTRY_PORTS.get((destination or "").lower(), [])
+    return origin_ports + TRANSIT_PORTS + destination_ports
+
+
+def describe_congestion(densities: Dict[str, int]) -> str:
+    """Render port densities as prompt lines"""
+    if not densities:
+        return "- No live tracking data available"
+    lines = []
+    for port, count in densities.items():
+        level, days = congestion_level(count)
+        lines.append(f"- {port}: {count} tracked shipments within {PORT_CONGESTION_RADIUS_KM:.0f} km ({level}, ~{days} extra days)")
+    return "\n".join(lines)
+
+
+# Singleton instance
+position_index = ShipmentPositionIndex()
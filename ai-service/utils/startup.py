@@ -0,0 +1,171 @@
+"""
+Service startup
+Connects backing services and warms agents after the server is accepting traffic
+"""
+
+import asyncio
+import importlib
+import sys
+import time
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+from config.settings import settings
+from utils.database import init_db, ping_db
+from utils.redis_client import init_redis
+from utils.llm import GuardedLLM
+from tools.laravel_api import laravel_api
+from utils.transit_stats import transit_stats
+
+
+async def import_module(name: str):
+    """
+    Import a module in a worker thread
+
+    Agent modules pull in langgraph, langchain, pandas/pyarrow and the OCR
+    stack (~3s together); importing them on the event loop would stall every
+    request in flight. Python's per-module import locks make a concurrent
+    import of the same module from a request handler safe.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return await asyncio.to_thread(importlib.import_module, name)
+
+
+async def start_backends():
+    """
+    Set up MySQL, Redis and the Laravel client and load transit-time stats
+
+    Runs as part of the warm-up, so the server answers /health while Redis
+    is still being pinged; until it finishes, requests run without the
+    Redis cache.
+    """
+    try:
+        await init_db()
+    except Exception:
+        # Already logged by init_db; database-backed endpoints fail until a restart
+        pass
+    await init_redis()
+    await laravel_api.start()
+    await transit_stats.load()
+
+
+def _build_agent(factory: Callable[[], Any]) -> Any:
+    # Runs in a worker thread: imports the agent module, compiles its graph
+    # (QuoteAgent) or index (SupportAgent) and creates its Mistral client
+    agent = factory()
+    llm = getattr(agent, "llm", None)
+    if isinstance(llm, GuardedLLM):
+        llm.chat_model
+    return agent
+
+
+class Warmup:
+    """
+    Startup warm-up and readiness state behind /ready
+
+    Connects backing services, builds the agents in WARMUP_AGENTS and,
+    with WARMUP_CONNECT, opens a connection to MySQL, Laravel and the
+    Mistral API, so the first request after a deploy pays for none of it.
+    The service is ready once every step has run and every agent was built;
+    connection failures are reported but do not hold readiness back, since
+    those paths recover (or fall back) on their own. A warm-up slower than
+    WARMUP_TIMEOUT is abandoned and whatever is left happens on first use.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.stopping = False
+        self.steps: Dict[str, str] = {}
+        self.seconds: Optional[float] = None
+
+    async def _step(self, name: str, fn: Callable, *args) -> Any:
+        self.steps[name] = "running"
+        started = time.perf_counter()
+        try:
+            result = await fn(*args)
+            self.steps[name] = "ok"
+            logger.debug("Warm-up step {} took {:.2f}s", name, time.perf_counter() - started)
+            return result
+        except Exception as e:
+            message = str(e).splitlines()[0] if str(e) else type(e).__name__
+            self.steps[name] = f"failed: {message[:200]}"
+            logger.warning(f"Warm-up step {name} failed: {str(e)}")
+            return None
+
+    async def _run(self, factories: Dict[str, Callable[[], Any]]):
+        await self._step("backends", start_backends)
+        if settings.WARMUP_CONNECT:
+            await asyncio.gather(self._step("mysql", ping_db), self._step("laravel", laravel_api.warm))
+
+        llms = {}
+        for name in settings.WARMUP_AGENTS:
+            factory = factories.get(name)
+            if factory is None:
+                logger.warning(f"Unknown agent in WARMUP_AGENTS: {name}")
+                continue
+            agent = await self._step(f"agent.{name}", asyncio.to_thread, _build_agent, factory)
+            if isinstance(getattr(agent, "llm", None), GuardedLLM):
+                llms[name] = agent.llm
+
+        if settings.WARMUP_CONNECT:
+            await asyncio.gather(*(self._step(f"llm.{name}", llm.warm) for name, llm in llms.items()))
+
+    async def run(self, factories: Dict[str, Callable[[], Any]]):
+        """Run every warm-up step, then mark the service ready"""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._run(factories), settings.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up did not finish within {settings.WARMUP_TIMEOUT}s, continuing cold")
+            for name, state in self.steps.items():
+                if state == "running":
+                    self.steps[name] = "timed out"
+
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.ready = not self.stopping and not any(
+            name.startswith("agent.") and state.startswith("failed") for name, state in self.steps.items()
+        )
+        if self.ready:
+            logger.info("Warm-up finished in {:.2f}s, service is ready", self.seconds)
+        else:
+            logger.error(f"Warm-up failed, service stays unready: {self.steps}")
+
+    def stop(self):
+        """Report unready from now on, so load balancers stop routing here before shutdown"""
+        self.stopping = True
+        self.ready = False
+
+    def status(self) -> dict:
+        if self.stopping:
+            state = "stopping"
+        elif self.ready:
+            state = "ready"
+        else:
+            state = "warming_up" if self.seconds is None else "failed"
+        return {
+            "status": state,
+            "steps": dict(self.steps),
+            "warmup_seconds": self.seconds,
+        }
+
+
+# Singleton instance
+warmup = Warmup()
+
+
+async def sync_snapshots():
+    """Run the Arrow IPC snapshot sync (imports pandas/pyarrow off the event loop first)"""
+    module = await import_module("utils.snapshot_store")
+    await module.snapshot_store.run_periodic()
+
+
+async def close_analytics():
+    """Let a snapshot sync in progress finish, then close the analytics pool (if anything opened them)"""
+    snapshots = sys.modules.get("utils.snapshot_store")
+    if snapshots is not None:
+        await snapshots.snapshot_store.drain()
+    module = sys.modules.get("utils.analytics")
+    if module is not None:
+        await module.analytics_reader.close()
@@ -0,0 +1,174 @@
+"""
+Support chat over WebSocket
+Multiplexes many support conversations over a single connection
+"""
+
+import asyncio
+import json
+from typing import Dict, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from loguru import logger
+
+from config.settings import settings
+from utils.admission import RateLimiter
+from utils.auth import verify_token
+from utils.deadline import deadline, endpoint_timeout
+from utils.logger import throttled
+from utils.tracing import start_trace
+
+# Messages per customer; the socket bypasses AdmissionMiddleware, which only sees HTTP
+message_limiter = RateLimiter(per_minute=settings.SUPPORT_WS_MESSAGES_PER_MINUTE)
+
+
+class SupportConnection:
+    """
+    One client WebSocket carrying any number of support conversations
+
+    The handshake must carry a customer token (?token=..., see
+    utils.auth) and every conversation on the connection belongs to that
+    customer: the customer id comes from the token, never from messages,
+    and conversations are stored per customer, so another customer's
+    conversation_id opens a new, empty conversation.
+
+    Client messages:
+        {"type": "message", "conversation_id": ..., "query": ..., "shipment_id": ...}
+        {"type": "cancel", "conversation_id": ...}
+        {"type": "ping"}
+
+    Server events carry the conversation_id they belong to:
+        token (streamed answer text), done (final SupportResponse fields),
+        cancelled, error, pong
+
+    An idle connection is just the receive loop: no writer task, queue or
+    buffers. Each in-flight answer is one task, capped per connection, and
+    all sends go through one lock and await the socket, so a slow reader
+    pauses token generation instead of growing buffers. A reader that stops
+    reading entirely is disconnected after the send timeout.
+    """
+
+    def __init__(self, websocket: WebSocket, agent):
+        self.websocket = websocket
+        self.agent = agent
+        self.customer_id: Optional[int] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def serve(self):
+        """Receive loop; returns when the client disconnects"""
+        self.customer_id = verify_token(self.websocket.query_params.get("token"))
+        if self.customer_id is None:
+            throttled("support_ws.auth").warning("Refused support socket without a valid customer token")
+            # Before accept() this rejects the handshake (HTTP 403)
+            await self.websocket.close(code=1008)
+            return
+        await self.websocket.accept()
+        try:
+            while True:
+                raw = await self.websocket.receive_text()
+                if len(raw) > settings.SUPPORT_WS_MAX_MESSAGE_BYTES:
+                    await self.send({"type": "error", "detail": "Message too large"})
+                    continue
+                try:
+                    message = json.loads(raw)
+                    if not isinstance(message, dict):
+                        raise ValueError("expected an object")
+                except ValueError:
+                    await self.send({"type": "error", "detail": "Invalid JSON message"})
+                    continue
+                await self.dispatch(message)
+        except (WebSocketDisconnect, ConnectionError):
+            pass
+        except asyncio.TimeoutError:
+            await self._drop()
+        finally:
+            await self.close()
+
+    async def dispatch(self, message: dict):
+        message_type = message.get("type")
+        conversation_id = str(message.get("conversation_id") or "")[:64]
+
+        if message_type == "ping":
+            await self.send({"type": "pong"})
+        elif message_type == "cancel":
+            await self.cancel(conversation_id)
+        elif message_type == "message":
+            await self.start(conversation_id, message)
+        else:
+            await self.send({"type": "error", "conversation_id": conversation_id or None,
+                             "detail": f"Unknown message type: {message_type}"})
+
+    async def start(self, conversation_id: str, message: dict):
+        """Start answering a message unless limits are exceeded"""
+        query = message.get("query")
+        if not conversation_id or not isinstance(query, str) or not query.strip() or len(query) > 1000:
+            await self.send({"type": "error", "conversation_id": conversation_id or None,
+                             "detail": "conversation_id and a query of 1-1000 characters are required"})
+            return
+        if conversation_id in self._inflight:
+            await self.send({"type": "error", "conversation_id": conversation_id,
+                             "detail": "A reply is already in progress for this conversation"})
+            return
+        if len(self._inflight) >= settings.SUPPORT_WS_MAX_INFLIGHT:
+            await self.send({"type": "error", "conversation_id": conversation_id,
+                             "detail": "Too many conversations in progress, retry shortly"})
+            return
+        allowed, retry_after = await message_limiter.acquire(f"support_ws:{self.customer_id}")
+        if not allowed:
+            await self.send({"type": "error", "conversation_id": conversation_id,
+                             "detail": "Rate limit exceeded", "retry_after": round(retry_after, 1)})
+            return
+
+        input_data = {
+            "conversation_id": conversation_id,
+            "query": query,
+            "customer_id": self.customer_id,
+            "shipment_id": message.get("shipment_id"),
+        }
+        with deadline(endpoint_timeout("support")):
+            task = asyncio.create_task(self._answer(conversation_id, input_data))
+        self._inflight[conversation_id] = task
+        task.add_done_callback(lambda _: self._inflight.pop(conversation_id, None))
+
+    async def _answer(self, conversation_id: str, input_data: dict):
+        try:
+            with start_trace("WS /ws/support message", conversation_id=conversation_id):
+                async for event in self.agent.stream(input_data):
+                    await self.send({**event, "conversation_id": conversation_id})
+        except (WebSocketDisconnect, ConnectionError):
+            # The client is gone; the receive loop cleans up
+            pass
+        except asyncio.TimeoutError:
+            await self._drop()
+        except Exception as e:
+            logger.error(f"Support socket error: {str(e)}")
+
+    async def cancel(self, conversation_id: str):
+        """Abort an in-flight answer; no tokens follow the cancelled event"""
+        task = self._inflight.get(conversation_id)
+        if task:
+            task.cancel()
+            await asyncio.wait([task])
+        await self.send({"type": "cancelled", "conversation_id": conversation_id})
+
+    async def send(self, event: dict):
+        async with self._send_lock:
+            await asyncio.wait_for(
+                self.websocket.send_text(json.dumps(event, default=str)),
+                timeout=settings.SUPPORT_WS_SEND_TIMEOUT
+            )
+
+    async def _drop(self):
+        """Disconnect a client that stopped reading"""
+        logger.warning("Support socket send timed out, closing connection")
+        try:
+            await asyncio.wait_for(self.websocket.close(code=1013), timeout=1)
+        except Exception:
+            pass
+
+    async def close(self):
+        """Cancel every in-flight answer"""
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
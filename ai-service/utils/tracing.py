@@ -0,0 +1,345 @@
+"""
+Request tracing
+Spans around graph nodes and agent steps, exported as OTLP/JSON and summarised in Server-Timing
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import httpx
+from loguru import logger
+
+from config.settings import settings
+from utils.auth import is_service_key
+from utils.metrics import observe_node
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_TOKEN_UNSAFE = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class Trace:
+    """Spans of one request, collected until the root span ends"""
+
+    def __init__(self, trace_id: Optional[str] = None, sampled: bool = True):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+
+
+class Span:
+    """One timed operation; use span() or start_span() rather than building these directly"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def fail(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"[:200]
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+
+class _NoSpan:
+    """Stands in for a span outside any trace, so callers need no None checks"""
+
+    traceparent = None
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def fail(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+NO_SPAN = _NoSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, kind: int = INTERNAL, **attributes):
+    """
+    Start a child of the current span without making it current
+
+    For work that cannot sit inside a with block (e.g. async generators);
+    the caller must end() it. Outside a trace this returns a no-op span.
+    """
+    parent = _current.get()
+    if parent is None:
+        return NO_SPAN
+    return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, **attributes) -> Iterator[Any]:
+    """Time the enclosed block as a child of the current span (no-op outside a trace)"""
+    current = start_span(name, kind, **attributes)
+    if current is NO_SPAN:
+        yield current
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        current.end()
+        _current.reset(token)
+
+
+def traced(name: str, kind: int = INTERNAL) -> Callable:
+    """Decorator form of span() for sync and async functions"""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def instrument_node(graph: str, name: str, fn: Callable) -> Callable:
+    """Wrap a StateGraph node with a span and its latency histogram"""
+    return observe_node(graph, name, traced(f"{graph}.{name}")(fn))
+
+
+@contextmanager
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes) -> Iterator[Span]:
+    """
+    Open a root span for a request
+
+    A valid W3C traceparent continues the caller's trace (and its sampling
+    decision); otherwise TRACING_SAMPLE_RATE decides whether the finished
+    trace is exported. Spans are collected either way, so an unsampled
+    request can still report its Server-Timing breakdown.
+    """
+    match = _TRACEPARENT.match(traceparent or "")
+    if match:
+        trace = Trace(match.group(1), sampled=match.group(3) == "01")
+        parent_id = match.group(2)
+    else:
+        trace = Trace(sampled=random.random() < settings.TRACING_SAMPLE_RATE)
+        parent_id = None
+    trace.sampled = trace.sampled and settings.TRACING_ENABLED
+
+    root = Span(trace, name, parent_id, SERVER, attributes)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.fail(e)
+        raise
+    finally:
+        root.end()
+        _current.reset(token)
+        if trace.sampled:
+            span_exporter.submit(trace.spans)
+
+
+def server_timing(root: Span, limit: int = 12) -> str:
+    """Compact Server-Timing value: total time plus time per span name, slowest first"""
+    totals: Dict[str, List[float]] = {}
+    for item in root.trace.spans:
+        if item is not root:
+            entry = totals.setdefault(_TOKEN_UNSAFE.sub("_", item.name), [0.0, 0])
+            entry[0] += item.duration_ms
+            entry[1] += 1
+    parts = [f"total;dur={root.duration_ms:.1f}"]
+    for name, (duration, count) in sorted(totals.items(), key=lambda kv: -kv[1][0])[:limit]:
+        parts.append(f'{name};dur={duration:.1f}' + (f';desc="x{count}"' if count > 1 else ""))
+    return ", ".join(parts)
+
+
+def _attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def to_otlp(spans: List[Span]) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for a batch of spans"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                _attribute("service.name", settings.TRACING_SERVICE_NAME),
+                _attribute("deployment.environment", settings.APP_ENV),
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "shipwithglowie.ai-service"},
+                "spans": [{
+                    "traceId": item.trace.trace_id,
+                    "spanId": item.span_id,
+                    **({"parentSpanId": item.parent_id} if item.parent_id else {}),
+                    "name": item.name,
+                    "kind": item.kind,
+                    "startTimeUnixNano": str(item.start_ns),
+                    "endTimeUnixNano": str(item.end_ns),
+                    "attributes": [_attribute(key, value) for key, value in item.attributes.items()],
+                    "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+                } for item in spans],
+            }],
+        }]
+    }
+
+
+class SpanExporter:
+    """
+    Batches finished traces and ships them off the request path
+
+    TRACING_EXPORTER selects "file" (one OTLP/JSON document per line in
+    TRACING_FILE) or "otlp" (POST to a collector's /v1/traces). Requests
+    only append to an in-memory batch; a background task flushes it every
+    TRACING_EXPORT_INTERVAL seconds, and spans beyond TRACING_MAX_QUEUE are
+    dropped rather than held.
+    """
+
+    def __init__(self):
+        self._pending: List[Span] = []
+        self._dropped = 0
+
+    def submit(self, spans: List[Span]):
+        if settings.TRACING_EXPORTER not in ("file", "otlp"):
+            return
+        if len(self._pending) + len(spans) > settings.TRACING_MAX_QUEUE:
+            self._dropped += len(spans)
+            return
+        self._pending.extend(spans)
+
+    def _write(self, line: str):
+        path = Path(settings.TRACING_FILE)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a") as sink:
+            sink.write(line + "\n")
+
+    async def flush(self):
+        """Export everything queued so far"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        payload = to_otlp(batch)
+        try:
+            if settings.TRACING_EXPORTER == "file":
+                await asyncio.to_thread(self._write, json.dumps(payload, separators=(",", ":")))
+            else:
+                async with httpx.AsyncClient(timeout=5) as client:
+                    response = await client.post(settings.TRACING_OTLP_ENDPOINT, json=payload)
+                    response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Span export failed, dropped {len(batch)} spans: {str(e)}")
+        if self._dropped:
+            logger.warning(f"Span queue full, dropped {self._dropped} spans")
+            self._dropped = 0
+
+    async def run_periodic(self):
+        """Flush forever at TRACING_EXPORT_INTERVAL; flushes once more when cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(settings.TRACING_EXPORT_INTERVAL)
+                await self.flush()
+        finally:
+            await self.flush()
+
+
+# Singleton instance
+span_exporter = SpanExporter()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a root span per HTTP request
+
+    Requests carrying TRACING_DEBUG_HEADER get a Server-Timing header with
+    the per-stage breakdown, whether or not the trace is sampled for export.
+    It names internal steps and their latencies, so outside DEBUG only
+    callers with the service key (the Laravel backend) get it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        debug = settings.TRACING_DEBUG_HEADER.lower() in headers and (
+            settings.DEBUG or is_service_key(headers.get(settings.SERVICE_KEY_HEADER.lower()))
+        )
+        if not settings.TRACING_ENABLED and not debug:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        with start_trace(f"{method} {scope.get('path', '')}", headers.get("traceparent"), **{
+            "http.method": method, "http.target": scope.get("path", "")
+        }) as root:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set("http.status_code", message["status"])
+                    if debug:
+                        message = {**message, "headers": [
+                            *message.get("headers", []),
+                            (b"server-timing", server_timing(root).encode("latin-1")),
+                        ]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if getattr(route, "path", None):
+                    root.name = f"{method} {route.path}"
@@ -0,0 +1,284 @@
+"""
+Streaming transit-time statistics
+Mergeable t-digest quantile sketches of actual transit days per lane
+"""
+
+import asyncio
+import json
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from config.settings import settings
+from utils.redis_client import cache_key, get_redis_client, redis_lock
+
+
+def _redis_key() -> str:
+    """Hash of every lane's digest, shared by all workers"""
+    return cache_key("transit_stats", "v1")
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl)
+
+    Values are buffered and periodically merged into at most ~compression
+    centroids, sized so the tails stay accurate. Memory is bounded no
+    matter how many values are added, and two digests merge losslessly
+    enough for per-worker sketches to be combined.
+    """
+
+    def __init__(self, compression: float = 100):
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[Tuple[float, float]] = []
+        self._buffer_size = int(5 * compression)
+
+    def add(self, value: float, weight: float = 1.0):
+        """Add a value to the sketch"""
+        self._buffer.append((float(value), float(weight)))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self._buffer_size:
+            self._flush()
+
+    def merge(self, other: "TDigest"):
+        """Fold another digest into this one"""
+        other._flush()
+        self._buffer.extend(zip(other.means, other.weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._flush()
+
+    def _k(self, q: float) -> float:
+        """k1 scale function: small centroids at the tails, large in the middle"""
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_inverse(self, k: float) -> float:
+        return (math.sin(min(k * 2 * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+
+        total = sum(w for _, w in points)
+        means, weights = [], []
+        cur_mean, cur_weight = points[0]
+        weight_so_far = 0.0
+        q_limit = self._k_inverse(self._k(0.0) + 1)
+
+        for mean, weight in points[1:]:
+            if (weight_so_far + cur_weight + weight) / total <= q_limit:
+                cur_weight += weight
+                cur_mean += (mean - cur_mean) * weight / cur_weight
+            else:
+                means.append(cur_mean)
+                weights.append(cur_weight)
+                weight_so_far += cur_weight
+                q_limit = self._k_inverse(self._k(weight_so_far / total) + 1)
+                cur_mean, cur_weight = mean, weight
+
+        means.append(cur_mean)
+        weights.append(cur_weight)
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1)"""
+        self._flush()
+        if not self.means:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+
+        target = q * self.count
+        first_half = self.weights[0] / 2
+        if target <= first_half:
+            return self.min + (self.means[0] - self.min) * (target / first_half if first_half else 0)
+        last_half = self.weights[-1] / 2
+        if target >= self.count - last_half:
+            into = (target - (self.count - last_half)) / last_half if last_half else 0
+            return self.means[-1] + (self.max - self.means[-1]) * into
+
+        # Centroid centers sit at cumulative weight + half their own weight
+        cumulative = 0.0
+        for i in range(len(self.means) - 1):
+            left = cumulative + self.weights[i] / 2
+            right = cumulative + self.weights[i] + self.weights[i + 1] / 2
+            if target <= right:
+                fraction = (target - left) / (right - left)
+                return self.means[i] + (self.means[i + 1] - self.means[i]) * fraction
+            cumulative += self.weights[i]
+        return self.means[-1]
+
+    def to_dict(self) -> dict:
+        """Serializable representation"""
+        self._flush()
+        return {
+            "compression": self.compression,
+            "means": self.means,
+            "weights": self.weights,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TDigest":
+        digest = cls(data.get("compression", 100))
+        digest.means = list(data["means"])
+        digest.weights = list(data["weights"])
+        digest.count = data["count"]
+        digest.min = data["min"]
+        digest.max = data["max"]
+        return digest
+
+
+def lane_key(origin: str, destination: str = "uganda", method: str = "*") -> str:
+    """Normalized key for a lane and shipping method ("*" = any method)"""
+    return f"{(origin or '').lower()}|{(destination or 'uganda').lower()}|{(method or '*').lower()}"
+
+
+class TransitTimeStats:
+    """
+    Per-lane transit-time percentiles
+
+    Every completed shipment is added to its lane/method digest and to the
+    lane's any-method digest. Percentile summaries are cached per lane and
+    only recomputed after new data arrives, so reads are dictionary lookups.
+
+    With several workers each keeps its own copy. A worker saves only what
+    it recorded since its last save, merged into the stored digests under
+    a Redis lock, and run_periodic() reloads the merged result so every
+    worker sees shipments recorded by the others.
+    """
+
+    def __init__(self, compression: float = 100):
+        self.compression = compression
+        self._digests: Dict[str, TDigest] = {}
+        self._summaries: Dict[str, dict] = {}
+        # Values recorded here since the last save, per lane
+        self._pending: Dict[str, TDigest] = {}
+
+    def record(self, origin: str, destination: str, method: str, transit_days: float):
+        """Record the transit time of a completed shipment"""
+        for key in (lane_key(origin, destination, method), lane_key(origin, destination)):
+            digest = self._digests.get(key)
+            if digest is None:
+                digest = self._digests[key] = TDigest(self.compression)
+            digest.add(transit_days)
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = TDigest(self.compression)
+            pending.add(transit_days)
+            self._summaries.pop(key, None)
+
+    def summary(self, origin: str, destination: str = "uganda", method: Optional[str] = None) -> Optional[dict]:
+        """
+        p50/p90 summary for a lane
+
+        Falls back to the lane's any-method digest when the method has no data.
+        """
+        keys = [lane_key(origin, destination, method)] if method else []
+        keys.append(lane_key(origin, destination))
+        for key in keys:
+            summary = self._summaries.get(key)
+            if summary is None and key in self._digests:
+                digest = self._digests[key]
+                summary = self._summaries[key] = {
+                    "p50": round(digest.quantile(0.5), 1),
+                    "p90": round(digest.quantile(0.9), 1),
+                    "count": int(digest.count),
+                }
+            if summary is not None:
+                return summary
+        return None
+
+    def lanes(self) -> Dict[str, dict]:
+        """Summaries for every lane with data"""
+        result = {}
+        for key in self._digests:
+            origin, destination, method = key.split("|")
+            result[key] = self.summary(origin, destination, None if method == "*" else method)
+        return result
+
+    def describe(self, origins: Iterable[str], destination: str = "uganda") -> Optional[str]:
+        """One-line human summary of transit times for the given origins"""
+        parts = []
+        for origin in origins:
+            summary = self.summary(origin, destination)
+            if summary:
+                name = origin.upper() if len(origin) <= 3 else origin.title()
+                parts.append(f"{name} (typically {summary['p50']:.0f} days, 90% within {summary['p90']:.0f})")
+        return ", ".join(parts) if parts else None
+
+    def _merged(self, stored: Optional[bytes], *pending: Optional[TDigest]) -> TDigest:
+        """Stored digest (or an empty one) with pending values folded in; inputs are not modified"""
+        digest = TDigest.from_dict(json.loads(stored)) if stored else TDigest(self.compression)
+        for extra in pending:
+            if extra is not None:
+                digest.merge(TDigest.from_dict(extra.to_dict()))
+        return digest
+
+    async def load(self):
+        """Load persisted digests from Redis (keeping anything recorded here but not yet saved)"""
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            stored = {key.decode(): value for key, value in (await client.hgetall(_redis_key())).items()}
+            for key in set(stored) | set(self._pending):
+                self._digests[key] = self._merged(stored.get(key), self._pending.get(key))
+            self._summaries.clear()
+            logger.debug("Loaded transit-time stats for {} lanes", len(stored))
+        except Exception as e:
+            logger.error(f"Transit stats load error: {str(e)}")
+
+    async def save(self):
+        """Merge values recorded since the last save into the stored digests"""
+        client = get_redis_client()
+        if not client or not self._pending:
+            return
+        # Values recorded while this save awaits Redis go to a fresh batch
+        batch, self._pending = self._pending, {}
+        try:
+            async with redis_lock("transit_stats") as locked:
+                if not locked:
+                    raise RuntimeError("lock busy")
+                keys = list(batch)
+                stored = await client.hmget(_redis_key(), keys)
+                merged = {key: self._merged(value, batch[key]) for key, value in zip(keys, stored)}
+                await client.hset(_redis_key(), mapping={key: json.dumps(digest.to_dict()) for key, digest in merged.items()})
+        except Exception as e:
+            logger.error(f"Transit stats save error, will retry: {str(e)}")
+            for key, digest in batch.items():
+                if key in self._pending:
+                    digest.merge(self._pending[key])
+                self._pending[key] = digest
+            return
+        for key, digest in merged.items():
+            if key in self._pending:
+                digest.merge(TDigest.from_dict(self._pending[key].to_dict()))
+            self._digests[key] = digest
+            self._summaries.pop(key, None)
+
+    async def run_periodic(self):
+        """Save and reload every TRANSIT_STATS_SYNC_INTERVAL; saves once more when cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(settings.TRANSIT_STATS_SYNC_INTERVAL)
+                await self.save()
+                await self.load()
+        finally:
+            await self.save()
+
+
+# Singleton instance
+transit_stats = TransitTimeStats()
@@ -64,6 +64,7 @@ class Kernel extends HttpKernel
         'api.validation' => \App\Http\Middleware\ApiValidationMiddleware::class,
         'api.logging' => \App\Http\Middleware\ApiLoggingMiddleware::class,
         'api.admin' => \App\Http\Middleware\AdminAuthMiddleware::class,
+        'api.etag' => \App\Http\Middleware\ConditionalGetMiddleware::class,
     ];
 }
 
@@ -0,0 +1,56 @@
+<?php
+
+namespace App\Http\Middleware;
+
+use Closure;
+use Illuminate\Http\JsonResponse;
+use Illuminate\Http\Request;
+use Symfony\Component\HttpFoundation\Response;
+
+/**
+ * Conditional GET Middleware
+ *
+ * Tags successful JSON reads with an ETag and answers a matching
+ * If-None-Match with 304 Not Modified, so clients that cache records
+ * (the AI service) revalidate without downloading them again
+ */
+class ConditionalGetMiddleware
+{
+    /**
+     * Handle an incoming request.
+     *
+     * @param  \Closure(\Illuminate\Http\Request): (\Symfony\Component\HttpFoundation\Response)  $next
+     */
+    public function handle(Request $request, Closure $next): Response
+    {
+        $response = $next($request);
+
+        if (!$request->isMethodCacheable() || !$response->isSuccessful() || !$response instanceof JsonResponse) {
+            return $response;
+        }
+
+        $response->setEtag($this->etag($response));
+        $response->headers->addCacheControlDirective('private');
+        $response->headers->addCacheControlDirective('no-cache');
+        $response->isNotModified($request);
+
+        return $response;
+    }
+
+    /**
+     * Hash of the response's record
+     *
+     * Envelopes from ApiResponseService carry a per-request timestamp, so
+     * only their "data" is hashed; other responses are hashed whole.
+     */
+    private function etag(JsonResponse $response): string
+    {
+        $body = $response->getData(true);
+
+        if (is_array($body) && array_key_exists('data', $body)) {
+            return md5(json_encode($body['data']));
+        }
+
+        return md5($response->getContent());
+    }
+}
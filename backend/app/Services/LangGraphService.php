@@ -2,6 +2,7 @@
 
 namespace App\Services;
 
+use Illuminate\Http\Client\PendingRequest;
 use Illuminate\Support\Facades\Http;
 use Illuminate\Support\Facades\Log;
 use Exception;
@@ -22,6 +23,29 @@ class LangGraphService
         $this->timeout = config('services.langgraph.timeout', 60);
     }
     
+    /**
+     * HTTP client for agent calls
+     * 
+     * Identifies the backend with the shared secret and names the end user,
+     * so the AI service rate-limits each user rather than the whole backend.
+     * Console work (queue jobs, scheduled tasks) sends no user and is not
+     * rate limited.
+     */
+    private function client(): PendingRequest
+    {
+        $headers = [];
+        $secret = config('services.langgraph.secret');
+        
+        if ($secret) {
+            $headers['X-Service-Key'] = $secret;
+            if (!app()->runningInConsole()) {
+                $headers['X-Client-Id'] = auth()->id() ? 'user:' . auth()->id() : 'ip:' . request()->ip();
+            }
+        }
+        
+        return Http::timeout($this->timeout)->withHeaders($headers);
+    }
+    
     /**
      * Generate shipping quote using AI
      * 
@@ -34,7 +58,7 @@ class LangGraphService
         try {
             Log::info('Requesting AI quote generation', ['data' => $data]);
             
-            $response = Http::timeout($this->timeout)
+            $response = $this->client()
                 ->post("{$this->baseUrl}/agents/quote", [
                     'vehicle_type' => $data['vehicleType'] ?? $data['vehicle_type'],
                     'year' => (int) $data['year'],
@@ -82,7 +106,7 @@ class LangGraphService
         try {
             Log::info('Requesting route optimization', ['shipment_id' => $shipmentId]);
             
-            $response = Http::timeout($this->timeout)
+            $response = $this->client()
                 ->post("{$this->baseUrl}/agents/route", [
                     'shipment_id' => $shipmentId,
                     'priority' => $options['priority'] ?? 'standard',
@@ -119,7 +143,7 @@ class LangGraphService
                 'type' => $documentType
             ]);
             
-            $response = Http::timeout($this->timeout)
+            $response = $this->client()
                 ->attach('file', file_get_contents($filePath), basename($filePath))
                 ->post("{$this->baseUrl}/agents/document", [
                     'document_type' => $documentType
@@ -157,7 +181,7 @@ class LangGraphService
                 'query_length' => strlen($query)
             ]);
             
-            $response = Http::timeout($this->timeout)
+            $response = $this->client()
                 ->post("{$this->baseUrl}/agents/support", [
                     'query' => $query,
                     'customer_id' => $customerId,
@@ -191,7 +215,7 @@ class LangGraphService
         try {
             Log::info('Requesting delay prediction', ['shipment_id' => $shipmentId]);
             
-            $response = Http::timeout($this->timeout)
+            $response = $this->client()
                 ->post("{$this->baseUrl}/agents/delay-prediction", [
                     'shipment_id' => $shipmentId,
                 ]);
@@ -256,4 +280,19 @@ class LangGraphService
             ];
         }
     }
+    
+    /**
+     * Token a logged-in customer's browser presents to the AI service's
+     * support WebSocket (/ws/support?token=...)
+     * 
+     * @param int $customerId Authenticated customer ID
+     * @return string Signed token
+     */
+    public function supportSocketToken(int $customerId): string
+    {
+        $expires = time() + (int) config('services.langgraph.token_ttl', 3600);
+        $payload = "{$customerId}.{$expires}";
+        
+        return $payload . '.' . hash_hmac('sha256', $payload, (string) config('services.langgraph.secret'));
+    }
 }
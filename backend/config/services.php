@@ -34,6 +34,9 @@ return [
     'langgraph' => [
         'url' => env('LANGGRAPH_SERVICE_URL', 'http://localhost:8001'),
         'timeout' => env('LANGGRAPH_TIMEOUT', 60),
+        // Same value as the AI service's SERVICE_SECRET
+        'secret' => env('LANGGRAPH_SERVICE_SECRET'),
+        'token_ttl' => env('LANGGRAPH_TOKEN_TTL', 3600),
     ],
 
 ];
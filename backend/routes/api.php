@@ -240,7 +240,7 @@ Route::middleware(['auth:sanctum', 'ability:admin'])->prefix('admin')->group(fun
     
     // Customers Management (Legacy)
     Route::get('/customers', [AdminController::class, 'getCustomers']);
-    Route::get('/customers/{id}', [AdminController::class, 'getCustomerDetails']);
+    Route::get('/customers/{id}', [AdminController::class, 'getCustomerDetails'])->middleware('api.etag');
     Route::put('/customers/{id}', [AdminController::class, 'updateCustomer']);
     
     // Shipments Tracking
@@ -252,7 +252,7 @@ Route::middleware(['auth:sanctum', 'ability:admin'])->prefix('admin')->group(fun
     Route::prefix('crud/shipments')->group(function () {
         Route::get('/', [TrackingController::class, 'index']);
         Route::post('/', [TrackingController::class, 'store']);
-        Route::get('/{id}', [TrackingController::class, 'show']);
+        Route::get('/{id}', [TrackingController::class, 'show'])->middleware('api.etag');
         Route::put('/{id}', [TrackingController::class, 'update']);
         Route::delete('/{id}', [TrackingController::class, 'destroy']);
         Route::patch('/{id}/status', [TrackingController::class, 'updateStatus']);
@@ -0,0 +1,47 @@
+<?php
+
+namespace Tests\Unit;
+
+use Tests\TestCase;
+use App\Http\Middleware\ConditionalGetMiddleware;
+use App\Services\ApiResponseService;
+use Illuminate\Http\Request;
+
+class ConditionalGetMiddlewareTest extends TestCase
+{
+    private function handle(Request $request, array $record = ['id' => 9, 'status' => 'booked'])
+    {
+        return (new ConditionalGetMiddleware())->handle($request, fn () => ApiResponseService::success($record));
+    }
+
+    /** @test */
+    public function it_tags_records_and_answers_matching_revalidations_with_304()
+    {
+        $first = $this->handle(Request::create('/api/admin/crud/shipments/9', 'GET'));
+        $etag = $first->headers->get('ETag');
+
+        $this->assertEquals(200, $first->getStatusCode());
+        $this->assertNotEmpty($etag);
+
+        // The envelope's timestamp changes between requests; the record does not
+        $this->travel(5)->seconds();
+        $request = Request::create('/api/admin/crud/shipments/9', 'GET', [], [], [], ['HTTP_IF_NONE_MATCH' => $etag]);
+        $unchanged = $this->handle($request);
+
+        $this->assertEquals(304, $unchanged->getStatusCode());
+        $this->assertEmpty($unchanged->getContent());
+
+        $changed = $this->handle($request, ['id' => 9, 'status' => 'in_transit']);
+
+        $this->assertEquals(200, $changed->getStatusCode());
+        $this->assertNotEquals($etag, $changed->headers->get('ETag'));
+    }
+
+    /** @test */
+    public function it_leaves_writes_alone()
+    {
+        $response = $this->handle(Request::create('/api/admin/crud/shipments/9', 'PUT'));
+
+        $this->assertNull($response->headers->get('ETag'));
+    }
+}